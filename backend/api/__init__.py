@@ -6,6 +6,7 @@ from .routes_uploaders import router as uploaders_router
 from .routes_paths import router as paths_router
 from .routes_manage_data import router as manage_data_router
 from .routes_search_music import router as search_music_router
+from .routes_downloads import router as downloads_router
 
 api_router = APIRouter()
 api_router.include_router(playlist_router, prefix="/playlists", tags=["playlists"])
@@ -14,3 +15,4 @@ api_router.include_router(uploaders_router, prefix="/uploaders", tags=["uploader
 api_router.include_router(paths_router, prefix="/paths", tags=["paths"])
 api_router.include_router(manage_data_router, prefix="/manage_data", tags=["manage_data"])
 api_router.include_router(search_music_router, prefix="/search_music", tags=["search_music"])
+api_router.include_router(downloads_router, prefix="/downloads", tags=["downloads"])
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends, Query
+from database.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.download_jobs import get_queue
+
+router = APIRouter()
+
+
+@router.get("/queue")
+async def get_download_queue(
+    db: AsyncSession = Depends(get_db),
+    limit: int = Query(50, ge=0, le=500)
+):
+    """
+    Get the download queue: its depth by status and priority, the running downloads
+    and the next ones in their order.
+    """
+    return await get_queue(db, limit)
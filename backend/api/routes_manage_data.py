@@ -6,7 +6,10 @@ from api.routes_videos import add_video
 from api.routes_playlists import add_playlist
 from database.models import Playlist, PlaylistVideo, Video, GlobalPreferences
 from database.database import get_db
+from utils.youtube_client import get_api_cache_stats
+from utils.youtube_quota import quota_manager, priority, QuotaPriority
 from sqlalchemy import insert, select, Boolean
+import asyncio
 import json
 import os
 import time
@@ -72,11 +75,13 @@ async def upload_app_data(file: UploadFile, db: AsyncSession = Depends(get_db)):
         if "playlists" not in json_data or "videos" not in json_data:
             raise HTTPException(400, detail="Invalid JSON structure")
 
-        for playlist_id in json_data["playlists"]:
-            await add_playlist(playlist_id, db)
+        # Imports can be large, keep them from eating the quota of the user and of the nightly jobs
+        with priority(QuotaPriority.BULK):
+            for playlist_id in json_data["playlists"]:
+                await add_playlist(playlist_id, db)
 
-        for video_id in json_data["videos"]:
-            await add_video(video_id, db)
+            for video_id in json_data["videos"]:
+                await add_video(video_id, db)
 
         return {"success": True}
 
@@ -162,3 +167,19 @@ async def update_global_preferences(attributes_updated: dict, db: AsyncSession =
     await db.commit()
     
     return {"updated": True}
+
+
+@router.get("/api_cache")
+async def get_api_cache():
+    """
+    Return the hit/miss counters of the YouTube API conditional request cache.
+    """
+    return await get_api_cache_stats()
+
+
+@router.get("/quota")
+async def get_quota_usage():
+    """
+    Return the YouTube Data API quota used today, per endpoint and per priority class.
+    """
+    return await asyncio.to_thread(quota_manager.get_usage)
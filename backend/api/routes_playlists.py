@@ -3,10 +3,11 @@ from sqlalchemy.orm import selectinload
 from database.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, desc, asc
-from database.models import Playlist, PlaylistVideo, DownloadState, Video, Uploader
+from database.models import Playlist, PlaylistVideo, DownloadState, Video, Uploader, DownloadJob, DownloadJobPriority
 import asyncio
-from utils.fetchPlaylistInfo import fetch_full_playlist
+from utils.fetchPlaylistInfo import fetch_full_playlist, get_fetch_checkpoint
 from utils.download_playlist import download_playlist
+from utils.download_playlist_video import validate_tuning
 from pydantic import BaseModel
 from typing import Optional
 
@@ -107,6 +108,12 @@ async def update_playlist(playlist_id: str, attributes_updated: dict, db: AsyncS
     if not playlist:
         raise HTTPException(status_code=404, detail="Playlist not found")
 
+    # The tuning settings end up on the yt-dlp command line
+    for key, value in attributes_updated.items():
+        error = validate_tuning(key, value)
+        if error:
+            raise HTTPException(status_code=400, detail=error)
+
     # Update the playlist fields
     for key, value in attributes_updated.items():
         setattr(playlist, key, value)
@@ -144,7 +151,12 @@ async def add_playlist(playlist_id: str, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Playlist).where(Playlist.source_id == playlist_id))
     existing_playlist = result.scalars().first()
     if existing_playlist:
-        return {"message": "Playlist already exists", "error": True}
+        # A failed import is kept with its checkpoint, adding the playlist again resumes it
+        checkpoint = await get_fetch_checkpoint(existing_playlist, db)
+        if checkpoint is None:
+            return {"message": "Playlist already exists", "error": True}
+        asyncio.create_task(fetch_full_playlist(playlist_id, existing_playlist.title, full_sync=checkpoint.full_sync))
+        return {"message": "Playlist import resumed", "playlist": "Being fetched..."}
 
     # Start background task to fetch full playlist details
     asyncio.create_task(fetch_full_playlist(playlist_id))
@@ -244,6 +256,9 @@ async def get_playlist_details(
         "default_format": playlist.default_format,
         "default_quality": playlist.default_quality,
         "default_subtitles": playlist.default_subtitles,
+        "default_concurrent_fragments": playlist.default_concurrent_fragments,
+        "default_http_chunk_size": playlist.default_http_chunk_size,
+        "default_external_downloader": playlist.default_external_downloader,
         "uploader": {
             "id": playlist.uploader.id,
             "name": playlist.uploader.name,
@@ -257,6 +272,7 @@ async def get_playlist_details(
                 "duration": video.duration,
                 "upload_date": video.upload_date,
                 "available": video.available,
+                "download_error": video.download_error,
             }
             for video, state, custom_title in videos
         ]
@@ -294,7 +310,11 @@ async def get_number_of_videos_downloaded(playlist_id: str, db: AsyncSession = D
 
 
 @router.post("/{playlist_id}/refresh")
-async def refresh_playlist(playlist_id: str, db: AsyncSession = Depends(get_db)):
+async def refresh_playlist(
+    playlist_id: str,
+    db: AsyncSession = Depends(get_db),
+    force: bool = Query(False, description="Bypass the video metadata cache"),
+):
     """
     Récupérer les vidéos d'une playlist par son ID
     """
@@ -305,7 +325,7 @@ async def refresh_playlist(playlist_id: str, db: AsyncSession = Depends(get_db))
         raise HTTPException(status_code=404, detail="Playlist not found")
 
     # Start the refresh process
-    asyncio.create_task(fetch_full_playlist(playlist_id, playlist.title))
+    asyncio.create_task(fetch_full_playlist(playlist_id, playlist.title, use_cache=not force))
 
     return {"message": "Refresh started", "playlist_id": playlist_id}
 
@@ -321,7 +341,7 @@ async def is_fetching_playlist(playlist_id: str):
         return {"message": "Playlist is not being fetched", "is_fetching": False}
     
 
-from utils.download_playlist import downloading
+from utils.download_jobs import enqueue_jobs, has_active_jobs
 
 class DownloadRequest(BaseModel):
     redownload_all: Optional[bool] = False  # Default to False if not provided
@@ -341,7 +361,7 @@ async def start_playlist_download(playlist_id: str, request_data: DownloadReques
         raise HTTPException(status_code=404, detail="Playlist not found")
 
     # Check if the playlist is already being downloaded
-    if playlist.source_id in downloading:
+    if await has_active_jobs(db, playlist_id=playlist.id):
         raise HTTPException(status_code=400, detail="Playlist is already being downloaded")
 
     # Check if the playlist is being fetched
@@ -349,24 +369,24 @@ async def start_playlist_download(playlist_id: str, request_data: DownloadReques
         raise HTTPException(status_code=400, detail="Playlist is being fetched")
 
     redownload_all = request_data.redownload_all or False
-    # Start the download process
-    asyncio.create_task(download_playlist(playlist, redownload_all))
+    # Queue the download of the playlist items
+    await download_playlist(playlist, redownload_all)
 
     return {"message": "Download started", "playlist_id": playlist_id}
 
 
 @router.get("/{playlist_id}/download_status")
-async def get_playlist_download_status(playlist_id: str):
+async def get_playlist_download_status(playlist_id: str, db: AsyncSession = Depends(get_db)):
     """
     Récupérer le statut de téléchargement d'une playlist par son ID
     """
-    print(downloading)
-    if playlist_id in downloading:
+    result = await db.execute(select(Playlist).where(Playlist.source_id == playlist_id))
+    playlist = result.scalar_one_or_none()
+    if playlist and await has_active_jobs(db, playlist_id=playlist.id):
         return {"message": "Playlist is being downloaded", "is_downloading": True}
     else:
         return {"message": "Playlist is not being downloaded", "is_downloading": False}
 
-from utils.download_video import download_video, downloading_videos
 from utils.fetchVideoInfo import fetching_videos
 @router.post("/{playlist_id}/videos/{video_id}/download")
 async def start_video_download(playlist_id: str, video_id: str, db: AsyncSession = Depends(get_db)):
@@ -392,14 +412,14 @@ async def start_video_download(playlist_id: str, video_id: str, db: AsyncSession
     if not playlist_video:
         raise HTTPException(status_code=404, detail="Video not found in the playlist")
     
-    if (playlist_video.playlist_id, playlist_video.video_id) in downloading_videos:
+    if await has_active_jobs(db, playlist_video_id=playlist_video.id):
         raise HTTPException(status_code=400, detail="Video is already being downloaded")
 
     if video_id in fetching_videos:
         raise HTTPException(status_code=400, detail="Video is being fetched")
 
-    # Start the download process for the specific video
-    asyncio.create_task(download_video(playlist_video, playlist, video))
+    # Queue the download of the specific video
+    await enqueue_jobs(playlist.id, [playlist_video.id], db, priority=DownloadJobPriority.INTERACTIVE)
 
     return {"message": "Download started for video", "video_id": video_id}
 
@@ -428,10 +448,7 @@ async def get_video_download_status(playlist_id: str, video_id: str, db: AsyncSe
     if not playlist_video:
         raise HTTPException(status_code=404, detail="Video not found in the playlist")
 
-    # if playlist_video.state == DownloadState.DOWNLOADING and (playlist_id not in downloading or (playlist_video.playlist_id, playlist_video.video_id) in downloading_videos):
-    #     playlist_video.state = DownloadState.IDLE
-    #     await db.commit()
-    # TODO fix when server is restarted when donloading a video / an item of a playlist, the status sometimes remains as DOWNLOADING
+    # Items left as DOWNLOADING by a restart are reset when their download job is recovered
 
     return {
         "status": playlist_video.state,
@@ -440,6 +457,42 @@ async def get_video_download_status(playlist_id: str, video_id: str, db: AsyncSe
     }
 
 
+@router.get("/{playlist_id}/videos/{video_id}/log")
+async def get_video_download_log(playlist_id: str, video_id: str, db: AsyncSession = Depends(get_db)):
+    """
+    Récupérer la fin de la sortie de yt-dlp du dernier téléchargement en échec d'une vidéo
+    """
+    result = await db.execute(select(Playlist).where(Playlist.source_id == playlist_id))
+    playlist = result.scalars().first()
+    if not playlist:
+        raise HTTPException(status_code=404, detail="Playlist not found")
+
+    result = await db.execute(select(Video).where(Video.source_id == video_id))
+    video = result.scalars().first()
+    if not video:
+        raise HTTPException(status_code=404, detail="Video not found")
+
+    result = await db.execute(
+        select(DownloadJob)
+        .join(PlaylistVideo, PlaylistVideo.id == DownloadJob.playlist_video_id)
+        .where(PlaylistVideo.playlist_id == playlist.id, PlaylistVideo.video_id == video.id, DownloadJob.log.is_not(None))
+        .order_by(DownloadJob.finished_at.desc().nulls_first(), DownloadJob.created_at.desc())
+        .limit(1)
+    )
+    job = result.scalars().first()
+    if not job:
+        raise HTTPException(status_code=404, detail="No download log for this video")
+
+    return {
+        "video_id": video_id,
+        "playlist_id": playlist_id,
+        "status": job.status,
+        "attempts": job.attempts,
+        "error": job.error,
+        "finished_at": job.finished_at,
+        "log": job.log.splitlines(),
+    }
+
 
 @router.get("/{playlist_id}/videos/{video_id}")
 async def get_playlist_video_info(playlist_id: str, video_id: str, db: AsyncSession = Depends(get_db)):
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Query, HTTPException
+from utils.youtube_quota import QuotaExceededError
 from utils.youtube_search import (
     search_youtube, search_youtube_music,
     filter_by_channel_name, filter_music_by_channel_name,
@@ -55,5 +56,7 @@ async def search(
 
             return normalized
 
+    except QuotaExceededError as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
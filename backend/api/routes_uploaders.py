@@ -3,7 +3,6 @@ from database.database import get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from database.models import Uploader
-import asyncio
 
 router = APIRouter()
 
@@ -38,7 +37,20 @@ async def get_uploaders(
 # Download all avatar and channel banners
 # yt-dlp "https://www.youtube.com/@{channel}" --write-all-thumbnails --playlist-items 0 --skip-downloads
 
-from utils.download_uploader_avatar import download_avatar, downloading
+from utils.download_uploader_avatar import avatar_queue, downloading, has_avatar
+
+@router.post("/backfill_avatars")
+async def backfill_uploaders_avatars(db: AsyncSession = Depends(get_db)):
+    """
+    Queue the avatar download of every uploader whose avatar file is missing.
+    """
+    result = await db.execute(select(Uploader.id))
+    missing = [uploader_id for uploader_id in result.scalars().all() if not has_avatar(uploader_id)]
+
+    queued = sum(avatar_queue.enqueue(uploader_id) for uploader_id in missing)
+
+    return {"message": "Avatar backfill started", "missing": len(missing), "queued": queued}
+
 
 @router.post("/{uploader_id}/download_avatar")
 async def download_uploader_avatar(
@@ -57,13 +69,10 @@ async def download_uploader_avatar(
     if not uploader:
         raise HTTPException(status_code=404, detail="Uploader not found")
     
-    if uploader.id in downloading:
+    if uploader.id in downloading or not avatar_queue.enqueue(uploader.id):
         raise HTTPException(status_code=400, detail="Avatar download already in progress")
 
-    print(f"Starting download avatar for uploader: {uploader.name}")
-
-    # Download the uploader's avatar
-    asyncio.create_task(download_avatar(uploader))
+    print(f"Queued avatar download for uploader: {uploader.name}")
 
     return {"message": "Avatar download started"}
 
@@ -84,7 +93,8 @@ async def get_uploader_avatar_state(
     if not uploader:
         raise HTTPException(status_code=404, detail="Uploader not found")
 
-    if uploader.id in downloading:
+    # Queued downloads are reported as in progress
+    if uploader.id in downloading or uploader.id in avatar_queue.pending:
         return {"status": "downloading"}
     
     return {"status": "not downloading"}
\ No newline at end of file
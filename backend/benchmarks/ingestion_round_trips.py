@@ -0,0 +1,157 @@
+"""
+Count the database round trips needed to ingest the videos of a playlist.
+
+Compares the former per-entry loop (select video, select uploader, flush, commit,
+select link for every entry) with the set-based `store_playlist_entries`.
+
+Usage (from the backend folder, against a migrated database):
+    DATABASE_URL=postgresql+asyncpg://... python -m benchmarks.ingestion_round_trips [nb_videos]
+
+The benchmark creates its own playlist, videos and uploaders and removes them afterwards.
+"""
+import asyncio
+import sys
+import time
+import uuid
+
+from sqlalchemy import event, delete
+from sqlalchemy.future import select
+
+from database.database import engine, SessionLocal
+from database.models import Playlist, PlaylistVideo, Video, Uploader
+from utils.store_videos import store_playlist_entries
+from utils.uploader_resolver import invalidate_uploader_cache
+
+
+round_trips = 0
+
+
+def count_round_trip(*args):
+    global round_trips
+    round_trips += 1
+
+
+def make_entries(nb_videos: int, nb_uploaders: int = 20) -> list[dict]:
+    prefix = uuid.uuid4().hex[:8]
+    entries = []
+    for i in range(nb_videos):
+        channel_id = f"bench-{prefix}-channel-{i % nb_uploaders}"
+        entries.append({
+            "id": f"bench-{prefix}-{i}",
+            "title": f"Benchmark video {i}",
+            "description": "",
+            "thumbnail": None,
+            "upload_date": "20250101",
+            "duration_string": "3:00",
+            "channel_id": channel_id,
+            "uploader": f"Benchmark uploader {i % nb_uploaders}",
+            "channel_url": f"https://www.youtube.com/channel/{channel_id}",
+            "uploader_id": channel_id,
+            "uploader_url": f"https://www.youtube.com/channel/{channel_id}",
+            "is_available": True,
+        })
+    return entries
+
+
+async def store_per_entry(playlist_id, entries: list[dict], db):
+    """
+    The former ingestion loop (without the avatar downloads).
+    """
+    for entry in entries:
+        result = await db.execute(select(Video).filter(Video.source_id == entry.get("id")))
+        video = result.scalars().first()
+
+        if not video:
+            result = await db.execute(select(Uploader).filter(Uploader.channel_id == entry.get("channel_id")))
+            uploader = result.scalars().first()
+            if not uploader:
+                uploader = Uploader(
+                    source_id=entry.get("uploader_id"),
+                    name=entry.get("uploader"),
+                    url=entry.get("uploader_url"),
+                    channel_id=entry.get("channel_id"),
+                    channel_url=entry.get("channel_url"),
+                )
+                db.add(uploader)
+                await db.flush()
+            await db.commit()
+
+            video = Video(
+                source_id=entry.get("id"),
+                title=entry.get("title"),
+                description=entry.get("description"),
+                thumbnail=entry.get("thumbnail"),
+                upload_date=entry.get("upload_date"),
+                duration=entry.get("duration_string"),
+                uploader_id=uploader.id,
+                available=entry.get("is_available", True),
+            )
+            db.add(video)
+            await db.flush()
+        else:
+            video.title = entry.get("title")
+            video.description = entry.get("description")
+            video.thumbnail = entry.get("thumbnail")
+            video.upload_date = entry.get("upload_date")
+            video.duration = entry.get("duration_string")
+            video.available = entry.get("is_available", True)
+
+        result = await db.execute(
+            select(PlaylistVideo).filter(
+                PlaylistVideo.playlist_id == playlist_id,
+                PlaylistVideo.video_id == video.id
+            )
+        )
+        if not result.scalars().first():
+            db.add(PlaylistVideo(playlist_id=playlist_id, video_id=video.id))
+
+    await db.commit()
+
+
+async def cleanup(playlist_id, entries: list[dict], db):
+    await db.execute(delete(PlaylistVideo).where(PlaylistVideo.playlist_id == playlist_id))
+    await db.execute(delete(Playlist).where(Playlist.id == playlist_id))
+    await db.execute(delete(Video).where(Video.source_id.in_([entry["id"] for entry in entries])))
+    channel_ids = {entry["channel_id"] for entry in entries}
+    await db.execute(delete(Uploader).where(Uploader.channel_id.in_(channel_ids)))
+    await db.commit()
+    # Bulk deletes don't fire the mapper events keeping the cache up to date
+    for channel_id in channel_ids:
+        invalidate_uploader_cache(channel_id)
+
+
+async def run(name: str, store, nb_videos: int):
+    global round_trips
+    entries = make_entries(nb_videos)
+
+    async with SessionLocal() as db:
+        playlist = Playlist(source_id=f"bench-{uuid.uuid4().hex}", title=f"Benchmark {name}")
+        db.add(playlist)
+        # Uploaders are created beforehand, their avatar download is out of the scope of this benchmark
+        for channel_id in {entry["channel_id"] for entry in entries}:
+            db.add(Uploader(channel_id=channel_id, name=channel_id, channel_url=f"https://www.youtube.com/channel/{channel_id}"))
+        await db.commit()
+
+        try:
+            for label in ("first import", "refresh"):
+                round_trips = 0
+                start = time.perf_counter()
+                await store(playlist.id, entries, db)
+                await db.commit()
+                elapsed = time.perf_counter() - start
+                print(f"{name:<12} {label:<13} {round_trips:>7} round trips  {elapsed:8.2f}s")
+        finally:
+            await cleanup(playlist.id, entries, db)
+
+
+async def main(nb_videos: int):
+    event.listen(engine.sync_engine, "before_cursor_execute", count_round_trip)
+    event.listen(engine.sync_engine, "commit", count_round_trip)
+    print(f"Ingesting {nb_videos} videos")
+    await run("per-entry", store_per_entry, nb_videos)
+    await run("set-based", store_playlist_entries, nb_videos)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000))
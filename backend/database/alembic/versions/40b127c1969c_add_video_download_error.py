@@ -0,0 +1,30 @@
+"""Add video download error
+
+Revision ID: 40b127c1969c
+Revises: a373c1aa1bdb
+Create Date: 2026-10-18 11:00:00.813188
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '40b127c1969c'
+down_revision: Union[str, None] = 'a373c1aa1bdb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('videos', sa.Column('download_error', sa.String(), nullable=True))
+    op.add_column('videos', sa.Column('download_error_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('videos', 'download_error_hash')
+    op.drop_column('videos', 'download_error')
@@ -0,0 +1,30 @@
+"""Add content hash to playlists and videos
+
+Revision ID: 4f03c74f7218
+Revises: 9c7b90484219
+Create Date: 2026-10-18 10:30:00.952550
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f03c74f7218'
+down_revision: Union[str, None] = '9c7b90484219'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('playlists', sa.Column('content_hash', sa.String(), nullable=True))
+    op.add_column('videos', sa.Column('content_hash', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('videos', 'content_hash')
+    op.drop_column('playlists', 'content_hash')
@@ -0,0 +1,32 @@
+"""Add playlist download tuning
+
+Revision ID: 65e8d524c203
+Revises: 40b127c1969c
+Create Date: 2026-10-18 11:30:00.286456
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '65e8d524c203'
+down_revision: Union[str, None] = '40b127c1969c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('playlists', sa.Column('default_concurrent_fragments', sa.Integer(), nullable=True))
+    op.add_column('playlists', sa.Column('default_http_chunk_size', sa.String(), nullable=True))
+    op.add_column('playlists', sa.Column('default_external_downloader', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('playlists', 'default_external_downloader')
+    op.drop_column('playlists', 'default_http_chunk_size')
+    op.drop_column('playlists', 'default_concurrent_fragments')
@@ -0,0 +1,42 @@
+"""Add playlist videos unique constraint
+
+Revision ID: 9c7b90484219
+Revises: d55c338a9710
+Create Date: 2026-10-18 10:30:00.044951
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c7b90484219'
+down_revision: Union[str, None] = 'd55c338a9710'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Remove duplicated links before adding the constraint, keeping the most advanced state
+    op.execute("""
+        DELETE FROM playlist_videos
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY playlist_id, video_id
+                    ORDER BY (state = 'DOWNLOADED') DESC, id
+                ) AS row_number
+                FROM playlist_videos
+            ) AS duplicates
+            WHERE duplicates.row_number > 1
+        )
+    """)
+    op.create_unique_constraint('uq_playlist_videos_playlist_video', 'playlist_videos', ['playlist_id', 'video_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('uq_playlist_videos_playlist_video', 'playlist_videos', type_='unique')
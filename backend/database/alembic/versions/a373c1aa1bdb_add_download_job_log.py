@@ -0,0 +1,28 @@
+"""Add download job log
+
+Revision ID: a373c1aa1bdb
+Revises: fc9e736d3758
+Create Date: 2026-10-18 10:30:00.171687
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a373c1aa1bdb'
+down_revision: Union[str, None] = 'fc9e736d3758'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('download_jobs', sa.Column('log', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('download_jobs', 'log')
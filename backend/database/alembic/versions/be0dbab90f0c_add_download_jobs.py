@@ -0,0 +1,49 @@
+"""Add download jobs
+
+Revision ID: be0dbab90f0c
+Revises: c682c9cd3145
+Create Date: 2026-10-18 11:30:00.874807
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'be0dbab90f0c'
+down_revision: Union[str, None] = 'c682c9cd3145'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('download_jobs',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('playlist_video_id', sa.UUID(), nullable=False),
+    sa.Column('playlist_id', sa.UUID(), nullable=False),
+    sa.Column('batch_id', sa.UUID(), nullable=True),
+    sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'DONE', 'FAILED', name='downloadjobstatus'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('error', sa.String(), nullable=True),
+    sa.Column('worker_id', sa.String(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['playlist_id'], ['playlists.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['playlist_video_id'], ['playlist_videos.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_download_jobs_status_created_at', 'download_jobs', ['status', 'created_at'], unique=False)
+    op.create_index('uq_download_jobs_active_playlist_video', 'download_jobs', ['playlist_video_id'], unique=True, postgresql_where=sa.text("status IN ('QUEUED', 'RUNNING')"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('uq_download_jobs_active_playlist_video', table_name='download_jobs', postgresql_where=sa.text("status IN ('QUEUED', 'RUNNING')"))
+    op.drop_index('ix_download_jobs_status_created_at', table_name='download_jobs')
+    op.drop_table('download_jobs')
+    sa.Enum(name='downloadjobstatus').drop(op.get_bind(), checkfirst=True)
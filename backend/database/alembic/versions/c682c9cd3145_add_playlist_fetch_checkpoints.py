@@ -0,0 +1,40 @@
+"""Add playlist fetch checkpoints
+
+Revision ID: c682c9cd3145
+Revises: 4f03c74f7218
+Create Date: 2026-10-18 11:00:00.091622
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c682c9cd3145'
+down_revision: Union[str, None] = '4f03c74f7218'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('playlist_fetch_checkpoints',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('playlist_id', sa.UUID(), nullable=False),
+    sa.Column('full_sync', sa.Boolean(), nullable=True),
+    sa.Column('page_token', sa.String(), nullable=False),
+    sa.Column('video_ids', postgresql.ARRAY(sa.String()), nullable=False),
+    sa.Column('last_published', sa.String(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['playlist_id'], ['playlists.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('playlist_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('playlist_fetch_checkpoints')
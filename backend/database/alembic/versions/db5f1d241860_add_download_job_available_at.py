@@ -0,0 +1,28 @@
+"""Add download job available_at
+
+Revision ID: db5f1d241860
+Revises: 65e8d524c203
+Create Date: 2026-10-18 10:40:00.521466
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'db5f1d241860'
+down_revision: Union[str, None] = '65e8d524c203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('download_jobs', sa.Column('available_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('download_jobs', 'available_at')
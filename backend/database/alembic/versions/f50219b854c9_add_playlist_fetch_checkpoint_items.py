@@ -0,0 +1,50 @@
+"""Add playlist fetch checkpoint items
+
+Revision ID: f50219b854c9
+Revises: db5f1d241860
+Create Date: 2026-10-18 10:50:00.289821
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f50219b854c9'
+down_revision: Union[str, None] = 'db5f1d241860'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('playlist_fetch_checkpoint_items',
+    sa.Column('checkpoint_id', sa.UUID(), nullable=False),
+    sa.Column('video_id', sa.String(), nullable=False),
+    sa.ForeignKeyConstraint(['checkpoint_id'], ['playlist_fetch_checkpoints.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('checkpoint_id', 'video_id')
+    )
+    op.add_column('playlist_fetch_checkpoints', sa.Column('nb_enumerated', sa.Integer(), nullable=False, server_default='0'))
+    op.alter_column('playlist_fetch_checkpoints', 'nb_enumerated', server_default=None)
+    # Items of the checkpoints left by interrupted fetches
+    op.execute(
+        "INSERT INTO playlist_fetch_checkpoint_items (checkpoint_id, video_id) "
+        "SELECT DISTINCT id, unnest(video_ids) FROM playlist_fetch_checkpoints"
+    )
+    op.execute("UPDATE playlist_fetch_checkpoints SET nb_enumerated = cardinality(video_ids)")
+    op.drop_column('playlist_fetch_checkpoints', 'video_ids')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.add_column('playlist_fetch_checkpoints', sa.Column('video_ids', postgresql.ARRAY(sa.VARCHAR()), autoincrement=False, nullable=False, server_default='{}'))
+    op.alter_column('playlist_fetch_checkpoints', 'video_ids', server_default=None)
+    op.execute(
+        "UPDATE playlist_fetch_checkpoints SET video_ids = ARRAY("
+        "SELECT video_id FROM playlist_fetch_checkpoint_items WHERE checkpoint_id = playlist_fetch_checkpoints.id)"
+    )
+    op.drop_column('playlist_fetch_checkpoints', 'nb_enumerated')
+    op.drop_table('playlist_fetch_checkpoint_items')
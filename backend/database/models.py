@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Boolean, ForeignKey, Enum, DateTime, UniqueConstraint, func
+from sqlalchemy import Column, String, Boolean, ForeignKey, Enum, DateTime, Integer, Text, UniqueConstraint, Index, func
 from sqlalchemy.orm import relationship, declared_attr
 from sqlalchemy.dialects.postgresql import UUID
 import uuid
@@ -14,6 +14,19 @@ class DownloadState(str, PyEnum):
     DOWNLOADED = "DOWNLOADED"
     ERROR = "ERROR"
 
+# Download Job Status Enum
+class DownloadJobStatus(str, PyEnum):
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+# Download Job Priority Enum, declared from the most urgent (Postgres orders enum values by declaration)
+class DownloadJobPriority(str, PyEnum):
+    INTERACTIVE = "INTERACTIVE"  # Single video downloaded by the user
+    PLAYLIST = "PLAYLIST"        # Playlist downloaded by the user
+    SCHEDULED = "SCHEDULED"      # Nightly download of the new items
+
 # Download Format Enum (Audio/Video)
 class DownloadFormat(str, PyEnum):
     VIDEO = "VIDEO"
@@ -66,11 +79,17 @@ class Playlist(Item):
 
     check_every_day = Column(Boolean, default=False)
     last_published = Column(String, nullable=True)
+    last_full_sync = Column(DateTime(timezone=True), nullable=True)  # Last time every item of the playlist was enumerated
+    content_hash = Column(String, nullable=True)  # Fingerprint of the playlist info last written
 
     # Default Download Settings for the Playlist
     default_format = Column(Enum(DownloadFormat), default=DownloadFormat.AUDIO)  # VIDEO or AUDIO
     default_quality = Column(Enum(DownloadQuality), nullable=True, default=DownloadQuality.q_best)  # e.g., "1080p", "720p", "best"
     default_subtitles = Column(Boolean, default=False)  # Whether to download subtitles
+    # Download tuning (if None, fall back to the global settings, then to auto by quality)
+    default_concurrent_fragments = Column(Integer, nullable=True)  # Fragments downloaded in parallel (-N)
+    default_http_chunk_size = Column(String, nullable=True)  # e.g. "10M"
+    default_external_downloader = Column(String, nullable=True)  # e.g. "aria2c"
 
     download_path = Column(String, nullable=False, server_default="") # server_default to avoid issues when updating existing rows
 
@@ -86,6 +105,9 @@ class Video(Item):
 
     duration = Column(String, nullable=True)
     available = Column(Boolean, default=True)  # Whether the video is available for download
+    content_hash = Column(String, nullable=True)  # Fingerprint of the video details last written
+    download_error = Column(String, nullable=True)  # Permanent download failure (private, removed, geo-blocked...)
+    download_error_hash = Column(String, nullable=True)  # content_hash when the download failed, retried once it changes
 
     # ForeignKey to Uploader
     uploader_id = Column(UUID(as_uuid=True), ForeignKey("uploaders.id"), nullable=True)
@@ -117,6 +139,61 @@ class PlaylistVideo(Base):
     playlist = relationship("Playlist", back_populates="videos", passive_deletes=True)
     video = relationship("Video", back_populates="playlists")
 
+    __table_args__ = (UniqueConstraint('playlist_id', 'video_id', name='uq_playlist_videos_playlist_video'),)
+
+# Progress of an interrupted playlist fetch, to resume it from the last stored page
+class PlaylistFetchCheckpoint(Base):
+    __tablename__ = "playlist_fetch_checkpoints"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    playlist_id = Column(UUID(as_uuid=True), ForeignKey("playlists.id", ondelete="CASCADE"), unique=True, nullable=False)
+
+    full_sync = Column(Boolean, default=True)  # Whether the interrupted fetch was a full sync
+    page_token = Column(String, nullable=False)  # Token of the next page to fetch
+    nb_enumerated = Column(Integer, nullable=False, default=0)  # Items already enumerated, listed in PlaylistFetchCheckpointItem
+    last_published = Column(String, nullable=True)  # Most recent upload date of the playlist before the fetch started
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+# Item enumerated by an interrupted playlist fetch, inserted with its page (the full sync removes the items not enumerated)
+class PlaylistFetchCheckpointItem(Base):
+    __tablename__ = "playlist_fetch_checkpoint_items"
+
+    checkpoint_id = Column(UUID(as_uuid=True), ForeignKey("playlist_fetch_checkpoints.id", ondelete="CASCADE"), primary_key=True)
+    video_id = Column(String, primary_key=True)  # Source id of the video
+
+# Download of a playlist item, queued in the database so it survives restarts
+class DownloadJob(Base):
+    __tablename__ = "download_jobs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    playlist_video_id = Column(UUID(as_uuid=True), ForeignKey("playlist_videos.id", ondelete="CASCADE"), nullable=False)
+    playlist_id = Column(UUID(as_uuid=True), ForeignKey("playlists.id", ondelete="CASCADE"), nullable=False)
+    batch_id = Column(UUID(as_uuid=True), nullable=True)  # Jobs enqueued together by a playlist download
+
+    status = Column(Enum(DownloadJobStatus), nullable=False, default=DownloadJobStatus.QUEUED)
+    priority = Column(Enum(DownloadJobPriority), nullable=False, default=DownloadJobPriority.PLAYLIST, server_default=DownloadJobPriority.PLAYLIST.value)
+    attempts = Column(Integer, nullable=False, default=0)
+    error = Column(String, nullable=True)
+    log = Column(Text, nullable=True)  # Tail of the yt-dlp output, kept when the job fails
+    worker_id = Column(String, nullable=True)  # Worker running the job
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # Refreshed while the job runs
+    available_at = Column(DateTime(timezone=True), nullable=True)  # Not claimed before, backoff of a retried job
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # A playlist item can only have one job queued or running
+        Index(
+            "uq_download_jobs_active_playlist_video",
+            "playlist_video_id",
+            unique=True,
+            postgresql_where=status.in_([DownloadJobStatus.QUEUED, DownloadJobStatus.RUNNING]),
+        ),
+        Index("ix_download_jobs_status_created_at", "status", "created_at"),
+    )
+
 # RootFolder Model for Download Folders
 class RootFolder(Base):
     __tablename__ = "root_folders"
@@ -8,6 +8,14 @@ from utils.update_playlists import update_playlists_downloads_job, update_playli
 from contextlib import asynccontextmanager
 from utils.init_folders import init_folders
 from utils.constants import METADATA_STORAGE_PATH
+from utils.youtube_client import YOUTUBE
+from utils.download_uploader_avatar import avatar_queue
+from utils.fetchPlaylistInfo import resume_interrupted_fetches
+from utils.download_jobs import download_dispatcher
+from utils.constants import DOWNLOAD_WORKERS_IN_API
+from utils.pg_notify import listen, forward_ws_message, WS_MESSAGES_CHANNEL
+from utils.ytdlp_pool import download_pool, postprocess_pool
+import asyncio
 
 
 init_folders()  # Initialize necessary folders
@@ -20,8 +28,20 @@ scheduler.add_job(update_playlists_downloads_job, CronTrigger(day_of_week="0-6",
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     scheduler.start()
+    resume_task = asyncio.create_task(resume_interrupted_fetches())
+    # Progress of the downloads run by standalone workers
+    ws_forward_task = asyncio.create_task(listen({WS_MESSAGES_CHANNEL: forward_ws_message}))
+    if DOWNLOAD_WORKERS_IN_API:
+        download_dispatcher.start()
     yield
+    resume_task.cancel()
+    ws_forward_task.cancel()
+    await download_dispatcher.stop()
     scheduler.shutdown()
+    await avatar_queue.stop()
+    await download_pool.close()
+    await postprocess_pool.close()
+    await YOUTUBE.aclose()
 
 app = FastAPI(lifespan=lifespan)
 
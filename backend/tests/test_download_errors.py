@@ -0,0 +1,61 @@
+import pytest
+
+from utils.download_errors import DownloadErrorKind, classify_error, get_error_line, get_retry_delay
+
+
+# Error lines as printed by yt-dlp (without the "ERROR: " prefix)
+TRANSIENT_ERRORS = [
+    "[youtube] dQw4w9WgXcQ: Video unavailable. This content isn't available, try again later.",
+    "[youtube] dQw4w9WgXcQ: Sign in to confirm you're not a bot. Use --cookies-from-browser or --cookies for the authentication.",
+    "[youtube] dQw4w9WgXcQ: Unable to download API page: HTTP Error 429: Too Many Requests (caused by <HTTPError 429: Too Many Requests>)",
+    "[youtube] dQw4w9WgXcQ: Unable to download webpage: HTTP Error 503: Service Unavailable (caused by <HTTPError 503: Service Unavailable>)",
+    "[youtube] dQw4w9WgXcQ: Unable to download webpage: <urlopen error [Errno -3] Temporary failure in name resolution> (caused by TransportError('<urlopen error [Errno -3] Temporary failure in name resolution>'))",
+    "[download] Got error: The read operation timed out. Giving up after 10 retries",
+    "unable to download video data: ('Connection aborted.', RemoteDisconnected('Remote end closed connection without response'))",
+    "fragment 12 not found, unable to continue: HTTP Error 503: Service Unavailable. Giving up after 10 fragment retries",
+]
+
+PERMANENT_ERRORS = [
+    "[youtube] dQw4w9WgXcQ: Private video. Sign in if you've been granted access to this video",
+    "[youtube] dQw4w9WgXcQ: Video unavailable",
+    "[youtube] dQw4w9WgXcQ: Video unavailable. This video has been removed by the uploader",
+    "[youtube] dQw4w9WgXcQ: Video unavailable. This video is no longer available because the YouTube account associated with this video has been terminated.",
+    "[youtube] dQw4w9WgXcQ: Video unavailable. This video contains content from SME, who has blocked it on copyright grounds",
+    "[youtube] dQw4w9WgXcQ: The uploader has not made this video available in your country. This video is available in United States. You might want to use a VPN or a proxy server (with --proxy) to workaround.",
+    "[youtube] dQw4w9WgXcQ: Join this channel to get access to members-only content like this video, and other exclusive perks.",
+]
+
+
+@pytest.mark.parametrize("error", TRANSIENT_ERRORS)
+def test_transient_errors(error):
+    assert classify_error(error) == DownloadErrorKind.TRANSIENT
+
+
+@pytest.mark.parametrize("error", PERMANENT_ERRORS)
+def test_permanent_errors(error):
+    assert classify_error(error) == DownloadErrorKind.PERMANENT
+
+
+@pytest.mark.parametrize("error", [None, "", "[youtube] dQw4w9WgXcQ: Requested format is not available"])
+def test_unknown_errors(error):
+    assert classify_error(error) is None
+
+
+def test_get_error_line_returns_the_last_error():
+    lines = [
+        "ERROR: [youtube] a: first error",
+        "[download] Destination: x",
+        "WARNING: [youtube] a: some warning",
+        "ERROR: [youtube] a: Private video",
+        "[info] done",
+    ]
+    assert get_error_line(lines) == "[youtube] a: Private video"
+    assert get_error_line(["[download] 100%"]) is None
+    assert get_error_line(None) is None
+
+
+def test_retry_delay_is_bounded(monkeypatch):
+    monkeypatch.setattr("utils.download_errors.DOWNLOAD_RETRY_BASE_SECONDS", 5)
+    monkeypatch.setattr("utils.download_errors.DOWNLOAD_RETRY_MAX_SECONDS", 30)
+    for attempt, bound in [(1, 5), (2, 10), (3, 20), (4, 30), (10, 30)]:
+        assert all(0 <= get_retry_delay(attempt) <= bound for _ in range(50))
@@ -0,0 +1,167 @@
+import os
+import uuid
+from datetime import datetime as Datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import delete
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+import utils.download_jobs as download_jobs
+from database.models import DownloadJob, DownloadJobPriority, DownloadJobStatus, Playlist, PlaylistVideo, Video
+from utils.download_jobs import claim_job
+
+
+@pytest.fixture
+async def db(monkeypatch):
+    """
+    Session on DATABASE_URL whose commits are savepoints of a transaction rolled back
+    after the test: the queue starts empty and the database is left unchanged.
+    """
+    monkeypatch.setattr(download_jobs, "DOWNLOAD_GLOBAL_CONCURRENCY", 0)
+    engine = create_async_engine(os.environ["DATABASE_URL"], poolclass=NullPool, connect_args={"timeout": 5})
+    try:
+        connection = await engine.connect()
+    except (OSError, SQLAlchemyError) as e:
+        await engine.dispose()
+        pytest.skip(f"Database not reachable: {e}")
+
+    transaction = await connection.begin()
+    session = AsyncSession(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+    await session.execute(delete(DownloadJob))
+    try:
+        yield session
+    finally:
+        await session.close()
+        await transaction.rollback()
+        await connection.close()
+        await engine.dispose()
+
+
+class Queue:
+    """
+    Jobs added one second apart, claimed by name.
+    """
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.names = {}
+        self.created_at = Datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def add_playlist(self) -> Playlist:
+        playlist = Playlist(source_id=f"test-{uuid.uuid4()}", title="Test playlist")
+        self.db.add(playlist)
+        await self.db.flush()
+        return playlist
+
+    async def add_job(
+        self,
+        playlist: Playlist,
+        name: str,
+        priority: DownloadJobPriority = DownloadJobPriority.PLAYLIST,
+        status: DownloadJobStatus = DownloadJobStatus.QUEUED,
+        **values,
+    ) -> DownloadJob:
+        video = Video(source_id=f"test-{uuid.uuid4()}", title=name)
+        self.db.add(video)
+        await self.db.flush()
+        playlist_video = PlaylistVideo(playlist_id=playlist.id, video_id=video.id)
+        self.db.add(playlist_video)
+        await self.db.flush()
+
+        self.created_at += timedelta(seconds=1)
+        job = DownloadJob(
+            playlist_video_id=playlist_video.id,
+            playlist_id=playlist.id,
+            priority=priority,
+            status=status,
+            created_at=self.created_at,
+            **values,
+        )
+        self.db.add(job)
+        await self.db.commit()
+        self.names[job.id] = name
+        return job
+
+    async def claim(self, exclude_playlist_ids: list = ()) -> str | None:
+        job = await claim_job(self.db, "test-worker", exclude_playlist_ids)
+        return self.names[job.id] if job else None
+
+    async def claim_all(self) -> list[str]:
+        claimed = []
+        while (name := await self.claim()) is not None:
+            claimed.append(name)
+        return claimed
+
+
+async def test_claims_by_priority(db):
+    queue = Queue(db)
+    playlist = await queue.add_playlist()
+    await queue.add_job(playlist, "scheduled", DownloadJobPriority.SCHEDULED)
+    await queue.add_job(playlist, "playlist", DownloadJobPriority.PLAYLIST)
+    await queue.add_job(playlist, "interactive", DownloadJobPriority.INTERACTIVE)
+
+    assert await queue.claim_all() == ["interactive", "playlist", "scheduled"]
+
+
+async def test_claims_the_playlists_in_turns(db):
+    queue = Queue(db)
+    first, second = await queue.add_playlist(), await queue.add_playlist()
+    for name in ["a1", "a2", "a3"]:
+        await queue.add_job(first, name)
+    for name in ["b1", "b2"]:
+        await queue.add_job(second, name)
+
+    assert await queue.claim_all() == ["a1", "b1", "a2", "b2", "a3"]
+
+
+async def test_running_jobs_take_the_first_turns(db):
+    queue = Queue(db)
+    first, second = await queue.add_playlist(), await queue.add_playlist()
+    await queue.add_job(first, "a0", status=DownloadJobStatus.RUNNING)
+    await queue.add_job(first, "a1")
+    await queue.add_job(second, "b1")
+
+    assert await queue.claim_all() == ["b1", "a1"]
+
+
+async def test_claimed_job_is_running(db):
+    queue = Queue(db)
+    job = await queue.add_job(await queue.add_playlist(), "a1")
+
+    await queue.claim()
+    await db.refresh(job)
+
+    assert job.status == DownloadJobStatus.RUNNING
+    assert job.worker_id == "test-worker"
+    assert job.attempts == 1
+
+
+async def test_skips_the_saturated_playlists(db):
+    queue = Queue(db)
+    first, second = await queue.add_playlist(), await queue.add_playlist()
+    await queue.add_job(first, "a1")
+    await queue.add_job(second, "b1")
+
+    assert await queue.claim([first.id]) == "b1"
+    assert await queue.claim([first.id]) is None
+
+
+async def test_waits_for_the_backoff_of_retried_jobs(db):
+    queue = Queue(db)
+    playlist = await queue.add_playlist()
+    # Far from the database clock, frozen at the start of the test transaction
+    await queue.add_job(playlist, "retried later", available_at=Datetime(2100, 1, 1, tzinfo=timezone.utc))
+    await queue.add_job(playlist, "retried", available_at=Datetime(2000, 1, 1, tzinfo=timezone.utc))
+
+    assert await queue.claim_all() == ["retried"]
+
+
+async def test_global_concurrency_cap(db, monkeypatch):
+    monkeypatch.setattr(download_jobs, "DOWNLOAD_GLOBAL_CONCURRENCY", 1)
+    queue = Queue(db)
+    playlist = await queue.add_playlist()
+    await queue.add_job(playlist, "a0", status=DownloadJobStatus.RUNNING)
+    await queue.add_job(playlist, "a1")
+
+    assert await queue.claim() is None
@@ -0,0 +1,127 @@
+import pytest
+
+import utils.download_playlist_video as download_playlist_video
+from database.models import DownloadFormat, DownloadQuality, Playlist
+from utils.download_playlist_video import get_global_tuning, get_tuning_args, validate_tuning
+
+
+def make_playlist(
+    format: DownloadFormat = DownloadFormat.VIDEO,
+    quality: DownloadQuality = DownloadQuality.q_1080p,
+    **tuning,
+) -> Playlist:
+    return Playlist(default_format=format, default_quality=quality, **tuning)
+
+
+def get_option(args: list[str], option: str) -> str | None:
+    return args[args.index(option) + 1] if option in args else None
+
+
+@pytest.fixture(autouse=True)
+def no_global_tuning(monkeypatch):
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_CONCURRENT_FRAGMENTS", None)
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_HTTP_CHUNK_SIZE", None)
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_EXTERNAL_DOWNLOADER", None)
+    monkeypatch.setattr(download_playlist_video, "DOWNLOAD_EXTERNAL_DOWNLOADER_ARGS", "")
+
+
+@pytest.mark.parametrize("quality, fragments, chunk_size", [
+    (DownloadQuality.q_best, "8", "10M"),
+    (DownloadQuality.q_2160p, "8", "10M"),
+    (DownloadQuality.q_1440p, "6", "10M"),
+    (DownloadQuality.q_1080p, "4", "10M"),
+    (DownloadQuality.q_720p, "2", None),
+    (DownloadQuality.q_480p, "1", None),
+    (DownloadQuality.q_360p, "1", None),
+])
+def test_auto_tuning_by_quality(quality, fragments, chunk_size):
+    args = get_tuning_args(make_playlist(quality=quality))
+    assert get_option(args, "--concurrent-fragments") == fragments
+    assert get_option(args, "--http-chunk-size") == chunk_size
+    assert "--downloader" not in args
+
+
+def test_audio_uses_a_single_connection():
+    args = get_tuning_args(make_playlist(DownloadFormat.AUDIO, DownloadQuality.q_best))
+    assert args == ["--concurrent-fragments", "1"]
+
+
+def test_global_settings_override_auto(monkeypatch):
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_CONCURRENT_FRAGMENTS", 3)
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_HTTP_CHUNK_SIZE", "5M")
+
+    args = get_tuning_args(make_playlist(DownloadFormat.AUDIO))
+
+    assert get_option(args, "--concurrent-fragments") == "3"
+    assert get_option(args, "--http-chunk-size") == "5M"
+
+
+def test_playlist_settings_override_global(monkeypatch):
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_CONCURRENT_FRAGMENTS", 3)
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_HTTP_CHUNK_SIZE", "5M")
+    monkeypatch.setattr(download_playlist_video, "GLOBAL_EXTERNAL_DOWNLOADER", "aria2c")
+
+    args = get_tuning_args(make_playlist(
+        default_concurrent_fragments=12,
+        default_http_chunk_size="20M",
+        default_external_downloader="native",
+    ))
+
+    assert get_option(args, "--concurrent-fragments") == "12"
+    assert get_option(args, "--http-chunk-size") == "20M"
+    assert get_option(args, "--downloader") == "native"
+    assert "--downloader-args" not in args
+
+
+def test_aria2c_gets_a_connection_per_fragment():
+    args = get_tuning_args(make_playlist(quality=DownloadQuality.q_1440p, default_external_downloader="aria2c"))
+
+    assert get_option(args, "--downloader") == "aria2c"
+    assert get_option(args, "--downloader-args") == "aria2c:-x 6 -s 6 -k 1M"
+
+
+def test_configured_downloader_args_are_kept(monkeypatch):
+    monkeypatch.setattr(download_playlist_video, "DOWNLOAD_EXTERNAL_DOWNLOADER_ARGS", "-x 2")
+
+    args = get_tuning_args(make_playlist(default_external_downloader="aria2c"))
+
+    assert get_option(args, "--downloader-args") == "aria2c:-x 2"
+
+
+@pytest.mark.parametrize("key, value", [
+    ("default_concurrent_fragments", 1),
+    ("default_concurrent_fragments", 16),
+    ("default_http_chunk_size", "10M"),
+    ("default_http_chunk_size", "1048576"),
+    ("default_external_downloader", "aria2c"),
+    ("default_external_downloader", "native"),
+    ("default_external_downloader", None),
+    ("title", "Not a tuning setting"),
+])
+def test_valid_tuning(key, value):
+    assert validate_tuning(key, value) is None
+
+
+@pytest.mark.parametrize("key, value", [
+    ("default_concurrent_fragments", 0),
+    ("default_concurrent_fragments", -4),
+    ("default_concurrent_fragments", "4"),
+    ("default_concurrent_fragments", True),
+    ("default_http_chunk_size", "10 MB"),
+    ("default_http_chunk_size", "10M --exec rm"),
+    ("default_http_chunk_size", "10M\n"),
+    ("default_http_chunk_size", 10),
+    ("default_external_downloader", "/tmp/evil"),
+    ("default_external_downloader", "aria2c; rm -rf /"),
+    ("default_external_downloader", "/usr/bin/aria2c"),
+])
+def test_invalid_tuning(key, value):
+    assert validate_tuning(key, value)
+
+
+def test_invalid_global_tuning_is_ignored():
+    assert get_global_tuning("DOWNLOAD_EXTERNAL_DOWNLOADER", "default_external_downloader", "/tmp/evil") is None
+    assert get_global_tuning("DOWNLOAD_HTTP_CHUNK_SIZE", "default_http_chunk_size", "ten") is None
+    assert get_global_tuning("DOWNLOAD_CONCURRENT_FRAGMENTS", "default_concurrent_fragments", -1) is None
+    assert get_global_tuning("DOWNLOAD_HTTP_CHUNK_SIZE", "default_http_chunk_size", "5M") == "5M"
+    assert get_global_tuning("DOWNLOAD_CONCURRENT_FRAGMENTS", "default_concurrent_fragments", 0) is None
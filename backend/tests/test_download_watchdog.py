@@ -0,0 +1,49 @@
+import time
+
+import pytest
+
+from utils.download_watchdog import DownloadStalledError, DownloadWatchdog
+
+
+def stalled_watchdog(stall_seconds=10, deadline_seconds=None) -> DownloadWatchdog:
+    watchdog = DownloadWatchdog(stall_seconds, deadline_seconds)
+    watchdog.last_progress = time.monotonic() - stall_seconds - 1
+    return watchdog
+
+
+def test_no_progress_stalls():
+    with pytest.raises(DownloadStalledError) as e:
+        stalled_watchdog().check(time.monotonic())
+    assert e.value.reason == "stalled"
+
+
+def test_download_progress_is_activity():
+    watchdog = stalled_watchdog()
+    watchdog.progress({"filename": "video.mp4", "status": "downloading", "downloaded_bytes": 1024})
+    watchdog.check(time.monotonic())
+
+
+def test_output_line_is_activity():
+    watchdog = stalled_watchdog()
+    watchdog.activity()
+    watchdog.check(time.monotonic())
+
+
+def test_postprocessor_suspends_the_stall_timer():
+    watchdog = stalled_watchdog()
+    watchdog.activity({"status": "started", "postprocessor": "Merger"})
+    watchdog.last_progress -= 3600  # A long merge, without any output
+    watchdog.check(time.monotonic())
+
+    watchdog.activity({"status": "finished", "postprocessor": "Merger"})
+    watchdog.last_progress -= 3600
+    with pytest.raises(DownloadStalledError):
+        watchdog.check(time.monotonic())
+
+
+def test_deadline_applies_while_postprocessing():
+    watchdog = stalled_watchdog(deadline_seconds=60)
+    watchdog.activity({"status": "started", "postprocessor": "Merger"})
+    with pytest.raises(DownloadStalledError) as e:
+        watchdog.check(time.monotonic() - 61)
+    assert e.value.reason == "deadline"
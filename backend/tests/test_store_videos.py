@@ -0,0 +1,58 @@
+import pytest
+
+from utils.store_videos import compute_content_hash, get_video_content_hash
+
+
+# Processed video details (see `process_video_details`)
+VIDEO = {
+    "id": "dQw4w9WgXcQ",
+    "title": "Never Gonna Give You Up",
+    "description": "The official video",
+    "thumbnail": "https://i.ytimg.com/vi/dQw4w9WgXcQ/maxresdefault.jpg",
+    "upload_date": "20091025",
+    "duration_string": "3:33",
+    "channel_id": "UCuAXFkgsw1L7xaCfnd5JJOw",
+    "uploader": "Rick Astley",
+    "channel_url": "https://www.youtube.com/channel/UCuAXFkgsw1L7xaCfnd5JJOw",
+    "uploader_id": "UCuAXFkgsw1L7xaCfnd5JJOw",
+    "uploader_url": "https://www.youtube.com/channel/UCuAXFkgsw1L7xaCfnd5JJOw",
+    "is_available": True,
+}
+
+
+def test_same_values_same_hash():
+    assert compute_content_hash({"a": 1, "b": "x"}) == compute_content_hash({"a": 1, "b": "x"})
+
+
+def test_hash_ignores_key_order():
+    assert compute_content_hash({"a": 1, "b": "x"}) == compute_content_hash({"b": "x", "a": 1})
+
+
+def test_hash_is_stable_across_runs():
+    # Stored in the database: the fingerprint of given values must never change
+    assert compute_content_hash({"title": "t", "available": True}) == (
+        "31facb457efe826eb4d406a3b495396b9348a45d08307bf41deaf665f9f0a2fc"
+    )
+
+
+def test_unchanged_video_same_hash():
+    assert get_video_content_hash(VIDEO) == get_video_content_hash(dict(VIDEO))
+
+
+@pytest.mark.parametrize("field, value", [
+    ("title", "Never Gonna Give You Up (Remastered)"),
+    ("description", ""),
+    ("thumbnail", "https://i.ytimg.com/vi/dQw4w9WgXcQ/hqdefault.jpg"),
+    ("upload_date", "20091026"),
+    ("duration_string", "3:34"),
+    ("channel_id", "UCother"),
+    ("is_available", False),
+])
+def test_changed_field_changes_hash(field, value):
+    assert get_video_content_hash({**VIDEO, field: value}) != get_video_content_hash(VIDEO)
+
+
+def test_missing_availability_is_available():
+    video = dict(VIDEO)
+    del video["is_available"]
+    assert get_video_content_hash(video) == get_video_content_hash(VIDEO)
@@ -0,0 +1,143 @@
+import pytest
+
+import utils.youtube_api as youtube_api
+from utils.youtube_api import iter_playlist_pages
+
+
+PAGE_SIZE = 2
+
+
+class FakeRequest:
+    def __init__(self, response: dict):
+        self.response = response
+
+    async def execute(self) -> dict:
+        return self.response
+
+
+class FakePlaylistItems:
+    """
+    playlistItems.list over a playlist of (video id, publication date) items, `PAGE_SIZE` items per page.
+    """
+    def __init__(self, items: list[tuple[str, str]]):
+        self.items = items
+        self.requested_tokens = []
+
+    def list(self, pageToken=None, **params) -> FakeRequest:
+        self.requested_tokens.append(pageToken)
+        start = int(pageToken or 0)
+        response = {
+            "pageInfo": {"totalResults": len(self.items)},
+            "items": [
+                {"contentDetails": {"videoId": video_id, "videoPublishedAt": f"{published}T00:00:00Z"}}
+                for video_id, published in self.items[start:start + PAGE_SIZE]
+            ],
+        }
+        if start + PAGE_SIZE < len(self.items):
+            response["nextPageToken"] = str(start + PAGE_SIZE)
+        return FakeRequest(response)
+
+
+class FakeYouTube:
+    def __init__(self, items: list[tuple[str, str]]):
+        self.playlist_items = FakePlaylistItems(items)
+
+    def playlistItems(self) -> FakePlaylistItems:
+        return self.playlist_items
+
+
+@pytest.fixture
+def youtube(monkeypatch):
+    def install(items: list[tuple[str, str]]) -> FakePlaylistItems:
+        fake = FakeYouTube(items)
+        monkeypatch.setattr(youtube_api, "YOUTUBE", fake)
+        return fake.playlist_items
+    return install
+
+
+async def enumerate_ids(**kwargs) -> list[str]:
+    video_ids = []
+    async for page, _ in iter_playlist_pages("PL", **kwargs):
+        video_ids.extend(item["contentDetails"]["videoId"] for item in page)
+    return video_ids
+
+
+def playlist(nb_items: int, nb_new: int = 0) -> list[tuple[str, str]]:
+    """
+    Items ordered from the newest, the first `nb_new` ones published after 2024-06-01.
+    """
+    return [
+        (f"new{i}", "2024-07-01") for i in range(nb_new)
+    ] + [
+        (f"old{i}", "2024-01-01") for i in range(nb_items - nb_new)
+    ]
+
+
+async def test_full_enumeration_reads_every_page(youtube):
+    youtube(playlist(7))
+    assert await enumerate_ids() == [f"old{i}" for i in range(7)]
+
+
+async def test_delta_stops_once_the_new_items_are_found(youtube):
+    items = playlist(10, nb_new=3)
+    playlist_items = youtube(items)
+    known = {video_id for video_id, _ in items[3:]}
+
+    video_ids = await enumerate_ids(known_video_ids=known, last_published="20240601")
+
+    # The 3 new items are on the first 2 pages, paging stops at the next page without new items
+    assert video_ids == ["new0", "new1", "new2", "old0", "old1", "old2"]
+    assert len(playlist_items.requested_tokens) == 3
+
+
+async def test_delta_without_new_items_on_the_first_page_reads_every_page(youtube):
+    items = playlist(10)
+    playlist_items = youtube(items)
+
+    await enumerate_ids(known_video_ids={video_id for video_id, _ in items}, last_published="20240601")
+
+    assert len(playlist_items.requested_tokens) == 5
+
+
+async def test_delta_finds_an_item_added_while_another_was_removed(youtube):
+    # Same number of items as at the last sync: one was removed, one appended at the end
+    items = playlist(9) + [("added0", "2023-01-01")]
+    youtube(items)
+    known = {video_id for video_id, _ in items[:-1]} | {"removed0"}
+
+    video_ids = await enumerate_ids(known_video_ids=known, last_published="20240601")
+
+    assert "added0" in video_ids
+
+
+async def test_delta_stops_on_a_known_page_after_recent_items(youtube):
+    # An old item was never stored (unavailable video): one more new item is expected than there is
+    items = playlist(10, nb_new=2)
+    playlist_items = youtube(items)
+    known = {video_id for video_id, _ in items[2:]} - {"old7"}
+
+    video_ids = await enumerate_ids(known_video_ids=known, last_published="20240601")
+
+    # Page 1: new recent items, page 2: only known items
+    assert video_ids == ["new0", "new1", "old0", "old1"]
+    assert len(playlist_items.requested_tokens) == 2
+
+
+async def test_delta_goes_on_while_new_items_are_not_recent(youtube):
+    # New items published before the last sync (added from an old video): no early stop
+    items = [("added0", "2023-01-01"), ("added1", "2023-01-01")] + playlist(8)
+    playlist_items = youtube(items)
+    known = {video_id for video_id, _ in items[2:]} - {"old7"}
+
+    await enumerate_ids(known_video_ids=known, last_published="20240601")
+
+    assert len(playlist_items.requested_tokens) == 5
+
+
+async def test_resume_from_page_token(youtube):
+    playlist_items = youtube(playlist(7))
+
+    video_ids = await enumerate_ids(page_token="4")
+
+    assert playlist_items.requested_tokens[0] == "4"
+    assert video_ids == ["old4", "old5", "old6"]
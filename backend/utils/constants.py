@@ -5,3 +5,55 @@ DEVELOPMENT = os.getenv("DEVELOPMENT", "false").lower() == "true"
 MEDIA_STORAGE_PATH = "/Media" if not DEVELOPMENT else "Media"
 METADATA_STORAGE_PATH = "/app/metadata" if not DEVELOPMENT else "metadata"
 UPLOADS_PATH = "/app/uploads" if not DEVELOPMENT else "uploads"
+
+# YouTube Data API client
+YOUTUBE_API_TIMEOUT = float(os.getenv("YOUTUBE_API_TIMEOUT", "15"))
+YOUTUBE_API_MAX_CONNECTIONS = int(os.getenv("YOUTUBE_API_MAX_CONNECTIONS", "20"))
+YOUTUBE_API_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("YOUTUBE_API_MAX_KEEPALIVE_CONNECTIONS", "10"))
+YOUTUBE_API_CONCURRENCY = int(os.getenv("YOUTUBE_API_CONCURRENCY", "4"))
+YOUTUBE_API_CHUNK_RETRIES = int(os.getenv("YOUTUBE_API_CHUNK_RETRIES", "2"))
+YOUTUBE_API_CACHE_TTL_HOURS = float(os.getenv("YOUTUBE_API_CACHE_TTL_HOURS", "168"))  # ETag cache of the API responses
+YOUTUBE_API_CACHE_MAX_ENTRIES = int(os.getenv("YOUTUBE_API_CACHE_MAX_ENTRIES", "20000"))
+
+# YouTube Data API quota (units per day, shares of the daily budget)
+YOUTUBE_QUOTA_DAILY_BUDGET = int(os.getenv("YOUTUBE_QUOTA_DAILY_BUDGET", "10000"))
+YOUTUBE_QUOTA_SCHEDULED_RESERVE = float(os.getenv("YOUTUBE_QUOTA_SCHEDULED_RESERVE", "0.2"))
+YOUTUBE_QUOTA_BULK_LIMIT = float(os.getenv("YOUTUBE_QUOTA_BULK_LIMIT", "0.5"))
+
+# Video metadata cache
+VIDEO_CACHE_TTL_HOURS = float(os.getenv("VIDEO_CACHE_TTL_HOURS", "72"))
+VIDEO_CACHE_MAX_ENTRIES = int(os.getenv("VIDEO_CACHE_MAX_ENTRIES", "50000"))
+
+# Uploader avatars
+AVATAR_DOWNLOAD_CONCURRENCY = int(os.getenv("AVATAR_DOWNLOAD_CONCURRENCY", "2"))  # Avatars downloaded at the same time (and yt-dlp fallbacks)
+AVATAR_HTTP_TIMEOUT = float(os.getenv("AVATAR_HTTP_TIMEOUT", "15"))
+
+# Playlist synchronization
+FULL_SYNC_INTERVAL_DAYS = int(os.getenv("FULL_SYNC_INTERVAL_DAYS", "7"))
+SWEEP_PLAYLIST_CONCURRENCY = int(os.getenv("SWEEP_PLAYLIST_CONCURRENCY", "4"))
+
+# Downloads
+DOWNLOAD_CONCURRENCY = int(os.getenv("DOWNLOAD_CONCURRENCY", "3"))  # Simultaneous downloads on the server
+DOWNLOAD_PLAYLIST_CONCURRENCY = int(os.getenv("DOWNLOAD_PLAYLIST_CONCURRENCY", "2"))  # Simultaneous downloads per playlist
+DOWNLOAD_GLOBAL_CONCURRENCY = int(os.getenv("DOWNLOAD_GLOBAL_CONCURRENCY", "0"))  # Simultaneous downloads on all the workers, 0 for no limit
+DOWNLOAD_JOB_POLL_SECONDS = float(os.getenv("DOWNLOAD_JOB_POLL_SECONDS", "10"))  # Queue polling interval of the dispatcher
+DOWNLOAD_JOB_HEARTBEAT_SECONDS = float(os.getenv("DOWNLOAD_JOB_HEARTBEAT_SECONDS", "15"))
+DOWNLOAD_JOB_STALE_SECONDS = float(os.getenv("DOWNLOAD_JOB_STALE_SECONDS", "120"))  # Running jobs without heartbeat are requeued after this delay
+DOWNLOAD_JOB_MAX_ATTEMPTS = int(os.getenv("DOWNLOAD_JOB_MAX_ATTEMPTS", "3"))
+DOWNLOAD_JOB_RETENTION_DAYS = int(os.getenv("DOWNLOAD_JOB_RETENTION_DAYS", "7"))  # Finished jobs are deleted after this delay
+DOWNLOAD_WORKERS_IN_API = os.getenv("DOWNLOAD_WORKERS_IN_API", "true").lower() == "true"  # Run the downloads in the API process, false when standalone workers are used
+DOWNLOAD_STALL_SECONDS = float(os.getenv("DOWNLOAD_STALL_SECONDS", "120"))  # Downloads without progress for this delay are killed and retried, 0 to disable
+DOWNLOAD_DEADLINE_SECONDS = float(os.getenv("DOWNLOAD_DEADLINE_SECONDS", "3600"))  # Longest download of an item, 0 for no limit
+DOWNLOAD_POSTPROCESS_DEADLINE_SECONDS = float(os.getenv("DOWNLOAD_POSTPROCESS_DEADLINE_SECONDS", "1800"))  # Longest post-processing of an item, 0 for no limit
+DOWNLOAD_RETRIES = int(os.getenv("DOWNLOAD_RETRIES", "3"))  # Retries of a download failing with a network error, queued again after a backoff
+DOWNLOAD_RETRY_BASE_SECONDS = float(os.getenv("DOWNLOAD_RETRY_BASE_SECONDS", "5"))  # Backoff before the first retry, doubled for each retry (with jitter)
+DOWNLOAD_RETRY_MAX_SECONDS = float(os.getenv("DOWNLOAD_RETRY_MAX_SECONDS", "120"))
+DOWNLOAD_LOG_LINES = int(os.getenv("DOWNLOAD_LOG_LINES", "200"))  # Lines of yt-dlp output kept per download, saved when it fails
+DOWNLOAD_CONCURRENT_FRAGMENTS = int(os.getenv("DOWNLOAD_CONCURRENT_FRAGMENTS", "0"))  # Fragments of a stream downloaded in parallel (-N), 0 for auto (by quality)
+DOWNLOAD_HTTP_CHUNK_SIZE = os.getenv("DOWNLOAD_HTTP_CHUNK_SIZE", "")  # Size of the HTTP requests of a stream (e.g. 10M), empty for auto (by quality)
+DOWNLOAD_EXTERNAL_DOWNLOADER = os.getenv("DOWNLOAD_EXTERNAL_DOWNLOADER", "")  # e.g. aria2c, empty for the yt-dlp downloader
+DOWNLOAD_EXTERNAL_DOWNLOADER_ARGS = os.getenv("DOWNLOAD_EXTERNAL_DOWNLOADER_ARGS", "")  # Arguments of the external downloader, auto for aria2c if empty
+DOWNLOAD_PROGRESS_INTERVAL = float(os.getenv("DOWNLOAD_PROGRESS_INTERVAL", "1"))  # Minimum time between two progress updates of a download, in seconds
+DOWNLOAD_POSTPROCESS_CONCURRENCY = int(os.getenv("DOWNLOAD_POSTPROCESS_CONCURRENCY", str(os.cpu_count() or 1)))  # Simultaneous ffmpeg post-processings (audio extraction, tagging)
+DOWNLOAD_STAGING_PATH = os.getenv("DOWNLOAD_STAGING_PATH", os.path.join(METADATA_STORAGE_PATH, "staging"))  # Downloaded streams waiting for post-processing
+YTDLP_PERSISTENT_PROCESSES = os.getenv("YTDLP_PERSISTENT_PROCESSES", "true").lower() == "true"  # Reuse long-lived yt-dlp processes, false to spawn yt-dlp for each job
@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class DiskCache:
+    """
+    Small persistent key/value store backed by a SQLite file.
+
+    Values are JSON serializable objects. It is only meant for local caches,
+    the data can be lost at any time without breaking the application.
+
+    Args:
+        path (str): Path of the SQLite file, it can be shared by several caches.
+        name (str): Name of the table holding this cache.
+        ttl (float): Seconds after which an entry is considered expired, never if None.
+        max_entries (int): Oldest entries are evicted above this size, unbounded if None.
+    """
+    def __init__(self, path: str, name: str, ttl: float | None = None, max_entries: int | None = None):
+        self.path = path
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.name} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL DEFAULT 0)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.name}_created_at ON {self.name} (created_at)"
+            )
+        return self._connection
+
+    def _min_created_at(self) -> float:
+        return time.time() - self.ttl if self.ttl is not None else float("-inf")
+
+    def get(self, key: str):
+        with self._lock:
+            row = self._get_connection().execute(
+                f"SELECT value FROM {self.name} WHERE key = ? AND created_at >= ?",
+                (key, self._min_created_at()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def get_many(self, keys: list) -> dict:
+        """
+        Return the non expired values of the given keys, missing keys are left out.
+        """
+        values = {}
+        with self._lock:
+            connection = self._get_connection()
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = connection.execute(
+                    f"SELECT key, value FROM {self.name} "
+                    f"WHERE key IN ({', '.join('?' * len(chunk))}) AND created_at >= ?",
+                    (*chunk, self._min_created_at()),
+                ).fetchall()
+                values.update({key: json.loads(value) for key, value in rows})
+        return values
+
+    def set(self, key: str, value):
+        self.set_many({key: value})
+
+    def set_many(self, values: dict):
+        now = time.time()
+        with self._lock:
+            connection = self._get_connection()
+            connection.executemany(
+                f"INSERT OR REPLACE INTO {self.name} (key, value, created_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(value), now) for key, value in values.items()],
+            )
+            if self.max_entries is not None:
+                # Evict the oldest entries above the size limit
+                connection.execute(
+                    f"DELETE FROM {self.name} WHERE key IN "
+                    f"(SELECT key FROM {self.name} ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                )
+            connection.commit()
+
+    def delete(self, key: str):
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute(f"DELETE FROM {self.name} WHERE key = ?", (key,))
+            connection.commit()
+
+    def clear(self):
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute(f"DELETE FROM {self.name}")
+            connection.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._get_connection().execute(f"SELECT COUNT(*) FROM {self.name}").fetchone()[0]
@@ -0,0 +1,72 @@
+import random
+import re
+from enum import Enum as PyEnum
+from typing import Iterable
+
+from utils.constants import DOWNLOAD_RETRY_BASE_SECONDS, DOWNLOAD_RETRY_MAX_SECONDS
+
+
+class DownloadErrorKind(str, PyEnum):
+    TRANSIENT = "TRANSIENT"  # Network errors, rate limiting: likely to work a bit later
+    PERMANENT = "PERMANENT"  # Private, removed or geo-blocked video: fails until the video changes
+
+
+class DownloadRetryError(Exception):
+    """
+    Raised when a download fails with a transient error, its job is queued again after a backoff.
+    """
+
+
+PERMANENT_PATTERNS = re.compile(
+    r"private video|video unavailable|video is unavailable|no longer available|has been removed"
+    r"|removed by the uploader|account .* (?:terminated|closed)|copyright"
+    r"|not available in your country|not made this video available in your country|geo.?restrict"
+    r"|members.only|join this channel",
+    re.IGNORECASE,
+)
+# Checked before the permanent patterns: when rate limiting, YouTube reports
+# "Video unavailable. This content isn't available, try again later."
+TRANSIENT_PATTERNS = re.compile(
+    r"try again later|confirm you.re not a bot"
+    r"|HTTP Error (?:408|429|5\d\d)|too many requests|rate.?limit|throttl"
+    r"|timed? ?out|connection (?:reset|refused|aborted)|remote end closed|incompleteread"
+    r"|temporary failure in name resolution|name or service not known|network is unreachable"
+    r"|urlopen error|giving up after \d+ (?:fragment )?retries",
+    re.IGNORECASE,
+)
+
+
+def get_error_line(lines: Iterable[str] | None) -> str | None:
+    """
+    The last error printed by yt-dlp in the output of a download.
+    """
+    for line in reversed(list(lines or ())):
+        if line.startswith("ERROR:"):
+            return line.removeprefix("ERROR:").strip()
+    return None
+
+
+def classify_error(error: str | None) -> DownloadErrorKind | None:
+    """
+    Classe l'erreur d'un téléchargement à partir du message de yt-dlp.
+
+    Returns:
+        DownloadErrorKind: TRANSIENT or PERMANENT, None if the error is unknown.
+    """
+    if not error:
+        return None
+    if TRANSIENT_PATTERNS.search(error):
+        return DownloadErrorKind.TRANSIENT
+    if PERMANENT_PATTERNS.search(error):
+        return DownloadErrorKind.PERMANENT
+    return None
+
+
+def get_retry_delay(attempt: int) -> float:
+    """
+    Exponential backoff with full jitter, so the retries of simultaneous downloads spread out.
+
+    Args:
+        attempt (int): The number of the failed attempt, from 1.
+    """
+    return random.uniform(0, min(DOWNLOAD_RETRY_MAX_SECONDS, DOWNLOAD_RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
@@ -0,0 +1,630 @@
+import asyncio
+import os
+import socket
+import time
+from collections import Counter
+from datetime import datetime as Datetime, timedelta, timezone
+
+from database.models import DownloadJob, DownloadJobPriority, DownloadJobStatus, DownloadState, Playlist, PlaylistVideo
+from database.database import SessionLocal
+from sqlalchemy import update, delete, func, exists, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from websocket_manager import ws_manager
+
+from utils.constants import (
+    DOWNLOAD_CONCURRENCY,
+    DOWNLOAD_PLAYLIST_CONCURRENCY,
+    DOWNLOAD_POSTPROCESS_CONCURRENCY,
+    DOWNLOAD_JOB_POLL_SECONDS,
+    DOWNLOAD_JOB_HEARTBEAT_SECONDS,
+    DOWNLOAD_JOB_STALE_SECONDS,
+    DOWNLOAD_JOB_MAX_ATTEMPTS,
+    DOWNLOAD_JOB_RETENTION_DAYS,
+    DOWNLOAD_GLOBAL_CONCURRENCY,
+    DOWNLOAD_RETRIES,
+)
+from utils.download_video import download_playlist_video
+from utils.download_watchdog import DownloadStalledError
+from utils.download_errors import DownloadRetryError, get_retry_delay
+from utils.pg_notify import notify, DOWNLOAD_JOBS_CHANNEL
+from utils.ytdlp_pool import new_log
+
+
+ACTIVE_STATUSES = [DownloadJobStatus.QUEUED, DownloadJobStatus.RUNNING]
+
+# Identifies the jobs claimed by this process
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+STALE_JOB_ERROR = "Interrupted too many times"
+
+# Key of the advisory lock serializing the claims when the number of running jobs is capped
+CLAIM_LOCK_KEY = 7304185
+
+
+async def enqueue_jobs(
+    playlist_id,
+    playlist_video_ids: list,
+    db: AsyncSession,
+    batch_id=None,
+    priority: DownloadJobPriority = DownloadJobPriority.PLAYLIST,
+) -> int:
+    """
+    Queue the download of playlist items. Items that already have a job queued or running are skipped.
+
+    Args:
+        playlist_id: Id of the playlist of the items.
+        playlist_video_ids (list): Ids of the PlaylistVideo to download.
+        db (AsyncSession): The database session, committed by this function.
+        batch_id: Groups the jobs of a playlist download, to send its summary once they are all finished.
+        priority (DownloadJobPriority): Jobs of a higher priority are claimed first.
+
+    Returns:
+        int: The number of jobs queued.
+    """
+    if not playlist_video_ids:
+        return 0
+
+    result = await db.execute(
+        insert(DownloadJob)
+        .values([
+            {"playlist_video_id": playlist_video_id, "playlist_id": playlist_id, "batch_id": batch_id, "priority": priority}
+            for playlist_video_id in playlist_video_ids
+        ])
+        .on_conflict_do_nothing(
+            index_elements=[DownloadJob.playlist_video_id],
+            index_where=DownloadJob.status.in_(ACTIVE_STATUSES),
+        )
+        .returning(DownloadJob.id)
+    )
+    queued = len(result.all())
+    if queued:
+        # Wake the workers of other processes up, delivered on commit
+        await notify(DOWNLOAD_JOBS_CHANNEL, db=db)
+    await db.commit()
+
+    download_dispatcher.notify()
+    return queued
+
+
+async def has_active_jobs(db: AsyncSession, playlist_id=None, playlist_video_id=None) -> bool:
+    """
+    Check if a playlist, or one of its items, has downloads queued or running.
+    """
+    query = select(DownloadJob.id).where(DownloadJob.status.in_(ACTIVE_STATUSES)).limit(1)
+    if playlist_id is not None:
+        query = query.where(DownloadJob.playlist_id == playlist_id)
+    if playlist_video_id is not None:
+        query = query.where(DownloadJob.playlist_video_id == playlist_video_id)
+    result = await db.execute(query)
+    return result.scalar_one_or_none() is not None
+
+
+def get_queue_order(exclude_playlist_ids: list = ()):
+    """
+    Query the queued jobs in the order they are claimed: by priority, then in turns across
+    the playlists (the first job of each playlist, then the second one...), so a large
+    playlist doesn't hold the queue up for the others. The running jobs of a playlist take
+    its first turns.
+
+    Returns:
+        tuple: The subquery of the active jobs (`id`, `turn`) and the order of the jobs to apply
+            with it, on the queued jobs.
+    """
+    ranked = (
+        select(
+            DownloadJob.id,
+            func.row_number().over(
+                partition_by=(DownloadJob.priority, DownloadJob.playlist_id),
+                order_by=(DownloadJob.status != DownloadJobStatus.RUNNING, DownloadJob.created_at, DownloadJob.id),
+            ).label("turn"),
+        )
+        .where(DownloadJob.status.in_(ACTIVE_STATUSES))
+    )
+    if exclude_playlist_ids:
+        ranked = ranked.where(DownloadJob.playlist_id.not_in(exclude_playlist_ids))
+    ranked = ranked.subquery()
+    return ranked, (DownloadJob.priority, ranked.c.turn, DownloadJob.created_at, DownloadJob.id)
+
+
+async def claim_job(db: AsyncSession, worker_id: str, exclude_playlist_ids: list = ()) -> DownloadJob | None:
+    """
+    Claim the next queued job (see `get_queue_order`), skipping the playlists that reached
+    their concurrency limit, unless DOWNLOAD_GLOBAL_CONCURRENCY jobs already run on all the workers.
+
+    The job is locked with `FOR UPDATE SKIP LOCKED`, so several workers (processes or hosts)
+    can claim jobs concurrently without getting the same one nor waiting for each other.
+
+    Returns:
+        DownloadJob: The claimed job, now RUNNING, or None if there is nothing to claim.
+    """
+    if DOWNLOAD_GLOBAL_CONCURRENCY > 0:
+        # Claims are serialized (until the commit) so concurrent workers can't exceed the cap together
+        await db.execute(select(func.pg_advisory_xact_lock(CLAIM_LOCK_KEY)))
+        result = await db.execute(
+            select(func.count()).select_from(DownloadJob).where(DownloadJob.status == DownloadJobStatus.RUNNING)
+        )
+        if result.scalar_one() >= DOWNLOAD_GLOBAL_CONCURRENCY:
+            await db.commit()
+            return None
+
+    ranked, order = get_queue_order(exclude_playlist_ids)
+    candidate = (
+        select(DownloadJob.id)
+        .join(ranked, ranked.c.id == DownloadJob.id)
+        .where(
+            DownloadJob.status == DownloadJobStatus.QUEUED,
+            # Retried jobs wait for the end of their backoff
+            or_(DownloadJob.available_at.is_(None), DownloadJob.available_at <= func.now()),
+        )
+        .order_by(*order)
+        .limit(1)
+        .with_for_update(skip_locked=True, of=DownloadJob)
+    )
+
+    now = Datetime.now(timezone.utc)
+    result = await db.execute(
+        update(DownloadJob)
+        .where(DownloadJob.id == candidate.scalar_subquery())
+        .values(
+            status=DownloadJobStatus.RUNNING,
+            worker_id=worker_id,
+            attempts=DownloadJob.attempts + 1,
+            started_at=now,
+            heartbeat_at=now,
+        )
+        .returning(DownloadJob)
+    )
+    job = result.scalar_one_or_none()
+    await db.commit()
+    return job
+
+
+def describe_job(job: DownloadJob, playlist_video: PlaylistVideo, playlist: Playlist) -> dict:
+    return {
+        "id": str(job.id),
+        "status": job.status,
+        "priority": job.priority,
+        "playlist_id": playlist.source_id,
+        "playlist_title": playlist.title,
+        "video_id": playlist_video.video.source_id if playlist_video.video else None,
+        "video_title": playlist_video.video.title if playlist_video.video else None,
+        "attempts": job.attempts,
+        "worker_id": job.worker_id,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+    }
+
+
+async def get_queue(db: AsyncSession, limit: int = 50) -> dict:
+    """
+    Inspect the download queue: the number of jobs by status and priority, the running jobs
+    and the next queued jobs, in the order they will be claimed (unless their playlist reaches
+    its concurrency limit).
+    """
+    result = await db.execute(
+        select(DownloadJob.status, DownloadJob.priority, func.count())
+        .where(DownloadJob.status.in_(ACTIVE_STATUSES))
+        .group_by(DownloadJob.status, DownloadJob.priority)
+    )
+    counts = {status: {priority: 0 for priority in DownloadJobPriority} for status in ACTIVE_STATUSES}
+    for status, priority, count in result.all():
+        counts[status][priority] = count
+
+    jobs = (
+        select(DownloadJob, PlaylistVideo, Playlist)
+        .join(PlaylistVideo, PlaylistVideo.id == DownloadJob.playlist_video_id)
+        .join(Playlist, Playlist.id == DownloadJob.playlist_id)
+        .options(selectinload(PlaylistVideo.video))
+    )
+
+    result = await db.execute(
+        jobs.where(DownloadJob.status == DownloadJobStatus.RUNNING).order_by(DownloadJob.started_at)
+    )
+    running = [describe_job(*row) for row in result.all()]
+
+    ranked, order = get_queue_order()
+    result = await db.execute(
+        jobs.join(ranked, ranked.c.id == DownloadJob.id)
+        .where(DownloadJob.status == DownloadJobStatus.QUEUED)
+        .order_by(*order)
+        .limit(limit)
+    )
+    queued = [{"position": position, **describe_job(*row)} for position, row in enumerate(result.all(), start=1)]
+
+    return {
+        "queued": sum(counts[DownloadJobStatus.QUEUED].values()),
+        "running": sum(counts[DownloadJobStatus.RUNNING].values()),
+        "by_priority": {
+            priority: {status: counts[status][priority] for status in ACTIVE_STATUSES}
+            for priority in DownloadJobPriority
+        },
+        "running_jobs": running,
+        "next_jobs": queued,
+    }
+
+
+async def heartbeat_job(job_id):
+    """
+    Tell that a running job is still alive, so it isn't requeued.
+    """
+    async with SessionLocal() as db:
+        await db.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job_id)
+            .values(heartbeat_at=Datetime.now(timezone.utc))
+        )
+        await db.commit()
+
+
+async def complete_job(job_id, success: bool, error: str | None = None, log: str | None = None):
+    """
+    Mark a job as done or failed, the item of a failed job is set to ERROR.
+
+    Args:
+        log (str): The tail of the yt-dlp output, only kept for failed jobs.
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job_id)
+            .values(
+                status=DownloadJobStatus.DONE if success else DownloadJobStatus.FAILED,
+                error=error,
+                log=None if success else log,
+                finished_at=Datetime.now(timezone.utc),
+            )
+            .returning(DownloadJob.playlist_video_id)
+        )
+        playlist_video_id = result.scalar_one_or_none()
+        if not success and playlist_video_id is not None:
+            await db.execute(
+                update(PlaylistVideo)
+                .where(PlaylistVideo.id == playlist_video_id)
+                .values(state=DownloadState.ERROR)
+            )
+        await db.commit()
+
+
+async def send_given_up_messages(db: AsyncSession, playlist_video_ids: list, error: str):
+    """
+    Send the error status of items whose interrupted downloads were retried until their
+    jobs failed: their last attempt only sent a "retrying" status.
+    """
+    if not playlist_video_ids:
+        return
+    result = await db.execute(
+        select(PlaylistVideo)
+        .options(selectinload(PlaylistVideo.video), selectinload(PlaylistVideo.playlist))
+        .where(PlaylistVideo.id.in_(playlist_video_ids))
+    )
+    for playlist_video in result.scalars().all():
+        await ws_manager.send_message("playlists", {
+            "playlist_id": playlist_video.playlist.source_id,
+            "video_id": playlist_video.video.source_id,
+            "video_title": playlist_video.video.title,
+            "status": "error",
+            "message": error,
+        })
+
+
+async def retry_job(
+    job_id,
+    error: str,
+    log: str | None = None,
+    delay: float = 0,
+    max_attempts: int = DOWNLOAD_JOB_MAX_ATTEMPTS,
+) -> bool:
+    """
+    Queue a failed job again, unless it reached `max_attempts` attempts: the job is then
+    failed and its item set to ERROR.
+
+    Args:
+        delay (float): Seconds before the job can be claimed again, the download slot
+            is free for the other jobs meanwhile.
+
+    Returns:
+        bool: True if the job was queued again, False if it failed.
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id == job_id, DownloadJob.attempts < max_attempts)
+            .values(
+                status=DownloadJobStatus.QUEUED,
+                worker_id=None,
+                error=error,
+                log=log,
+                available_at=func.now() + timedelta(seconds=delay) if delay else None,
+            )
+            .returning(DownloadJob.playlist_video_id)
+        )
+        playlist_video_id = result.scalar_one_or_none()
+        if playlist_video_id is None:
+            await db.commit()
+            await complete_job(job_id, False, error, log)
+            result = await db.execute(select(DownloadJob.playlist_video_id).where(DownloadJob.id == job_id))
+            await send_given_up_messages(db, result.scalars().all(), error)
+            return False
+
+        await db.execute(
+            update(PlaylistVideo)
+            .where(PlaylistVideo.id == playlist_video_id)
+            .values(state=DownloadState.IDLE)
+        )
+        await notify(DOWNLOAD_JOBS_CHANNEL, db=db)
+        await db.commit()
+        return True
+
+
+async def release_jobs(job_ids: list):
+    """
+    Queue again the jobs of a worker that stops before finishing them.
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(
+            update(DownloadJob)
+            .where(DownloadJob.id.in_(job_ids), DownloadJob.status == DownloadJobStatus.RUNNING)
+            .values(status=DownloadJobStatus.QUEUED, worker_id=None, attempts=DownloadJob.attempts - 1)  # Not the job's fault
+            .returning(DownloadJob.playlist_video_id)
+        )
+        await db.execute(
+            update(PlaylistVideo)
+            .where(PlaylistVideo.id.in_(result.scalars().all()))
+            .values(state=DownloadState.IDLE)
+        )
+        await db.commit()
+
+
+async def requeue_stale_jobs() -> int:
+    """
+    Recover the jobs of the workers that stopped (restart, crash) without finishing them.
+
+    Running jobs without heartbeat for `DOWNLOAD_JOB_STALE_SECONDS` are queued again, or
+    failed after `DOWNLOAD_JOB_MAX_ATTEMPTS` attempts (their items are set to ERROR). Items
+    left as DOWNLOADING without a running job are reset, and the old finished jobs are deleted.
+
+    Returns:
+        int: The number of jobs recovered.
+    """
+    now = Datetime.now(timezone.utc)
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(DownloadJob).where(
+                DownloadJob.status == DownloadJobStatus.RUNNING,
+                func.coalesce(DownloadJob.heartbeat_at, DownloadJob.started_at)
+                < now - timedelta(seconds=DOWNLOAD_JOB_STALE_SECONDS),
+            )
+        )
+        stale_jobs = result.scalars().all()
+        failed_playlist_video_ids = []
+        for job in stale_jobs:
+            if job.attempts >= DOWNLOAD_JOB_MAX_ATTEMPTS:
+                print(f"Download job {job.id} interrupted {job.attempts} times, giving up")
+                job.status = DownloadJobStatus.FAILED
+                job.error = STALE_JOB_ERROR
+                job.finished_at = now
+                failed_playlist_video_ids.append(job.playlist_video_id)
+            else:
+                print(f"Requeuing interrupted download job {job.id}")
+                job.status = DownloadJobStatus.QUEUED
+                job.worker_id = None
+
+        # Items left as DOWNLOADING by a stopped worker
+        await db.execute(
+            update(PlaylistVideo)
+            .where(
+                PlaylistVideo.state == DownloadState.DOWNLOADING,
+                ~exists().where(
+                    DownloadJob.playlist_video_id == PlaylistVideo.id,
+                    DownloadJob.status == DownloadJobStatus.RUNNING,
+                ),
+            )
+            .values(state=DownloadState.IDLE)
+            .execution_options(synchronize_session=False)
+        )
+        if failed_playlist_video_ids:
+            await db.execute(
+                update(PlaylistVideo)
+                .where(PlaylistVideo.id.in_(failed_playlist_video_ids))
+                .values(state=DownloadState.ERROR)
+                .execution_options(synchronize_session=False)
+            )
+
+        await db.execute(
+            delete(DownloadJob).where(
+                DownloadJob.status.not_in(ACTIVE_STATUSES),
+                DownloadJob.finished_at < now - timedelta(days=DOWNLOAD_JOB_RETENTION_DAYS),
+            )
+        )
+        await db.commit()
+        await send_given_up_messages(db, failed_playlist_video_ids, STALE_JOB_ERROR)
+
+    return len(stale_jobs)
+
+
+async def send_batch_summary(batch_id) -> bool:
+    """
+    Send the summary of a playlist download once all its jobs are finished.
+
+    Returns:
+        bool: True if the summary was sent.
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(DownloadJob.status, func.count())
+            .where(DownloadJob.batch_id == batch_id)
+            .group_by(DownloadJob.status)
+        )
+        counts = dict(result.all())
+        if not counts or any(counts.get(status) for status in ACTIVE_STATUSES):
+            return False
+
+        result = await db.execute(
+            select(Playlist)
+            .join(DownloadJob, DownloadJob.playlist_id == Playlist.id)
+            .where(DownloadJob.batch_id == batch_id)
+            .limit(1)
+        )
+        playlist = result.scalar_one_or_none()
+
+    if playlist:
+        await ws_manager.send_message(
+            "playlists",
+            {"playlist_id": playlist.source_id, "download_success": True, "nb_download_failed": counts.get(DownloadJobStatus.FAILED, 0), "total_to_download": sum(counts.values()), "playlist_title": playlist.title, "message": "Playlist downloaded successfully" }
+        )
+    return True
+
+
+class DownloadDispatcher:
+    """
+    Runs the queued download jobs in this process, within the global and per playlist limits.
+
+    The limits apply to the download stage of the jobs: once its streams are downloaded,
+    a job waits for its post-processing (ffmpeg) without holding a download slot.
+    """
+    def __init__(self, concurrency: int, playlist_concurrency: int, postprocess_concurrency: int):
+        self.concurrency = concurrency
+        self.playlist_concurrency = playlist_concurrency
+        self.postprocess_concurrency = postprocess_concurrency
+        self.running: dict = {}  # Task by job id
+        self.running_by_playlist = Counter()  # Jobs in the download stage
+        self.postprocessing = set()  # Ids of the jobs in the post-processing stage
+        self.summarized_batches = set()
+        self.wakeup: asyncio.Event | None = None
+        self.task: asyncio.Task | None = None
+
+    def start(self):
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """
+        Wake the dispatcher up, jobs were queued or a slot was freed.
+        """
+        if self.wakeup:
+            self.wakeup.set()
+
+    async def _run(self):
+        last_recovery = 0
+        while True:
+            try:
+                if time.monotonic() - last_recovery >= DOWNLOAD_JOB_STALE_SECONDS / 2:
+                    last_recovery = time.monotonic()
+                    await requeue_stale_jobs()
+                await self._dispatch()
+            except Exception as e:
+                print(f"Error dispatching download jobs: {e}")
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=DOWNLOAD_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    async def _dispatch(self):
+        while (
+            len(self.running) - len(self.postprocessing) < self.concurrency
+            # Don't pile up downloaded streams when the post-processing is the bottleneck
+            and len(self.running) < self.concurrency + self.postprocess_concurrency
+        ):
+            saturated_playlist_ids = [
+                playlist_id for playlist_id, count in self.running_by_playlist.items()
+                if count >= self.playlist_concurrency
+            ]
+            async with SessionLocal() as db:
+                job = await claim_job(db, WORKER_ID, saturated_playlist_ids)
+            if job is None:
+                return
+
+            self.running_by_playlist[job.playlist_id] += 1
+            self.running[job.id] = asyncio.create_task(self._run_job(job))
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(DOWNLOAD_JOB_HEARTBEAT_SECONDS)
+            try:
+                await heartbeat_job(job_id)
+            except Exception as e:
+                print(f"Error sending heartbeat of download job {job_id}: {e}")
+
+    def _release_download_slot(self, job: DownloadJob):
+        if job.id in self.postprocessing:
+            return
+        self.postprocessing.add(job.id)
+        self.running_by_playlist[job.playlist_id] -= 1
+        if self.running_by_playlist[job.playlist_id] <= 0:
+            del self.running_by_playlist[job.playlist_id]
+        self.notify()
+
+    async def _run_job(self, job: DownloadJob):
+        heartbeat = asyncio.create_task(self._heartbeat(job.id))
+        log = new_log()  # Output of yt-dlp, saved with the job if it fails
+        try:
+            retry = None  # (delay, max attempts) when the job is queued again
+            try:
+                success, error = await download_playlist_video(
+                    job.playlist_video_id,
+                    on_downloaded=lambda: self._release_download_slot(job),
+                    log=log,
+                )
+            except DownloadStalledError as e:
+                # Killed by the watchdog (throttled stream, stuck fragment...), likely to work next time
+                print(f"Download job {job.id} {e.reason}: {e}")
+                success, error = False, f"Download {e.reason}: {e}"
+                retry = (0, DOWNLOAD_JOB_MAX_ATTEMPTS)
+            except DownloadRetryError as e:
+                # Network error: retried after a backoff, without holding a download slot meanwhile
+                delay = get_retry_delay(job.attempts)
+                print(f"Download job {job.id} failed with a network error, retrying in {delay:.1f}s: {e}")
+                success, error = False, f"Network error: {e}"
+                retry = (delay, DOWNLOAD_RETRIES + 1)
+            except Exception as e:
+                print(f"Error running download job {job.id}: {e}")
+                success, error = False, str(e)
+            finally:
+                heartbeat.cancel()
+
+            tail = None
+            if not success:
+                if not any(error in line for line in log):
+                    log.append(error)
+                tail = "\n".join(log)
+            if retry and await retry_job(job.id, error, tail, *retry):
+                return
+            if not retry:
+                await complete_job(job.id, success, error, tail)
+            if job.batch_id and job.batch_id not in self.summarized_batches:
+                if await send_batch_summary(job.batch_id):
+                    self.summarized_batches.add(job.batch_id)
+        except Exception as e:
+            print(f"Error completing download job {job.id}: {e}")
+        finally:
+            self._release_download_slot(job)
+            self.postprocessing.discard(job.id)
+            self.running.pop(job.id, None)
+            self.notify()
+
+    async def stop(self):
+        """
+        Stop dispatching. Running jobs are interrupted and queued again.
+        """
+        job_ids = list(self.running)
+        tasks = [task for task in [self.task, *self.running.values()] if task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+
+        if job_ids:
+            try:
+                await release_jobs(job_ids)
+            except Exception as e:
+                # Requeued once their heartbeat is stale
+                print(f"Error releasing download jobs: {e}")
+
+
+download_dispatcher = DownloadDispatcher(DOWNLOAD_CONCURRENCY, DOWNLOAD_PLAYLIST_CONCURRENCY, DOWNLOAD_POSTPROCESS_CONCURRENCY)
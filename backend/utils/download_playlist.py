@@ -1,6 +1,7 @@
-from database.models import Playlist, PlaylistVideo, Video, DownloadState, RootFolder # Import your models
+from database.models import Playlist, PlaylistVideo, Video, DownloadState, RootFolder, DownloadJobPriority # Import your models
 from sqlalchemy.ext.asyncio import AsyncSession
-from utils.download_playlist_video import start_download_video
+from utils.download_jobs import enqueue_jobs
+import uuid
 
 from websocket_manager import ws_manager
 from database.database import SessionLocal
@@ -8,21 +9,26 @@ from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 
 
-downloading = {}
-
 TEXT_NO_ROOT_FOLDER = "No root folder found"
 TEXT_NO_VIDEO_TO_DOWNLOAD = "No video to download"
 
 
-async def start_download_playlist(playlist_id: str, db: AsyncSession, redownloadAll: bool = False):
+async def start_download_playlist(
+    playlist_id: str,
+    db: AsyncSession,
+    redownloadAll: bool = False,
+    priority: DownloadJobPriority = DownloadJobPriority.PLAYLIST,
+):
     """
-    Récupère les informations d'une playlist et de ses vidéos associées via yt-dlp.
+    Met en file d'attente le téléchargement des vidéos d'une playlist.
 
     Args:
-        playlist_url (str): URL de la playlist YouTube.
+        playlist_id (str): ID interne de la playlist.
+        redownloadAll (bool): Retélécharger aussi les vidéos déjà téléchargées.
+        priority (DownloadJobPriority): Priorité des téléchargements dans la file d'attente.
 
     Returns:
-        dict: Dictionnaire avec les informations de la playlist et des vidéos.
+        tuple: L'ID du lot de téléchargements (ou un message si rien n'est à télécharger) et le nombre de vidéos en file d'attente.
     """
 
     # Re-fetch the playlist with videos and PlaylistVideo relation
@@ -72,10 +78,9 @@ async def start_download_playlist(playlist_id: str, db: AsyncSession, redownload
         await db.commit()
         await db.refresh(playlist)
     
-    nb_download_failed = 0
-    nb_videos_to_download = 0
     print(f"Starting download for playlist: {playlist.title}")
 
+    playlist_video_ids = []
     for playlist_video in playlist.videos:
         playlist_video: PlaylistVideo
         if not redownloadAll and playlist_video.state not in [DownloadState.IDLE, DownloadState.ERROR]:
@@ -84,63 +89,35 @@ async def start_download_playlist(playlist_id: str, db: AsyncSession, redownload
         video: Video = playlist_video.video
         if not video or video.available is False:
             continue
+        if video.download_error is not None and video.download_error_hash == video.content_hash:
+            # Failed for good (private, removed...) and unchanged since
+            continue
 
-        nb_videos_to_download += 1
-        print(f"Starting download for video: {video.title}")
-
-        # Mark as DOWNLOADING
-        playlist_video.state = DownloadState.DOWNLOADING
-        await db.commit()
-        await db.refresh(playlist_video)
-
-        await ws_manager.send_message("playlists", {
-            "playlist_id": playlist.source_id,
-            "video_id": video.source_id,
-            "status": "started"
-        })
-
-        try:
-            success, stderr = await start_download_video(playlist, video, playlist_video)
-        except Exception as e:
-            print(f"Error downloading video {video.title}: {e}")
-            success = None
+        playlist_video_ids.append(playlist_video.id)
 
-        # Update state based on result
-        if success:
-            playlist_video.state = DownloadState.DOWNLOADED
-        else:
-            playlist_video.state = DownloadState.ERROR
-            nb_download_failed += 1
+    # Queue the items, the download dispatcher runs them and sends the summary once they are all finished
+    batch_id = uuid.uuid4()
+    queued = await enqueue_jobs(playlist.id, playlist_video_ids, db, batch_id=batch_id, priority=priority)
+    if not queued:
+        return TEXT_NO_VIDEO_TO_DOWNLOAD, 0
 
-        await db.commit()
-        await db.refresh(playlist_video)
-
-        await ws_manager.send_message("playlists", {
-            "playlist_id": playlist.source_id,
-            "video_id": video.source_id,
-            "video_title": video.title,
-            "status": "finished" if success else "error"
-        })
-    
-    return nb_download_failed, nb_videos_to_download
+    return batch_id, queued
 
 
 
-async def download_playlist(playlist: Playlist, redownloadAll: bool = False):
+async def download_playlist(playlist: Playlist, redownloadAll: bool = False, priority: DownloadJobPriority = DownloadJobPriority.PLAYLIST):
     """
     Démarre le téléchargement de la playlist.
     """
-    print(f"Starting download for playlist: {playlist.title}")
-    downloading[playlist.source_id] = True
+    print(f"Queuing download for playlist: {playlist.title}")
     
     async with SessionLocal() as db:
         try:
-            result, total_to_download = await start_download_playlist(playlist.id, db, redownloadAll)
+            result, total_to_download = await start_download_playlist(playlist.id, db, redownloadAll, priority)
         except Exception as e:
             print(f"Error downloading playlist: {e}")
             result = None
     
-    downloading.pop(playlist.source_id, None)
     if result == None:
         print(f"Failed to download {playlist.title}.")
         await ws_manager.send_message(
@@ -158,7 +135,6 @@ async def download_playlist(playlist: Playlist, redownloadAll: bool = False):
             {"playlist_id": playlist.source_id, "download_success": False, "playlist_title": playlist.title, "message": "No root folder found for this playlist, please add one or create a default root folder" }
         )
     else:
-        await ws_manager.send_message(
-            "playlists", 
-            {"playlist_id": playlist.source_id, "download_success": True, "nb_download_failed": result, "total_to_download": total_to_download, "playlist_title": playlist.title, "message": "Playlist downloaded successfully" }
-        )
+        print(f"Queued {total_to_download} videos of playlist {playlist.title}.")
+
+    return result
@@ -1,90 +1,322 @@
 import asyncio
+import os
 import re
-from database.models import PlaylistVideo, Video, Playlist, DownloadFormat
+import shutil
+from collections import deque
+from typing import Callable
+from database.models import PlaylistVideo, Video, Playlist, DownloadFormat, DownloadQuality
 from websocket_manager import ws_manager
+from utils.ytdlp_pool import download_pool, postprocess_pool, new_log
+from utils.download_watchdog import DownloadWatchdog, DownloadStalledError
+from utils.download_errors import DownloadErrorKind, DownloadRetryError, classify_error, get_error_line
+from utils.constants import (
+    DOWNLOAD_PROGRESS_INTERVAL,
+    DOWNLOAD_STAGING_PATH,
+    DOWNLOAD_STALL_SECONDS,
+    DOWNLOAD_DEADLINE_SECONDS,
+    DOWNLOAD_POSTPROCESS_DEADLINE_SECONDS,
+    DOWNLOAD_CONCURRENT_FRAGMENTS,
+    DOWNLOAD_HTTP_CHUNK_SIZE,
+    DOWNLOAD_EXTERNAL_DOWNLOADER,
+    DOWNLOAD_EXTERNAL_DOWNLOADER_ARGS,
+)
 
 
-def get_output_path(playlist: Playlist, video: Video, playlist_video: PlaylistVideo) -> str:
+# Auto tuning by requested quality: (fragments downloaded in parallel, HTTP chunk size).
+# The large video streams are split in fragments and chunks to get past the per-connection
+# throttling, the audio streams are small enough for a single connection.
+AUTO_TUNING = {
+    DownloadQuality.q_best: (8, "10M"),
+    DownloadQuality.q_2160p: (8, "10M"),
+    DownloadQuality.q_1440p: (6, "10M"),
+    DownloadQuality.q_1080p: (4, "10M"),
+    DownloadQuality.q_720p: (2, None),
+    DownloadQuality.q_480p: (1, None),
+    DownloadQuality.q_360p: (1, None),
+}
+AUDIO_TUNING = (1, None)
+
+# Downloaders yt-dlp supports (--downloader), any other value would be run as an executable
+EXTERNAL_DOWNLOADERS = ("native", "aria2c", "avconv", "axel", "curl", "ffmpeg", "httpie", "wget")
+CHUNK_SIZE_PATTERN = re.compile(r"\d+[KMG]?")
+
+
+def get_output_template(playlist: Playlist, video: Video, playlist_video: PlaylistVideo) -> tuple[str, str]:
+    """
+    Get the output of a download: the root folder and the yt-dlp output template in this folder.
+    """
     if playlist_video.custom_download_path:
-        return f"{playlist.folder}/{playlist_video.custom_download_path}{'/' if playlist_video.custom_download_path else ''}{playlist_video.custom_title if playlist_video.custom_title else video.title}.%(ext)s"
-    return f"{playlist.folder}/{playlist.download_path}{"/" if playlist.download_path else ""}%(title)s.%(ext)s"
+        return playlist.folder, f"{playlist_video.custom_download_path}{'/' if playlist_video.custom_download_path else ''}{playlist_video.custom_title if playlist_video.custom_title else video.title}.%(ext)s"
+    return playlist.folder, f"{playlist.download_path}{"/" if playlist.download_path else ""}%(title)s.%(ext)s"
 
 
-async def start_download_video(playlist: Playlist, video: Video, playlist_video: PlaylistVideo):
-    try:
-        command = [
-            "yt-dlp",
-            "--progress",
-            "--newline",
-            "--no-playlist",  # just in case
-            "--embed-thumbnail",
-            "--embed-metadata",
-            "-o", get_output_path(playlist, video, playlist_video),
-        ]
-
-        if playlist.default_format == DownloadFormat.AUDIO:
-            command.append("-x")
+def get_staging_path(playlist_video: PlaylistVideo) -> str:
+    return os.path.join(DOWNLOAD_STAGING_PATH, str(playlist_video.id))
+
+
+def validate_tuning(key: str, value) -> str | None:
+    """
+    Check a download tuning setting of a playlist, None clears it.
+
+    Returns:
+        str: Why the value is rejected, None if it's valid or not a tuning setting.
+    """
+    if value is None:
+        return None
+    if key == "default_concurrent_fragments":
+        if isinstance(value, bool) or not isinstance(value, int) or value < 1:
+            return "Parallel fragments must be an integer of at least 1"
+    elif key == "default_http_chunk_size":
+        if not isinstance(value, str) or not CHUNK_SIZE_PATTERN.fullmatch(value):
+            return "Chunk size must be a number of bytes, optionally followed by K, M or G (e.g. 10M)"
+    elif key == "default_external_downloader":
+        if value not in EXTERNAL_DOWNLOADERS:
+            return f"Downloader must be one of: {', '.join(EXTERNAL_DOWNLOADERS)}"
+    return None
+
+
+def get_global_tuning(name: str, key: str, value):
+    """
+    A tuning setting from the environment, ignored (auto tuning) when invalid
+    instead of making every download fail.
+    """
+    error = validate_tuning(key, value or None)
+    if error:
+        print(f"Ignoring {name}={value!r}: {error}")
+        return None
+    return value or None
+
+
+GLOBAL_CONCURRENT_FRAGMENTS = get_global_tuning("DOWNLOAD_CONCURRENT_FRAGMENTS", "default_concurrent_fragments", DOWNLOAD_CONCURRENT_FRAGMENTS)
+GLOBAL_HTTP_CHUNK_SIZE = get_global_tuning("DOWNLOAD_HTTP_CHUNK_SIZE", "default_http_chunk_size", DOWNLOAD_HTTP_CHUNK_SIZE)
+GLOBAL_EXTERNAL_DOWNLOADER = get_global_tuning("DOWNLOAD_EXTERNAL_DOWNLOADER", "default_external_downloader", DOWNLOAD_EXTERNAL_DOWNLOADER)
+
+
+def get_tuning_args(playlist: Playlist) -> list[str]:
+    """
+    Build the yt-dlp arguments controlling how the streams are fetched: parallel fragments,
+    HTTP chunk size and external downloader.
+
+    Each setting comes from the playlist, else from the global settings, else from
+    `AUTO_TUNING` for the format and quality of the playlist.
+    """
+    if playlist.default_format == DownloadFormat.AUDIO:
+        auto_fragments, auto_chunk_size = AUDIO_TUNING
+    else:
+        auto_fragments, auto_chunk_size = AUTO_TUNING.get(playlist.default_quality, AUDIO_TUNING)
+
+    fragments = playlist.default_concurrent_fragments or GLOBAL_CONCURRENT_FRAGMENTS or auto_fragments
+    chunk_size = playlist.default_http_chunk_size or GLOBAL_HTTP_CHUNK_SIZE or auto_chunk_size
+    downloader = playlist.default_external_downloader or GLOBAL_EXTERNAL_DOWNLOADER
+
+    args = ["--concurrent-fragments", str(fragments)]
+    if chunk_size:
+        args.extend(["--http-chunk-size", chunk_size])
+
+    if downloader:
+        args.extend(["--downloader", downloader])
+        downloader_args = DOWNLOAD_EXTERNAL_DOWNLOADER_ARGS
+        if not downloader_args and downloader == "aria2c":
+            # One connection per fragment, as with the yt-dlp downloader
+            downloader_args = f"-x {fragments} -s {fragments} -k 1M"
+        if downloader_args:
+            args.extend(["--downloader-args", f"{downloader}:{downloader_args}"])
+
+    return args
+
+
+def get_download_args(playlist: Playlist, video: Video, playlist_video: PlaylistVideo) -> tuple[list[str], list[str]]:
+    """
+    Build the yt-dlp arguments (without the executable) of the two stages of a download.
+
+    The download stage fetches the streams, the thumbnail and the subtitles into the staging
+    folder of the item, with the video information. The post-processing stage loads this
+    information, finds the files already downloaded and only runs ffmpeg (audio extraction,
+    thumbnail and metadata embedding, subtitles conversion) before moving the result
+    to the playlist folder.
+
+    Returns:
+        tuple: The arguments of the download stage and of the post-processing stage.
+    """
+    folder, template = get_output_template(playlist, video, playlist_video)
+    staging_path = get_staging_path(playlist_video)
+
+    # Same format selection in both stages, so the post-processing finds the downloaded files
+    common = [
+        "--no-playlist",  # just in case
+        "-o", template,
+    ]
+
+    if playlist.default_format == DownloadFormat.AUDIO:
+        common.extend(["-f", "bestaudio/best"])
+    else:
+        quality = playlist.default_quality.value
+        if quality == 0: # Best quality
+            common.extend(["-f", "bestvideo+bestaudio/best"])
         else:
-            quality = playlist.default_quality.value
-            if quality == 0: # Best quality
-                command.extend(["-f", "bestvideo+bestaudio/best"])
-            else:
-                command.extend([
-                    "-f", f"bestvideo[height<={quality}]+bestaudio/best[height<={quality}]"
-                ])
-
-        if playlist.default_subtitles:
-            command.extend(["--write-sub", "--sub-lang", "en", "--convert-subs", "srt"])
-
-        command.extend([
-            "--", # Ensures that there's no options anymore,so if the URL starts with a dash, it won't be interpreted as an option
-            video.source_id
-        ])
-
-        print("Command:", command)
+            common.extend([
+                "-f", f"bestvideo[height<={quality}]+bestaudio/best[height<={quality}]"
+            ])
+
+    if playlist.default_subtitles:
+        common.extend(["--write-sub", "--sub-lang", "en"])
+
+    download_args = [
+        "--progress",
+        "--newline",
+        "--progress-delta", str(DOWNLOAD_PROGRESS_INTERVAL),
+        "-P", staging_path,
+        *common,
+        *get_tuning_args(playlist),
+        "--write-thumbnail",
+        "--write-info-json",
+        "-o", "infojson:info",
+        "--", # Ensures that there's no options anymore,so if the URL starts with a dash, it won't be interpreted as an option
+        video.source_id
+    ]
+
+    postprocess_args = [
+        "-P", f"temp:{staging_path}",
+        "-P", f"home:{folder}",
+        *common,
+        "--embed-thumbnail",
+        "--embed-metadata",
+    ]
+
+    if playlist.default_format == DownloadFormat.AUDIO:
+        postprocess_args.append("-x")
+
+    if playlist.default_subtitles:
+        postprocess_args.extend(["--convert-subs", "srt"])
+
+    postprocess_args.extend(["--load-info-json", os.path.join(staging_path, "info.info.json")])
+
+    return download_args, postprocess_args
+
+
+class DownloadProgress:
+    """
+    Send the progress of a download to the clients, by stage (video, audio, thumbnail).
+
+    The updates are the progress of yt-dlp (status, filename, downloaded_bytes, total_bytes,
+    speed, eta), a new stage starts when yt-dlp downloads another file.
+    """
+    def __init__(self, playlist: Playlist, video: Video):
+        self.playlist = playlist
+        self.video = video
+        self.stage = -1
+        self.filename = None
+        self.last_percentage = 0
+        self.stage_names = ["video", "audio", "thumbnail"] if playlist.default_format == DownloadFormat.VIDEO else ["audio", "thumbnail"]
+
+    async def update(self, progress: dict):
+        if progress.get("filename") != self.filename:
+            self.filename = progress.get("filename")
+            self.stage += 1
+            self.last_percentage = 0
+
+        downloaded_bytes = progress.get("downloaded_bytes")
+        total_bytes = progress.get("total_bytes") or progress.get("total_bytes_estimate")
+        if progress.get("status") == "finished":
+            percent = 100
+        elif downloaded_bytes is not None and total_bytes:
+            percent = round(downloaded_bytes / total_bytes * 100, 1)
+        else:
+            return
+
+        stage_name = self.stage_names[self.stage] if self.stage < len(self.stage_names) else f"{self.stage}: "
+
+        # Only send update if a significant change occurred
+        if abs(percent - self.last_percentage) >= 5 or percent == 100:
+            await self.send(percent, stage_name, {
+                "downloaded_bytes": downloaded_bytes,
+                "total_bytes": total_bytes,
+                "speed": progress.get("speed"),
+                "eta": progress.get("eta"),
+            })
+
+            self.last_percentage = percent
+
+    async def processing(self):
+        await self.send(100, "processing")
+
+    async def send(self, percent: float, stage_name: str, details: dict | None = None):
+        await ws_manager.send_message("playlists", {
+            "playlist_id": self.playlist.source_id,
+            "video_id": self.video.source_id,
+            "video_title": self.video.title,
+            "progress": percent,
+            "status": "downloading",
+            "download_stage": stage_name,
+            **(details or {}),
+        })
+
+
+async def start_download_video(
+    playlist: Playlist,
+    video: Video,
+    playlist_video: PlaylistVideo,
+    on_downloaded: Callable[[], None] | None = None,
+    log: deque | None = None,
+):
+    """
+    Download an item of a playlist, in two stages: the download (network) then the
+    post-processing (ffmpeg), each one in its own pool.
+
+    Args:
+        on_downloaded (callable): Called when the download stage is over, before the post-processing.
+        log (deque): Ring buffer receiving the output of yt-dlp for both stages.
+
+    Returns:
+        tuple: The success of the download and the tail of the yt-dlp output.
+
+    Raises:
+        DownloadStalledError: yt-dlp was killed by the watchdog of a stage.
+        DownloadRetryError: The download stage failed with a network error (see `utils.download_errors`).
+    """
+    staging_path = get_staging_path(playlist_video)
+    log = new_log() if log is None else log
+    try:
+        download_args, postprocess_args = get_download_args(playlist, video, playlist_video)
+        progress = DownloadProgress(playlist, video)
+
+        print("Command:", ["yt-dlp", *download_args])
         print("Starting yt-dlp command...")
 
-        process = await asyncio.create_subprocess_exec(
-            *command,
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE
+        returncode, output = await download_pool.run(
+            download_args,
+            progress.update,
+            watchdog=DownloadWatchdog(DOWNLOAD_STALL_SECONDS, DOWNLOAD_DEADLINE_SECONDS),
+            log=log,
         )
+        error = get_error_line(output.splitlines())
+        if returncode != 0 and classify_error(error) == DownloadErrorKind.TRANSIENT:
+            # Network error: the job is queued again, the staging folder is kept to resume it
+            raise DownloadRetryError(error)
+        if on_downloaded:
+            on_downloaded()
+
+        if returncode == 0:
+            await progress.processing()
+            print("Post-processing command:", ["yt-dlp", *postprocess_args])
+            returncode, output = await postprocess_pool.run(
+                postprocess_args,
+                watchdog=DownloadWatchdog(deadline_seconds=DOWNLOAD_POSTPROCESS_DEADLINE_SECONDS),
+                log=log,
+            )
 
-        last_percentage = 0
-        stage = -1
-        STAGE_NAMES = ["video", "audio", "thumbnail"] if playlist.default_format == DownloadFormat.VIDEO else ["audio", "thumbnail"]
-
-        async for line in process.stdout:
-            line = line.decode("utf-8").strip()
-            print(line)
-
-            if "[download] Destination" in line:
-                stage += 1
-            match = re.search(r"\[download\]\s+([\d.]+)%", line)
-            if match:
-                percent = float(match.group(1))
-                stage_name = STAGE_NAMES[stage] if stage < len(STAGE_NAMES) else f"{stage}: "
-
-                # Only send update if a significant change occurred
-                if abs(percent - last_percentage) >= 5 or percent == 100:
-                    
-                    await ws_manager.send_message("playlists", {
-                        "playlist_id": playlist.source_id,
-                        "video_id": video.source_id,
-                        "video_title": video.title,
-                        "progress": percent,
-                        "status": "downloading",
-                        "download_stage": stage_name
-                    })
-                    
-                    last_percentage = percent
-
-
-
-        returncode = await process.wait()
-        stderr = await process.stderr.read()
-        print(returncode, stderr.decode())
-        return returncode == 0, stderr
+        if returncode == 0:
+            print(f"Downloaded {video.title}")
+        else:
+            # The full output is in the log of the job
+            print(f"yt-dlp failed for {video.title} ({returncode}): {get_error_line(output.splitlines())}")
+        shutil.rmtree(staging_path, ignore_errors=True)
+        return returncode == 0, output
 
+    except (asyncio.CancelledError, DownloadStalledError, DownloadRetryError):
+        # The staging folder is kept, the next attempt resumes the download
+        raise
     except Exception as e:
-        return 1, str(e)
+        shutil.rmtree(staging_path, ignore_errors=True)
+        log.append(str(e))
+        return False, str(e)
@@ -1,12 +1,53 @@
 from database.models import Uploader
 from sqlalchemy.ext.asyncio import AsyncSession
 import asyncio
+import httpx
+import os
 from database.database import SessionLocal
 from sqlalchemy.future import select
 from websocket_manager import ws_manager
+from utils.constants import AVATAR_DOWNLOAD_CONCURRENCY, AVATAR_HTTP_TIMEOUT, METADATA_STORAGE_PATH, DOWNLOAD_STALL_SECONDS, DOWNLOAD_DEADLINE_SECONDS
+from utils.youtube_api import get_channel_thumbnails
+from utils.youtube_quota import priority, quota_priority
+from utils.ytdlp_pool import download_pool
+from utils.download_watchdog import DownloadWatchdog, DownloadStalledError
+from utils.download_errors import get_error_line
 
 downloading = {}
 
+AVATARS_PATH = os.path.join(METADATA_STORAGE_PATH, "avatars")
+
+
+def get_avatar_path(uploader_id) -> str:
+    """
+    Path of the avatar file of an uploader, the one loaded by the web interface.
+    """
+    return os.path.join(AVATARS_PATH, f"{uploader_id}.jpg")
+
+# Pooled client used to fetch the avatar images
+avatar_http: httpx.AsyncClient | None = None
+# Avatars downloaded at the same time, over all the batches (the yt-dlp fallback takes
+# slots of the download pool, they are left to the downloads)
+avatar_slots: asyncio.Semaphore | None = None
+
+
+def get_avatar_http() -> httpx.AsyncClient:
+    global avatar_http
+    if avatar_http is None or avatar_http.is_closed:
+        avatar_http = httpx.AsyncClient(
+            timeout=httpx.Timeout(AVATAR_HTTP_TIMEOUT),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5),
+            follow_redirects=True,
+        )
+    return avatar_http
+
+
+def has_avatar(uploader_id) -> bool:
+    """
+    Check if the avatar file of an uploader exists.
+    """
+    return os.path.exists(get_avatar_path(uploader_id))
+
 
 async def start_download_avatar(uploader: Uploader):
     """
@@ -18,36 +59,30 @@ async def start_download_avatar(uploader: Uploader):
     Returns:
         tuple: Un tuple contenant le succès du téléchargement et les erreurs éventuelles.
     """
-    # Commande pour télécharger l'avatar
-    command = [
-        "yt-dlp",
+    # Arguments yt-dlp pour télécharger l'avatar
+    args = [
         "--write-thumbnail",
         "--playlist-items",
         "0",
         "--skip-download",
+        "--convert-thumbnails",  # The web interface loads {uploader.id}.jpg
+        "jpg",
         "-o",
-        f"metadata/avatars/{uploader.id}.%(ext)s",
+        os.path.join(AVATARS_PATH, f"{uploader.id}.%(ext)s"),
         f"https://www.youtube.com/channel/{uploader.channel_id}"
     ]
 
-    print(f"Command to download avatar: {command}")
-
-    # Exécution de la commande
-    process = await asyncio.create_subprocess_exec(
-        *command,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-
-    stdout, stderr = await process.communicate()
-
-    print(f"yt-dlp output: {stdout.decode()}")
-    print(f"yt-dlp error: {stderr.decode()}")
+    print(f"Command to download avatar: {['yt-dlp', *args]}")
 
-    if process.returncode == 0:
+    try:
+        # Without download, the output of yt-dlp (and the thumbnail conversion) is its activity
+        returncode, output = await download_pool.run(args, watchdog=DownloadWatchdog(DOWNLOAD_STALL_SECONDS, DOWNLOAD_DEADLINE_SECONDS))
+    except DownloadStalledError as e:
+        return False, str(e)
+    if returncode == 0:
         return True, None
-    else:
-        return False, stderr.decode()
+    print(f"yt-dlp failed for the avatar of {uploader.name}: {get_error_line(output.splitlines())}")
+    return False, output
 
 
 
@@ -89,17 +124,53 @@ async def download_uploader_avatar(uploader_id: str, db: AsyncSession = None):
     return success
 
 
-async def download_avatar(uploader: Uploader):
+async def fetch_avatar_image(uploader: Uploader, thumbnail_url: str) -> bool:
+    """
+    Fetch the avatar image of an uploader and write it to `metadata/avatars/{uploader.id}.jpg`.
+
+    Returns:
+        bool: True if the avatar was written.
+    """
+    response = await get_avatar_http().get(thumbnail_url)
+    response.raise_for_status()
 
+    content_type = response.headers.get("content-type", "").split(";")[0].strip()
+    if not content_type.startswith("image/"):
+        raise ValueError(f"Unexpected content type for an avatar: {content_type}")
+    # Always named .jpg like the yt-dlp avatars (the channel thumbnails are JPEG,
+    # and browsers display the image whatever its actual format)
+    path = get_avatar_path(uploader.id)
+
+    def write_avatar():
+        with open(path, "wb") as f:
+            f.write(response.content)
+
+    await asyncio.to_thread(write_avatar)
+    return True
+
+
+async def download_avatar(uploader: Uploader, thumbnail_url: str | None = None):
+    """
+    Download the avatar of an uploader from its channel thumbnail URL,
+    falling back on yt-dlp if no URL is given or the image can't be fetched.
+    """
     downloading[uploader.id] = True
 
-    # Download the uploader's avatar
-    async with SessionLocal() as db:
+    success = None
+    if thumbnail_url:
         try:
-            success = await download_uploader_avatar(uploader.id, db)
+            success = await fetch_avatar_image(uploader, thumbnail_url)
         except Exception as e:
-            print(f"Error downloading avatar of {uploader.name}: {e}")
-            success = None
+            print(f"Error fetching avatar image of {uploader.name}: {e}")
+
+    if not success:
+        # Download the uploader's avatar with yt-dlp
+        async with SessionLocal() as db:
+            try:
+                success = await download_uploader_avatar(uploader.id, db)
+            except Exception as e:
+                print(f"Error downloading avatar of {uploader.name}: {e}")
+                success = None
 
     downloading.pop(uploader.id, None)
 
@@ -115,3 +186,106 @@ async def download_avatar(uploader: Uploader):
             "uploaders", 
             {"uploader_id":str(uploader.id), "avatar_downloaded": False, "uploader_name": uploader.name}
         )
+
+
+async def download_avatars(uploader_ids: list):
+    """
+    Download the avatars of several uploaders, resolving their channel thumbnails
+    with as few channels.list calls as possible (50 channels per call).
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(select(Uploader).where(Uploader.id.in_(uploader_ids)))
+        uploaders = result.scalars().all()
+
+    if not uploaders:
+        return
+
+    try:
+        thumbnails = await get_channel_thumbnails({uploader.channel_id for uploader in uploaders})
+    except Exception as e:
+        print(f"Error resolving channel thumbnails: {e}")
+        thumbnails = {}
+
+    global avatar_slots
+    if avatar_slots is None:
+        avatar_slots = asyncio.Semaphore(AVATAR_DOWNLOAD_CONCURRENCY)
+
+    async def download_avatar_in_slot(uploader: Uploader):
+        async with avatar_slots:
+            await download_avatar(uploader, thumbnails.get(uploader.channel_id))
+
+    await asyncio.gather(*(download_avatar_in_slot(uploader) for uploader in uploaders))
+
+
+class AvatarQueue:
+    """
+    Background queue of uploader avatar downloads.
+
+    Requests for an uploader already queued or being downloaded are collapsed, and the
+    downloads run on a fixed number of workers so ingestion only has to enqueue.
+    Completion is reported over the `uploaders` WebSocket group by `download_avatar`.
+    """
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.queue: asyncio.Queue | None = None
+        self.pending = set()  # Uploader ids queued or being downloaded
+        self.workers = []
+
+    def _ensure_workers(self):
+        # Started lazily, the queue and the workers need the running event loop
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        while len(self.workers) < self.concurrency:
+            self.workers.append(asyncio.create_task(self._worker()))
+
+    def enqueue(self, uploader_id) -> bool:
+        """
+        Queue the avatar download of an uploader.
+
+        Returns:
+            bool: False if the uploader was already queued or being downloaded.
+        """
+        if uploader_id in self.pending:
+            return False
+
+        self._ensure_workers()
+        self.pending.add(uploader_id)
+        # The API calls of the download are charged to the priority of the caller,
+        # not to the one of the context that started the workers
+        self.queue.put_nowait((uploader_id, quota_priority.get()))
+        return True
+
+    async def _worker(self):
+        while True:
+            # Take every queued uploader (up to a channels.list page) to resolve them together
+            items = [await self.queue.get()]
+            while len(items) < 50 and not self.queue.empty():
+                items.append(self.queue.get_nowait())
+
+            by_priority = {}
+            for uploader_id, item_priority in items:
+                by_priority.setdefault(item_priority, []).append(uploader_id)
+
+            try:
+                for item_priority, uploader_ids in by_priority.items():
+                    try:
+                        with priority(item_priority):
+                            await download_avatars(uploader_ids)
+                    except Exception as e:
+                        print(f"Error downloading avatars of uploaders {uploader_ids}: {e}")
+            finally:
+                for uploader_id, _ in items:
+                    self.pending.discard(uploader_id)
+                    self.queue.task_done()
+
+    async def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        if avatar_http is not None:
+            await avatar_http.aclose()
+
+
+avatar_queue = AvatarQueue(AVATAR_DOWNLOAD_CONCURRENCY)
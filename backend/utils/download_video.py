@@ -1,17 +1,26 @@
 from database.models import PlaylistVideo, DownloadState, RootFolder, Video, Playlist
+from database.database import SessionLocal
 from sqlalchemy.ext.asyncio import AsyncSession
 from utils.download_playlist_video import start_download_video
+from utils.download_watchdog import DownloadStalledError
+from utils.download_errors import DownloadErrorKind, DownloadRetryError, classify_error, get_error_line
 from websocket_manager import ws_manager
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-
-downloading_videos = {}
+from collections import deque
+from typing import Callable
 
 TEXT_VIDEO_NOT_FOUND = "Video not found"
 TEXT_VIDEO_NOT_AVAILABLE = "Video not available"
 TEXT_NO_ROOT_FOLDER = "No root folder found"
 
-async def start_download_single_video(playlist_id: str, video_id: str, db: AsyncSession):
+async def start_download_single_video(
+    playlist_id: str,
+    video_id: str,
+    db: AsyncSession,
+    on_downloaded: Callable[[], None] | None = None,
+    log: deque | None = None,
+):
     result = await db.execute(
         select(PlaylistVideo)
         .options(
@@ -59,33 +68,93 @@ async def start_download_single_video(playlist_id: str, video_id: str, db: Async
         "status": "started"
     })
 
+    interrupted = None
+    output = None
     try:
-        success, stderr = await start_download_video(playlist, video, playlist_video=playlist_video)
+        success, output = await start_download_video(playlist, video, playlist_video=playlist_video, on_downloaded=on_downloaded, log=log)
+    except DownloadStalledError as e:
+        print(f"Download of video {video.title} killed: {e}")
+        interrupted = e
+        success = None
+    except DownloadRetryError as e:
+        print(f"Download of video {video.title} failed with a network error: {e}")
+        interrupted = e
+        success = None
     except Exception as e:
         print(f"Error downloading video {video.title}: {e}")
         success = None
 
-    playlist_video.state = DownloadState.DOWNLOADED if success else DownloadState.ERROR
+    # An interrupted download is queued again by its job, which sets the ERROR state if it gives up
+    if interrupted:
+        playlist_video.state = DownloadState.IDLE
+    else:
+        playlist_video.state = DownloadState.DOWNLOADED if success else DownloadState.ERROR
+    error = None if success or not output else get_error_line(output.splitlines())
+    if success:
+        video.download_error = None
+    elif classify_error(error) == DownloadErrorKind.PERMANENT:
+        # Skipped by the playlist downloads until the details of the video change
+        video.download_error = error
+        video.download_error_hash = video.content_hash
     await db.commit()
     await db.refresh(playlist_video)
 
-    await ws_manager.send_message("playlists", {
+    message = {
         "playlist_id": playlist.source_id,
         "video_id": video.source_id,
         "video_title": video.title,
-        "status": "finished" if success else "error"
-    })
+        "status": "finished" if success else "retrying" if interrupted else "error"
+    }
+    if isinstance(interrupted, DownloadStalledError):
+        message["message"] = f"Download stalled, retrying: {interrupted}"
+    elif interrupted:
+        message["message"] = f"Network error, retrying: {interrupted}"
+    elif error:
+        message["message"] = error
+    await ws_manager.send_message("playlists", message)
+
+    # Left to the download job, which retries it
+    if interrupted:
+        raise interrupted
 
     return success
 
 
-async def download_video(playlist_video: PlaylistVideo, playlist: Playlist, video: Video):
-    downloading_videos[(playlist_video.playlist_id, playlist_video.video_id)] = True
+async def download_playlist_video(
+    playlist_video_id,
+    on_downloaded: Callable[[], None] | None = None,
+    log: deque | None = None,
+) -> tuple[bool, str | None]:
+    """
+    Download an item of a playlist (run by the download job of the item).
+
+    Args:
+        on_downloaded (callable): Called when the network part of the download is over.
+        log (deque): Ring buffer receiving the output of yt-dlp (see `utils.ytdlp_pool.new_log`).
 
-    from database.database import SessionLocal
+    Returns:
+        tuple: True if the video was downloaded, else False with the reason of the failure.
+
+    Raises:
+        DownloadStalledError: The download was killed by its watchdog.
+        DownloadRetryError: The download failed with a network error.
+    """
     async with SessionLocal() as db:
+        result = await db.execute(
+            select(PlaylistVideo)
+            .options(selectinload(PlaylistVideo.video), selectinload(PlaylistVideo.playlist))
+            .where(PlaylistVideo.id == playlist_video_id)
+        )
+        playlist_video = result.scalar_one_or_none()
+        if not playlist_video:
+            return False, TEXT_VIDEO_NOT_FOUND
+        playlist: Playlist = playlist_video.playlist
+        video: Video = playlist_video.video
+
         try:
-            result = await start_download_single_video(playlist_video.playlist_id, playlist_video.video_id, db)
+            result = await start_download_single_video(playlist_video.playlist_id, playlist_video.video_id, db, on_downloaded, log)
+        except (DownloadStalledError, DownloadRetryError):
+            raise
         except Exception as e:
             print(f"Error downloading video: {e}")
             result = None
@@ -96,30 +165,23 @@ async def download_video(playlist_video: PlaylistVideo, playlist: Playlist, vide
                 "video_title": video.title,
                 "status": "error",
             })
-    if result == TEXT_VIDEO_NOT_FOUND:
-        await ws_manager.send_message("playlists", {
-            "playlist_id": playlist.source_id,
-            "video_id": video.source_id,
-            "video_title": video.title,
-            "status": "error",
-            "message": TEXT_VIDEO_NOT_FOUND
-        })
-    elif result == TEXT_VIDEO_NOT_AVAILABLE:
-        await ws_manager.send_message("playlists", {
-            "playlist_id": playlist.source_id,
-            "video_id": video.source_id,
-            "video_title": video.title,
-            "status": "error",
-            "message": TEXT_VIDEO_NOT_AVAILABLE
-        })
-    elif result == TEXT_NO_ROOT_FOLDER:
+
+            # The item may have been left as DOWNLOADING
+            await db.rollback()
+            playlist_video.state = DownloadState.ERROR
+            await db.commit()
+            return False, str(e)
+
+    if result in (TEXT_VIDEO_NOT_FOUND, TEXT_VIDEO_NOT_AVAILABLE, TEXT_NO_ROOT_FOLDER):
         await ws_manager.send_message("playlists", {
             "playlist_id": playlist.source_id,
             "video_id": video.source_id,
             "video_title": video.title,
             "status": "error",
-            "message": TEXT_NO_ROOT_FOLDER
+            "message": result
         })
+        return False, result
 
-    downloading_videos.pop((playlist_video.playlist_id, playlist_video.video_id), None)
-    return result
+    if not result:
+        return False, get_error_line(log) or "Download failed"
+    return True, None
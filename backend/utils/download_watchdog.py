@@ -0,0 +1,87 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+# Interval between two checks of a running download, in seconds
+CHECK_INTERVAL = 5
+
+
+class DownloadStalledError(Exception):
+    """
+    Raised when a download is killed by its watchdog.
+
+    Attributes:
+        reason (str): "stalled" (no progress within the window) or "deadline" (ran for too long).
+    """
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class DownloadWatchdog:
+    """
+    Watch a running yt-dlp job and kill it when it makes no progress for `stall_seconds`
+    (throttled stream, stuck fragment...) or runs for more than `deadline_seconds`.
+
+    Progress is a new file, a new status or more downloaded bytes in the progress updates,
+    or any output of yt-dlp. The stall timer is suspended while a post-processor runs
+    (merge of the streams, thumbnail conversion): ffmpeg can work for minutes without output.
+    None disables a limit.
+    """
+    def __init__(self, stall_seconds: float | None = None, deadline_seconds: float | None = None):
+        self.stall_seconds = stall_seconds or None
+        self.deadline_seconds = deadline_seconds or None
+        self.last_progress = time.monotonic()
+        self.state = None
+        self.postprocessing = False
+
+    def progress(self, update: dict):
+        state = (update.get("filename"), update.get("status"), update.get("downloaded_bytes") or 0)
+        if self.state is None or state[:2] != self.state[:2] or state[2] > self.state[2]:
+            self.last_progress = time.monotonic()
+        self.state = state
+
+    def activity(self, postprocess: dict | None = None):
+        """
+        Record an output line of the job, or the update of a post-processor (status, postprocessor).
+        """
+        self.last_progress = time.monotonic()
+        if postprocess is not None:
+            self.postprocessing = postprocess.get("status") != "finished"
+
+    def track(self, on_progress: Callable[[dict], Awaitable[None]] | None) -> Callable[[dict], Awaitable[None]]:
+        """
+        Wrap a progress callback to record the progress of the job.
+        """
+        async def tracked(update: dict):
+            self.progress(update)
+            if on_progress:
+                await on_progress(update)
+        return tracked
+
+    def check(self, started: float):
+        now = time.monotonic()
+        if self.stall_seconds and not self.postprocessing and now - self.last_progress > self.stall_seconds:
+            raise DownloadStalledError("stalled", f"No progress for {self.stall_seconds:g}s")
+        if self.deadline_seconds and now - started > self.deadline_seconds:
+            raise DownloadStalledError("deadline", f"Still running after {self.deadline_seconds:g}s")
+
+    async def run(self, job: Awaitable):
+        """
+        Await the job, cancelling it (which kills its yt-dlp process) if it stalls.
+
+        Raises:
+            DownloadStalledError: The job was killed.
+        """
+        task = asyncio.ensure_future(job)
+        started = self.last_progress = time.monotonic()
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=CHECK_INTERVAL)
+                if done:
+                    return task.result()
+                self.check(started)
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
@@ -1,40 +1,74 @@
-from database.models import DownloadState, Playlist, RootFolder, Video, Uploader, PlaylistVideo, GlobalPreferences
+from database.models import DownloadState, Playlist, PlaylistFetchCheckpoint, PlaylistFetchCheckpointItem, RootFolder, Video, PlaylistVideo, GlobalPreferences
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from websocket_manager import ws_manager
 from database.database import SessionLocal
 
-from utils.constants import MEDIA_STORAGE_PATH
+from utils.constants import MEDIA_STORAGE_PATH, FULL_SYNC_INTERVAL_DAYS
 from utils.sanitize import sanitize_title
-from utils.download_uploader_avatar import download_uploader_avatar
-from utils.youtube_api import get_playlist_info, get_playlist_items, get_video_details
+from utils.uploader_resolver import resolve_uploaders
+from utils.youtube_api import get_playlist_info, iter_playlist_pages, get_video_details
+from utils.store_videos import store_playlist_entries, compute_content_hash
 
 from typing import cast
+from datetime import datetime as Datetime, timedelta, timezone
 
 
 fetching = {}
 
 
-async def fetch_and_store_playlist_info(playlist_id, db: AsyncSession):
+def needs_full_sync(playlist: Playlist) -> bool:
     """
-    Fetches and stores playlist and videos to the database.
+    Check if a playlist is due for a full reconciliation (every item enumerated, removals detected).
+    """
+    if not playlist.last_full_sync:
+        return True
+    return Datetime.now(timezone.utc) - playlist.last_full_sync >= timedelta(days=FULL_SYNC_INTERVAL_DAYS)
 
-    Args:
-        playlist_url (str): URL of the playlist.
-        db_session (Session): SQLAlchemy session to interact with the database.
-    
-    Returns:
-        bool: True if the playlist and videos were added successfully, else False.
+
+async def get_known_video_ids(playlist: Playlist, db: AsyncSession) -> set:
+    """
+    Return the source ids of the videos already linked to a playlist.
+    """
+    result = await db.execute(
+        select(Video.source_id)
+        .join(PlaylistVideo, PlaylistVideo.video_id == Video.id)
+        .where(PlaylistVideo.playlist_id == playlist.id)
+    )
+    return set(result.scalars().all())
+
+
+async def remove_deleted_playlist_items(playlist: Playlist, video_ids: set, db: AsyncSession):
+    """
+    Remove the links to the videos that are no longer in the playlist.
+    Downloaded items are kept, their files are still on disk.
+    """
+    result = await db.execute(
+        select(PlaylistVideo)
+        .join(Video, PlaylistVideo.video_id == Video.id)
+        .where(
+            PlaylistVideo.playlist_id == playlist.id,
+            Video.source_id.not_in(video_ids),
+            PlaylistVideo.state != DownloadState.DOWNLOADED,
+        )
+    )
+    for playlist_video in result.scalars().all():
+        print("Removing item no longer in the playlist:", playlist_video.video_id)
+        await db.delete(playlist_video)
+
+
+async def fetch_playlist_info(playlist_id) -> dict | None:
+    """
+    Fetch the info of a playlist (without its items) using youtube API.
     """
-    # Step 1: Fetch playlist info using youtube API
     playlist_snippet = await get_playlist_info(playlist_id)
     if not playlist_snippet:
-        print("Failed to fetch playlist info.")
-        return False
+        return None
 
     playlist_snippet = playlist_snippet["snippet"]
-    playlist_info = {
+    return {
         "id": playlist_id,
         "title": playlist_snippet["title"],
         "description": playlist_snippet.get("description", ""),
@@ -43,55 +77,37 @@ async def fetch_and_store_playlist_info(playlist_id, db: AsyncSession):
         "channel_url": f"https://www.youtube.com/channel/{playlist_snippet['channelId']}"
     }
 
-    entries_raw = await get_playlist_items(playlist_id)
-    video_ids = [item["contentDetails"]["videoId"] for item in entries_raw]
-    video_details = await get_video_details(video_ids)
 
-    playlist_info["entries"] = []
-    for item in entries_raw:
-        vid = item["contentDetails"]["videoId"]
-        details = video_details.get(vid)
-        if not details or details == {}:
-            continue
-
-        playlist_info["entries"].append(details)
-
-
-    # Step 2: Check if the uploader exists or create a new uploader
+async def get_fetch_checkpoint(playlist: Playlist | None, db: AsyncSession) -> PlaylistFetchCheckpoint | None:
+    """
+    Return the checkpoint left by an interrupted fetch of a playlist, if any.
+    """
+    if playlist is None:
+        return None
     result = await db.execute(
-        select(Uploader).filter(Uploader.channel_id == playlist_info.get("channel_id"))
+        select(PlaylistFetchCheckpoint).filter(PlaylistFetchCheckpoint.playlist_id == playlist.id)
     )
-    uploader = result.scalars().first()
-
-    if not uploader:
-        # Create a new uploader if not found
-        if playlist_info.get("channel_id") and playlist_info.get("uploader"):
-            uploader = Uploader(
-                channel_id=playlist_info.get("channel_id"),
-                name=playlist_info.get("uploader"),
-                channel_url=playlist_info.get("channel_url") or f"https://www.youtube.com/channel/{playlist_info.get('channel_id')}"
-            )
-            db.add(uploader)
-            await db.flush()
-            print("Created new uploader:", uploader.name)
+    return result.scalars().first()
 
-            print("Downloading uploader avatar...")
-            await download_uploader_avatar(uploader.id, db)  # Download the uploader's avatar
-    
-            await db.commit()  # Commit uploader creation
-        
-    
 
-    # Step 3: Create the playlist entry
+async def get_checkpoint_video_ids(checkpoint: PlaylistFetchCheckpoint, db: AsyncSession) -> set:
+    """
+    Return the source ids of the items enumerated before a fetch was interrupted.
+    """
     result = await db.execute(
-        select(Playlist).filter(Playlist.source_id == playlist_info.get("id"))
+        select(PlaylistFetchCheckpointItem.video_id).where(PlaylistFetchCheckpointItem.checkpoint_id == checkpoint.id)
     )
-    playlist = result.scalars().first()
+    return set(result.scalars().all())
 
-    first_entry = playlist_info.get("entries", [])[0]  if playlist_info.get("entries") else {}
 
-    last_published = max([video.get("upload_date") for video in playlist_info.get("entries", []) if video]) or None
+async def store_playlist(playlist: Playlist | None, playlist_info: dict, uploader_id, first_entry: dict, update_thumbnail: bool, db: AsyncSession):
+    """
+    Create the playlist, or update it based on the user preferences. The playlist isn't
+    committed, only the default global preferences are when they don't exist yet.
 
+    Returns:
+        tuple: The playlist and whether it was inserted, updated or unchanged.
+    """
     preferences = await db.execute(select(GlobalPreferences))
     preferences = preferences.scalar_one_or_none()
     if not preferences:
@@ -100,148 +116,198 @@ async def fetch_and_store_playlist_info(playlist_id, db: AsyncSession):
         await db.flush()
         await db.commit()
 
+    content_hash = compute_content_hash({
+        key: playlist_info.get(key) for key in ("title", "description", "channel_id", "uploader")
+    })
+
     if playlist:
-        # Update existing playlist based on user preferences
-        if preferences:
+        # Update existing playlist based on user preferences, only if its info changed
+        if preferences and playlist.content_hash != content_hash:
             if preferences.update_playlist_title:
                 playlist.title = sanitize_title(playlist_info.get("title"))
             if preferences.update_playlist_description:
                 playlist.description = playlist_info.get("description")
-            if preferences.update_playlist_thumbnail:
-                playlist.thumbnail = first_entry.get("thumbnail")
             if preferences.update_playlist_uploader:
-                playlist.uploader_id=uploader.id if uploader else None
+                playlist.uploader_id=uploader_id
+            playlist.content_hash = content_hash
+        if preferences and preferences.update_playlist_thumbnail and update_thumbnail:
+            playlist.thumbnail = first_entry.get("thumbnail")
 
-        playlist.last_published = last_published
+        # Attributes set to their current value don't make the playlist dirty
+        playlist_status = "updated" if db.is_modified(playlist) else "unchanged"
+        print(f"Existing playlist {playlist_status}:", playlist.title)
+        return playlist, playlist_status
 
-        print("Updated existing playlist:", playlist.title)
-    
-    else:
-        result = await db.execute(
-            select(RootFolder).filter(RootFolder.is_default == True) 
-        )
-        root_folder = result.scalars().first()
-        if not root_folder:
-            root_folder = RootFolder(
-                path=MEDIA_STORAGE_PATH,
-                is_default=True
-            )
-            db.add(root_folder)
-            await db.flush()  # Flush to get the root folder ID
-            print("Created default root folder:", root_folder.path)
-
-        # Create new playlist if it doesn't exist
-        playlist_title = sanitize_title(playlist_info.get("title"))
-        uploader_name = cast(str, uploader.name).replace("/", "-") if uploader else "Unknown"
-        playlist = Playlist(
-            source_id=playlist_info.get("id"),
-            title=playlist_title,
-            description=playlist_info.get("description"),
-            thumbnail=first_entry.get("thumbnail"),
-            uploader_id=uploader.id if uploader else None,
-            last_published=last_published,
-            folder=root_folder.path,
-            download_path=f"{uploader_name}/{playlist_title}",
+    result = await db.execute(
+        select(RootFolder).filter(RootFolder.is_default == True) 
+    )
+    root_folder = result.scalars().first()
+    if not root_folder:
+        root_folder = RootFolder(
+            path=MEDIA_STORAGE_PATH,
+            is_default=True
         )
-        db.add(playlist)
-        await db.flush() # Flush to get the playlist ID
-        print("Created new playlist:", playlist.title)
+        db.add(root_folder)
+        await db.flush()  # Flush to get the root folder ID
+        print("Created default root folder:", root_folder.path)
+
+    # Create new playlist if it doesn't exist
+    playlist_title = sanitize_title(playlist_info.get("title"))
+    uploader_name = cast(str, playlist_info.get("uploader")).replace("/", "-") if uploader_id else "Unknown"
+    playlist = Playlist(
+        source_id=playlist_info.get("id"),
+        title=playlist_title,
+        description=playlist_info.get("description"),
+        thumbnail=first_entry.get("thumbnail"),
+        uploader_id=uploader_id,
+        folder=root_folder.path,
+        download_path=f"{uploader_name}/{playlist_title}",
+        content_hash=content_hash,
+    )
+    db.add(playlist)
+    await db.flush() # Flush to get the playlist ID
+    print("Created new playlist:", playlist.title)
+    return playlist, "inserted"
 
-    await db.commit()  # Commit playlist modification
 
-    print("Playlist commited")
+async def fetch_and_store_playlist_info(playlist_id, db: AsyncSession, full_sync: bool = True, use_cache: bool = True):
+    """
+    Fetches and stores playlist and videos to the database.
 
-    # Step 4: Process each video in the playlist
-    for entry in playlist_info.get("entries", []):
-        if not entry:
-            print("No video found in entry:", entry)
-            continue
+    The items are streamed page by page: each page of 50 items is enriched with the
+    video details, stored, committed and announced on the playlists WebSocket before
+    the next page is requested, so the playlist shows up right after its first page.
+    A checkpoint (next page token, with the items of the page appended to the items
+    enumerated so far) is committed with each page, an interrupted fetch resumes from it
+    instead of starting over.
 
-        print("Video id", entry.get("id"))
-        result = await db.execute(
-            select(Video).filter(Video.source_id == entry.get('id'))
-        )
-        video = result.scalars().first()
+    Args:
+        playlist_url (str): URL of the playlist.
+        db_session (Session): SQLAlchemy session to interact with the database.
+        full_sync (bool): Enumerate every item and remove the deleted ones. Otherwise (delta sync)
+            stop paging once the known items are reached and only fetch the new videos.
+        use_cache (bool): Reuse the video details cached within their TTL instead of calling the API.
+    
+    Returns:
+        dict: Whether the playlist was inserted, updated or unchanged and the number of videos
+            inserted, updated, unchanged and linked. False if the playlist info couldn't be fetched.
+    """
+    # Step 1: Fetch playlist info using youtube API
+    playlist_info = await fetch_playlist_info(playlist_id)
+    if not playlist_info:
+        print("Failed to fetch playlist info.")
+        return False
 
-        if not video:
-            result = await db.execute(
-                select(Uploader).filter(Uploader.channel_id == entry.get("channel_id"))
-            )
-            uploader = result.scalars().first()
-            print("Adding a video to the playlist", entry.get("title"))
-
-            if uploader:
-                if uploader.source_id is None:
-                    uploader.source_id = entry.get("uploader_id")
-                    uploader.url = entry.get("uploader_url")
-            else:
-                # Create a new uploader if not found
-                if entry.get("uploader") and entry.get("channel_id"):
-                    uploader = Uploader(
-                        source_id=entry.get("uploader_id"),
-                        name=entry.get("uploader"),
-                        url=entry.get("uploader_url"),
-                        channel_id=entry.get("channel_id"),
-                        channel_url=entry.get("channel_url") or f"https://www.youtube.com/channel/{entry.get('uploader_id')}"
-                    )
-                    db.add(uploader)
-                    await db.flush()  # Flush to get the uploader ID
-                    print("Created new uploader:", uploader.name)
-
-                    print("Downloading uploader avatar...")
-                    await download_uploader_avatar(uploader.id, db)
-
-            await db.commit()  # Commit uploader creation
-
-            # If the video is not in the database, create a new video
-            video = Video(
-                source_id=entry.get("id"),
-                title=entry.get("title"),
-                description=entry.get("description"),
-                thumbnail=entry.get("thumbnail"),
-                upload_date=entry.get("upload_date"),
-                duration=entry.get("duration_string"),
-                uploader_id=uploader.id if uploader else None,  # Link the uploader to the video
-                available=entry.get("is_available", True),  # Set availability
+    result = await db.execute(
+        select(Playlist).filter(Playlist.source_id == playlist_info.get("id"))
+    )
+    playlist = result.scalars().first()
+
+    checkpoint = await get_fetch_checkpoint(playlist, db)
+    if checkpoint:
+        print(f"Resuming fetch of playlist {playlist_id} after {checkpoint.nb_enumerated} items")
+        full_sync = full_sync or checkpoint.full_sync
+
+    # A delta sync needs a playlist that was already fully enumerated once
+    delta_sync = not full_sync and playlist is not None and playlist.last_full_sync is not None
+    known_video_ids = await get_known_video_ids(playlist, db) if delta_sync else None
+    # Most recent upload date before this fetch (kept by the checkpoint, the stored pages
+    # already raised the one of the playlist), where the delta paging stops
+    if checkpoint:
+        previous_last_published = checkpoint.last_published
+        last_published = playlist.last_published
+    else:
+        previous_last_published = playlist.last_published if playlist else None
+        last_published = previous_last_published if delta_sync else None
+
+    # Step 2: Resolve the uploader of the playlist, creating it if needed
+    uploader_ids = await resolve_uploaders([playlist_info], db)
+    uploader_id = uploader_ids.get(playlist_info.get("channel_id"))
+
+    # Step 3: Stream the items, storing the playlist with its first page
+    playlist_status = None
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "linked": 0}
+    enumerated_video_ids = await get_checkpoint_video_ids(checkpoint, db) if checkpoint else set()
+    nb_enumerated = checkpoint.nb_enumerated if checkpoint else 0
+
+    pages = iter_playlist_pages(
+        playlist_id,
+        known_video_ids=known_video_ids,
+        last_published=previous_last_published,
+        page_token=checkpoint.page_token if checkpoint else None,
+    )
+    async for page, next_page_token in pages:
+        page_video_ids = [item["contentDetails"]["videoId"] for item in page]
+        enumerated_video_ids.update(page_video_ids)
+        nb_enumerated += len(page_video_ids)
+        video_ids = page_video_ids
+        if delta_sync:
+            video_ids = [vid for vid in video_ids if vid not in known_video_ids]
+
+        video_details = await get_video_details(video_ids, use_cache=use_cache)
+        entries = [video_details[vid] for vid in video_ids if video_details.get(vid)]
+
+        last_published = max(filter(None, [last_published, *(entry.get("upload_date") for entry in entries)]), default=None)
+
+        if playlist_status is None:
+            # The first entry of a resumed fetch isn't the first item of the playlist
+            update_thumbnail = not delta_sync and checkpoint is None
+            playlist, playlist_status = await store_playlist(
+                playlist, playlist_info, uploader_id, entries[0] if entries else {}, update_thumbnail, db
             )
-            db.add(video)
+
+        page_stats = await store_playlist_entries(playlist.id, entries, db)
+        for key, value in page_stats.items():
+            stats[key] += value
+
+        playlist.last_published = last_published
+
+        # Checkpoint committed with the page, so both are stored or neither.
+        # Only the items of the page are written, not all the items enumerated so far
+        if next_page_token:
+            if checkpoint is None:
+                checkpoint = PlaylistFetchCheckpoint(playlist_id=playlist.id, last_published=previous_last_published)
+                db.add(checkpoint)
+            checkpoint.full_sync = full_sync
+            checkpoint.page_token = next_page_token
+            checkpoint.nb_enumerated = nb_enumerated
             await db.flush()
-            print("Created new video:", video.title)
-        else:
-            # Update existing video info
-            video.title = entry.get("title")
-            video.description = entry.get("description")
-            video.thumbnail = entry.get("thumbnail")
-            video.upload_date = entry.get("upload_date")
-            video.duration = entry.get("duration_string")
-            if uploader:
-                video.uploader_id = uploader.id
-            video.available = entry.get("is_available", True)
-            print("Updated existing video:", video.title)
-
-        # Step 5: Create the relationship entry between Playlist and Video
-        result = await db.execute(
-            select(PlaylistVideo).filter(
-                PlaylistVideo.playlist_id == playlist.id,
-                PlaylistVideo.video_id == video.id
-            )
+            if page_video_ids:
+                await db.execute(
+                    insert(PlaylistFetchCheckpointItem)
+                    .values([{"checkpoint_id": checkpoint.id, "video_id": vid} for vid in page_video_ids])
+                    .on_conflict_do_nothing()
+                )
+        await db.commit()
+
+        await ws_manager.send_message(
+            "playlists",
+            {"playlist_id": playlist_id, "fetch_progress": True, "nb_enumerated": nb_enumerated, "stats": dict(stats)}
         )
-        existing_relation = result.scalars().first()
 
-        if not existing_relation:
-            playlist_video = PlaylistVideo(
-                playlist_id=playlist.id,
-                video_id=video.id,
-            )
-            db.add(playlist_video) 
+    if playlist_status is None:
+        # Empty playlist
+        playlist, playlist_status = await store_playlist(playlist, playlist_info, uploader_id, {}, not delta_sync, db)
+
+    if delta_sync:
+        print(f"Delta sync: {stats['linked']} new items out of {nb_enumerated} enumerated")
+    print(f"Stored playlist videos: {stats}")
+
+    if not delta_sync:
+        # Full reconciliation: catch the items removed since the last full sync
+        if enumerated_video_ids:
+            await remove_deleted_playlist_items(playlist, enumerated_video_ids, db)
+        playlist.last_full_sync = Datetime.now(timezone.utc)
+
+    if checkpoint:
+        await db.delete(checkpoint)
 
-    # Step 6: Commit all PlaylistVideo entries
     await db.commit()
 
-    return playlist.title
+    return {"playlist": playlist_status, **stats}
 
 
-async def fetch_full_playlist(playlist_id: str, playlist_title: str = None):
+async def fetch_full_playlist(playlist_id: str, playlist_title: str = None, full_sync: bool = True, use_cache: bool = True):
     """Fetch full playlist info in the background."""
     print(f"Fetching full playlist info for {playlist_id}...")
     # Check if already fetching
@@ -255,7 +321,7 @@ async def fetch_full_playlist(playlist_id: str, playlist_title: str = None):
         try: 
             # Fetch and store playlist info
             print(f"Fetching playlist info for {playlist_id}...")
-            result = await fetch_and_store_playlist_info(playlist_id, db)
+            result = await fetch_and_store_playlist_info(playlist_id, db, full_sync, use_cache)
             result_request = await db.execute(
                 select(Playlist).filter(Playlist.source_id == playlist_id)
             )
@@ -265,15 +331,8 @@ async def fetch_full_playlist(playlist_id: str, playlist_title: str = None):
             print(f"Error fetching playlist info: {e}")
             result = None
 
-            # Remove playlist from db
-            result_request = await db.execute(
-                select(Playlist).filter(Playlist.source_id == playlist_id)
-            )
-            playlist = result_request.scalars().first()
-            if playlist:
-                await db.delete(playlist)
-                await db.commit()
-                print(f"Removed playlist {playlist_id} from database due to error.")
+            # The pages already stored are kept with their checkpoint, the next fetch resumes from it
+            await db.rollback()
 
         finally:
             fetching.pop(playlist_id, None)
@@ -289,5 +348,21 @@ async def fetch_full_playlist(playlist_id: str, playlist_title: str = None):
 
         await ws_manager.send_message(
             "playlists", 
-            {"playlist_id": playlist_id, "fetch_success": True, "message": f"Successfully fetched info for playlist : {playlist_title or playlist_id}" }
+            {"playlist_id": playlist_id, "fetch_success": True, "message": f"Successfully fetched info for playlist : {playlist_title or playlist_id}", "stats": result }
+        )
+
+
+async def resume_interrupted_fetches():
+    """
+    Resume the playlist fetches interrupted by a restart, one playlist at a time.
+    """
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(Playlist.source_id, Playlist.title, PlaylistFetchCheckpoint.full_sync)
+            .join(PlaylistFetchCheckpoint, PlaylistFetchCheckpoint.playlist_id == Playlist.id)
         )
+        interrupted = result.all()
+
+    for source_id, title, full_sync in interrupted:
+        print(f"Resuming interrupted fetch of playlist {title}")
+        await fetch_full_playlist(source_id, title, full_sync=full_sync)
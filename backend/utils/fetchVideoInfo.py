@@ -1,11 +1,12 @@
-from database.models import Video, Uploader, PlaylistVideo, Playlist  # Import your models
+from database.models import Video, PlaylistVideo, Playlist  # Import your models
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 
 from websocket_manager import ws_manager
 from database.database import SessionLocal
 
-from utils.download_uploader_avatar import download_uploader_avatar
+from utils.uploader_resolver import resolve_uploaders
+from utils.store_videos import get_video_content_hash
 from utils.youtube_api import fetch_video_info_from_api
 
 from datetime import datetime as Datetime
@@ -31,30 +32,10 @@ async def fetch_and_store_video_info(video_id, db: AsyncSession):
         print("Failed to fetch video info.")
         return False
 
-    # Step 2: Check if the uploader exists or create a new uploader
-    result = await db.execute(
-        select(Uploader).filter(Uploader.channel_id == video_info.get("channel_id"))
-    )
-    uploader = result.scalars().first()  # Extract single result
-
-    if not uploader:
-        # Create a new uploader if not found
-        if video_info.get("channel_id") and video_info.get("uploader"):
-            uploader = Uploader(
-                channel_id=video_info.get("channel_id"),
-                name=video_info.get("uploader"),
-                channel_url=video_info.get("channel_url") or f"https://www.youtube.com/channel/{video_info.get('channel_id')}"
-            )
-            db.add(uploader)
-            await db.flush()
-            print("Created new uploader:", uploader.name)
+    # Step 2: Resolve the uploader of the video, creating it if needed
+    uploader_ids = await resolve_uploaders([video_info], db)
+    uploader_id = uploader_ids.get(video_info.get("channel_id"))
 
-            print("Downloading uploader avatar...")
-            await download_uploader_avatar(uploader.id, db)  # Download the uploader's avatar
-    
-            await db.commit()  # Commit uploader creation
-        
-    
     print("Video id", video_info.get("id"))
     result = await db.execute(
         select(Video).filter(Video.source_id == video_info.get('id'))
@@ -62,32 +43,7 @@ async def fetch_and_store_video_info(video_id, db: AsyncSession):
     video = result.scalars().first()
 
     if not video:
-        result = await db.execute(
-            select(Uploader).filter(Uploader.channel_id == video_info.get("channel_id"))
-        )
-        uploader = result.scalars().first()
         print("Adding a video ", video_info.get("title"))
-            
-        if uploader:
-            if uploader.source_id is None:
-                uploader.source_id = video_info.get("uploader_id")
-                uploader.url = video_info.get("uploader_url")
-        else:
-            # Create a new uploader if not found
-            if video_info.get("uploader") and video_info.get("channel_id"):
-                uploader = Uploader(
-                    source_id=video_info.get("uploader_id"),
-                    name=video_info.get("uploader"),
-                    url=video_info.get("uploader_url"),
-                    channel_id=video_info.get("channel_id"),
-                    channel_url=video_info.get("channel_url") or f"https://www.youtube.com/channel/{video_info.get('uploader_id')}"
-                )
-                db.add(uploader)
-                print("Created new uploader:", uploader.name)
-                print("Downloading uploader avatar...")
-                await download_uploader_avatar(uploader.id, db)
-
-        await db.commit()  # Commit uploader creation
 
         # If the video is not in the database, create a new video
         video = Video(
@@ -97,8 +53,9 @@ async def fetch_and_store_video_info(video_id, db: AsyncSession):
             thumbnail=video_info.get("thumbnail"),
             upload_date=video_info.get("upload_date"),
             duration=video_info.get("duration_string"),
-            uploader_id=uploader.id if uploader else None,
+            uploader_id=uploader_id,
             available=video_info.get("is_available", True),
+            content_hash=get_video_content_hash(video_info),
         )
         db.add(video)
         await db.flush()
@@ -111,9 +68,10 @@ async def fetch_and_store_video_info(video_id, db: AsyncSession):
         video.thumbnail = video_info.get("thumbnail")
         video.upload_date = video_info.get("upload_date")
         video.duration = video_info.get("duration_string")
-        if uploader:
-            video.uploader_id = uploader.id
+        if uploader_id:
+            video.uploader_id = uploader_id
         video.available = video_info.get("is_available", True)
+        video.content_hash = get_video_content_hash(video_info)
 
     # Step 5: Create the relationship entry between Playlist and Video
     result = await db.execute(
@@ -9,6 +9,7 @@ def init_folders():
     folders = [
         MEDIA_STORAGE_PATH + "/downloads",
         METADATA_STORAGE_PATH + "/avatars",
+        METADATA_STORAGE_PATH + "/cache",
         UPLOADS_PATH
     ]
 
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.database import engine
+
+
+# Messages of the worker processes for the WebSocket clients of the API
+WS_MESSAGES_CHANNEL = "ws_messages"
+# Download jobs were queued
+DOWNLOAD_JOBS_CHANNEL = "download_jobs"
+
+# PostgreSQL rejects notification payloads of 8000 bytes or more
+MAX_PAYLOAD_SIZE = 7999
+
+
+async def notify(channel: str, payload: str = "", db: AsyncSession | None = None):
+    """
+    Send a notification to the listeners of a channel. With a session, it is only
+    delivered once the session is committed.
+    """
+    if len(payload.encode("utf-8")) > MAX_PAYLOAD_SIZE:
+        print(f"Notification on {channel} too large, dropped")
+        return
+
+    statement = text("SELECT pg_notify(:channel, :payload)")
+    params = {"channel": channel, "payload": payload}
+    if db is not None:
+        await db.execute(statement, params)
+        return
+
+    async with engine.connect() as connection:
+        await connection.execute(statement, params)
+        await connection.commit()
+
+
+async def publish_ws_message(group: str, message: dict):
+    """
+    Forward a WebSocket message to the API processes (used by the download workers).
+    """
+    await notify(WS_MESSAGES_CHANNEL, json.dumps({"group": group, "message": message}, default=str))
+
+
+async def listen(handlers: dict):
+    """
+    Call the async handler of a channel with the payload of each notification received,
+    reconnecting if the connection is lost. Runs until cancelled.
+
+    Args:
+        handlers (dict): Async handler by channel name.
+    """
+    while True:
+        try:
+            async with engine.connect() as connection:
+                raw_connection = await connection.get_raw_connection()
+                driver_connection = raw_connection.driver_connection
+                notifications = asyncio.Queue()
+
+                def on_notification(_connection, _pid, channel, payload):
+                    notifications.put_nowait((channel, payload))
+
+                def on_termination(_connection):
+                    notifications.put_nowait((None, None))
+
+                driver_connection.add_termination_listener(on_termination)
+                for channel in handlers:
+                    await driver_connection.add_listener(channel, on_notification)
+
+                try:
+                    while True:
+                        channel, payload = await notifications.get()
+                        if channel is None:
+                            raise ConnectionError("Connection closed")
+                        try:
+                            await handlers[channel](payload)
+                        except Exception as e:
+                            print(f"Error handling notification on {channel}: {e}")
+                finally:
+                    # The connection goes back to the pool
+                    if not driver_connection.is_closed():
+                        for channel in handlers:
+                            await driver_connection.remove_listener(channel, on_notification)
+                    driver_connection.remove_termination_listener(on_termination)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error listening to notifications: {e}, reconnecting in 5 seconds")
+            await asyncio.sleep(5)
+
+
+async def forward_ws_message(payload: str):
+    """
+    Send a WebSocket message published by a download worker to the clients of this process.
+    """
+    from websocket_manager import ws_manager
+
+    data = json.loads(payload)
+    await ws_manager.send_message(data["group"], data["message"])
@@ -0,0 +1,179 @@
+import asyncio
+import math
+
+from database.models import Playlist
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from websocket_manager import ws_manager
+from database.database import SessionLocal
+
+from utils.constants import SWEEP_PLAYLIST_CONCURRENCY
+from utils.fetchPlaylistInfo import (
+    fetching,
+    fetch_playlist_info,
+    get_fetch_checkpoint,
+    remove_deleted_playlist_items,
+    store_playlist,
+)
+from utils.store_videos import store_playlist_entries
+from utils.uploader_resolver import resolve_uploaders
+from utils.youtube_api import iter_playlist_pages, get_video_details
+
+from datetime import datetime as Datetime, timezone
+
+
+async def enumerate_playlist(playlist: Playlist) -> dict | None:
+    """
+    Fetch the info of a playlist and the ids of all its items.
+
+    Returns:
+        dict: The playlist info with the `video_ids` of its items, None if the playlist couldn't be fetched.
+    """
+    try:
+        playlist_info = await fetch_playlist_info(playlist.source_id)
+        if not playlist_info:
+            print(f"Failed to fetch playlist info for {playlist.source_id}.")
+            return None
+
+        video_ids = []
+        async for page, _ in iter_playlist_pages(playlist.source_id):
+            video_ids.extend(item["contentDetails"]["videoId"] for item in page)
+    except Exception as e:
+        print(f"Error enumerating playlist {playlist.source_id}: {e}")
+        return None
+
+    playlist_info["video_ids"] = list(dict.fromkeys(video_ids))
+    return playlist_info
+
+
+async def store_sweep_playlist(playlist_id, playlist_info: dict, video_details: dict, db: AsyncSession) -> dict:
+    """
+    Store the items of an enumerated playlist from the shared video details, as a full sync.
+
+    Returns:
+        dict: Whether the playlist was updated or unchanged and the number of videos
+            inserted, updated, unchanged and linked.
+    """
+    playlist = await db.get(Playlist, playlist_id)
+
+    uploader_ids = await resolve_uploaders([playlist_info], db)
+    uploader_id = uploader_ids.get(playlist_info.get("channel_id"))
+
+    entries = [video_details[vid] for vid in playlist_info["video_ids"] if video_details.get(vid)]
+
+    playlist, playlist_status = await store_playlist(
+        playlist, playlist_info, uploader_id, entries[0] if entries else {}, True, db
+    )
+    stats = await store_playlist_entries(playlist.id, entries, db)
+
+    playlist.last_published = max(filter(None, (entry.get("upload_date") for entry in entries)), default=None)
+    if playlist_info["video_ids"]:
+        await remove_deleted_playlist_items(playlist, set(playlist_info["video_ids"]), db)
+    playlist.last_full_sync = Datetime.now(timezone.utc)
+
+    # The sweep went through the whole playlist, an interrupted fetch doesn't need to be resumed
+    checkpoint = await get_fetch_checkpoint(playlist, db)
+    if checkpoint:
+        await db.delete(checkpoint)
+
+    await db.commit()
+
+    return {"playlist": playlist_status, **stats}
+
+
+async def refresh_library(db: AsyncSession, use_cache: bool = True) -> dict:
+    """
+    Refresh every playlist of the library in one sweep.
+
+    1. The items of all playlists are enumerated, a few playlists at a time.
+    2. The details of the videos are fetched once for the whole library, in full
+       50 ids batches, even when a video is in several playlists.
+    3. The details are fanned out to every playlist, stored as a full sync.
+
+    Returns:
+        dict: Sweep report, with the videos.list calls saved compared to refreshing
+            the playlists one by one.
+    """
+    result = await db.execute(select(Playlist).where(Playlist.source_id != "0"))
+    playlists = result.scalars().all()
+    # Playlists refreshed by the user during the sweep, left to their own fetch
+    skipped = set()
+
+    async def enumerate_sweep_playlist(playlist: Playlist, semaphore: asyncio.Semaphore) -> dict | None:
+        async with semaphore:
+            # Only marked as fetching while enumerated, a refresh asked meanwhile isn't dropped
+            if playlist.source_id in fetching:
+                skipped.add(playlist.source_id)
+                return None
+            fetching[playlist.source_id] = True
+            try:
+                return await enumerate_playlist(playlist)
+            finally:
+                fetching.pop(playlist.source_id, None)
+
+    # Step 1: Enumerate the items of every playlist
+    semaphore = asyncio.Semaphore(SWEEP_PLAYLIST_CONCURRENCY)
+    playlist_infos = await asyncio.gather(*(enumerate_sweep_playlist(playlist, semaphore) for playlist in playlists))
+
+    # Step 2: Fetch the details of the deduplicated videos, a failed chunk only
+    # fails the playlists containing its videos
+    all_video_ids = list(dict.fromkeys(
+        video_id
+        for playlist_info in playlist_infos if playlist_info
+        for video_id in playlist_info["video_ids"]
+    ))
+    failed_video_ids = set()
+    video_details = await get_video_details(all_video_ids, use_cache=use_cache, failed_ids=failed_video_ids)
+
+    # Step 3: Fan the details out to every playlist
+    failed = 0
+    for playlist, playlist_info in zip(playlists, playlist_infos):
+        if playlist.source_id in skipped or playlist.source_id in fetching:
+            # Refreshed by the user since its enumeration, its own fetch is more recent
+            skipped.add(playlist.source_id)
+            continue
+        if not playlist_info:
+            failed += 1
+            continue
+
+        fetching[playlist.source_id] = True
+        try:
+            if failed_video_ids.intersection(playlist_info["video_ids"]):
+                raise ValueError("the details of some videos couldn't be fetched")
+            # One session per playlist, a failure doesn't affect the next ones
+            async with SessionLocal() as playlist_db:
+                stats = await store_sweep_playlist(playlist.id, playlist_info, video_details, playlist_db)
+            print(f"Stored playlist {playlist.title}: {stats}")
+        except Exception as e:
+            print(f"Error storing playlist {playlist.source_id}: {e}")
+            failed += 1
+            await ws_manager.send_message(
+                "playlists",
+                {"playlist_id": playlist.source_id, "fetch_success": False, "message": f"Failed to fetch info for playlist : {playlist.title}"}
+            )
+            continue
+        finally:
+            fetching.pop(playlist.source_id, None)
+
+        await ws_manager.send_message(
+            "playlists",
+            {"playlist_id": playlist.source_id, "fetch_success": True, "message": f"Successfully fetched info for playlist : {playlist.title}", "stats": stats}
+        )
+
+    naive_calls = sum(
+        math.ceil(len(playlist_info["video_ids"]) / 50) for playlist_info in playlist_infos if playlist_info
+    )
+    sweep_calls = math.ceil(len(all_video_ids) / 50)
+    report = {
+        "playlists": len(playlists),
+        "failed": failed,
+        "skipped": len(skipped),
+        "videos": sum(len(playlist_info["video_ids"]) for playlist_info in playlist_infos if playlist_info),
+        "unique_videos": len(all_video_ids),
+        "videos_list_calls": sweep_calls,
+        "naive_videos_list_calls": naive_calls,
+        "api_calls_saved": naive_calls - sweep_calls,
+    }
+    print(f"Library refresh sweep: {report}")
+    return report
@@ -0,0 +1,163 @@
+from database.models import Video, PlaylistVideo
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import func
+
+from utils.uploader_resolver import resolve_uploaders
+
+import hashlib
+import json
+
+
+# Rows per INSERT statement, keeps the number of bound parameters far below the PostgreSQL limit
+INSERT_BATCH_SIZE = 1000
+
+
+def batched(lst, n):
+    for i in range(0, len(lst), n):
+        yield lst[i:i + n]
+
+
+def compute_content_hash(values: dict) -> str:
+    """
+    Return a stable fingerprint of normalized values, used to skip the rows that didn't change.
+    """
+    payload = json.dumps(values, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_video_content_hash(entry: dict) -> str:
+    """
+    Return the fingerprint of the stored fields of a video (see `process_video_details`).
+    """
+    return compute_content_hash({
+        "title": entry.get("title"),
+        "description": entry.get("description"),
+        "thumbnail": entry.get("thumbnail"),
+        "upload_date": entry.get("upload_date"),
+        "duration": entry.get("duration_string"),
+        "channel_id": entry.get("channel_id"),
+        "available": entry.get("is_available", True),
+    })
+
+
+async def upsert_videos(entries: list[dict], uploader_ids: dict, db: AsyncSession) -> tuple[dict, dict]:
+    """
+    Insert or update the videos of the given entries with `INSERT ... ON CONFLICT DO UPDATE`.
+
+    Videos whose content hash didn't change since the last write are left untouched.
+
+    Args:
+        entries (list): Processed video details (see `process_video_details`).
+        uploader_ids (dict): Uploader id by channel id.
+        db (AsyncSession): The database session, the caller commits.
+
+    Returns:
+        tuple: The video ids by source id and the number of videos inserted, updated and unchanged.
+    """
+    source_ids = list({entry["id"] for entry in entries})
+    if not source_ids:
+        return {}, {"inserted": 0, "updated": 0, "unchanged": 0}
+
+    result = await db.execute(
+        select(Video.source_id, Video.id, Video.uploader_id, Video.content_hash)
+        .where(Video.source_id.in_(source_ids))
+    )
+    existing_videos = {row.source_id: row for row in result.all()}
+
+    video_ids = {}
+    rows = {}
+    for entry in entries:
+        content_hash = get_video_content_hash(entry)
+        existing = existing_videos.get(entry["id"])
+        uploader_id = uploader_ids.get(entry.get("channel_id"))
+        if (
+            existing
+            and existing.content_hash == content_hash
+            and uploader_id in (None, existing.uploader_id)
+        ):
+            video_ids[entry["id"]] = existing.id
+            continue
+
+        rows[entry["id"]] = {
+            "source_id": entry["id"],
+            "title": entry.get("title"),
+            "description": entry.get("description"),
+            "thumbnail": entry.get("thumbnail"),
+            "upload_date": entry.get("upload_date"),
+            "duration": entry.get("duration_string"),
+            "uploader_id": uploader_id,
+            "available": entry.get("is_available", True),
+            "content_hash": content_hash,
+        }
+
+    for batch in batched(list(rows.values()), INSERT_BATCH_SIZE):
+        statement = insert(Video).values(batch)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Video.source_id],
+            set_={
+                "title": statement.excluded.title,
+                "description": statement.excluded.description,
+                "thumbnail": statement.excluded.thumbnail,
+                "upload_date": statement.excluded.upload_date,
+                "duration": statement.excluded.duration,
+                "uploader_id": func.coalesce(statement.excluded.uploader_id, Video.uploader_id),
+                "available": statement.excluded.available,
+                "content_hash": statement.excluded.content_hash,
+            },
+        ).returning(Video.source_id, Video.id)
+        result = await db.execute(statement)
+        video_ids.update({source_id: video_id for source_id, video_id in result.all()})
+
+    inserted = len([source_id for source_id in rows if source_id not in existing_videos])
+    return video_ids, {
+        "inserted": inserted,
+        "updated": len(rows) - inserted,
+        "unchanged": len(video_ids) - len(rows),
+    }
+
+
+async def link_playlist_videos(playlist_id, video_ids: list, db: AsyncSession) -> int:
+    """
+    Link videos to a playlist with `INSERT ... ON CONFLICT DO NOTHING`.
+
+    Returns:
+        int: The number of links created.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    if not video_ids:
+        return 0
+
+    result = await db.execute(
+        select(PlaylistVideo.video_id).where(
+            PlaylistVideo.playlist_id == playlist_id,
+            PlaylistVideo.video_id.in_(video_ids),
+        )
+    )
+    linked_video_ids = set(result.scalars().all())
+    new_video_ids = [video_id for video_id in video_ids if video_id not in linked_video_ids]
+
+    for batch in batched(new_video_ids, INSERT_BATCH_SIZE):
+        await db.execute(
+            insert(PlaylistVideo)
+            .values([{"playlist_id": playlist_id, "video_id": video_id} for video_id in batch])
+            .on_conflict_do_nothing(index_elements=[PlaylistVideo.playlist_id, PlaylistVideo.video_id])
+        )
+
+    return len(new_video_ids)
+
+
+async def store_playlist_entries(playlist_id, entries: list[dict], db: AsyncSession) -> dict:
+    """
+    Store the videos of a playlist and link them to it. Nothing is committed, so the
+    caller can keep the whole ingestion in a single transaction.
+
+    Returns:
+        dict: Number of videos inserted, updated, unchanged and linked.
+    """
+    uploader_ids = await resolve_uploaders(entries, db)
+    video_ids, stats = await upsert_videos(entries, uploader_ids, db)
+    linked = await link_playlist_videos(playlist_id, [video_ids[entry["id"]] for entry in entries], db)
+
+    return {**stats, "linked": linked}
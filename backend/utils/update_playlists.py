@@ -1,30 +1,28 @@
-from utils.fetchPlaylistInfo import fetch_full_playlist
+from utils.fetchPlaylistInfo import fetch_full_playlist, needs_full_sync
 from database.database import SessionLocal
-from database.models import Playlist
+from database.models import Playlist, DownloadJobPriority
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from utils.download_playlist import download_playlist
+from utils.youtube_client import get_api_cache_stats
+from utils.youtube_quota import priority, QuotaPriority
+from utils.refresh_sweep import refresh_library
 
 
 async def update_playlists_info_task(db: AsyncSession):
     """Task to update playlists info."""
 
-    playlists = await db.execute(select(Playlist))
-    playlists = playlists.scalars().all()
-    
-    for playlist in playlists:
-        try:
-            await fetch_full_playlist(playlist.source_id, playlist.title)
-        except Exception as e:
-            print(f"Error fetching playlist {playlist.source_id}: {e}")
-            continue
+    # Single sweep over the library, the videos shared by several playlists are fetched once
+    await refresh_library(db)
 
     print("All playlists updated successfully.")
+    print(f"YouTube API cache stats: {await get_api_cache_stats()}")
 
 async def update_playlists_info_job():
     """Job to update playlists info."""
     async with SessionLocal() as db:
-        await update_playlists_info_task(db)
+        with priority(QuotaPriority.SCHEDULED):
+            await update_playlists_info_task(db)
     print("Playlists info updated successfully.")
 
 async def update_playlists_downloads(db: AsyncSession):
@@ -35,8 +33,9 @@ async def update_playlists_downloads(db: AsyncSession):
 
     for playlist in playlists:
         try:
-            await fetch_full_playlist(playlist.source_id, playlist.title)
-            await download_playlist(playlist)
+            # Delta sync by default, with a periodic full reconciliation to catch removals
+            await fetch_full_playlist(playlist.source_id, playlist.title, full_sync=needs_full_sync(playlist))
+            await download_playlist(playlist, priority=DownloadJobPriority.SCHEDULED)
         except Exception as e:
             print(f"Error fetching playlist {playlist.source_id}: {e}")
             continue
@@ -46,5 +45,6 @@ async def update_playlists_downloads(db: AsyncSession):
 async def update_playlists_downloads_job():
     """Job to update playlists downloads."""
     async with SessionLocal() as db:
-        await update_playlists_downloads(db)
+        with priority(QuotaPriority.SCHEDULED):
+            await update_playlists_downloads(db)
     print("Playlists downloads updated successfully.")
@@ -0,0 +1,150 @@
+from database.models import Uploader
+from sqlalchemy import event, update, bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from utils.download_uploader_avatar import avatar_queue
+
+
+# Cache of the uploader ids by channel id, per process (API and download worker each have
+# theirs). Kept up to date by the mapper events below for the uploaders changed or deleted
+# through the ORM; bulk update() / delete() statements changing the channel id or removing
+# uploaders must call `invalidate_uploader_cache`. Uploaders are never deleted by the
+# application, so the caches of the other processes can't point to a removed uploader.
+uploader_ids_cache = {}
+
+# Key of the session info holding the uploaders created in the current transaction
+PENDING_UPLOADERS_KEY = "pending_uploader_ids"
+
+
+def invalidate_uploader_cache(channel_id: str | None = None):
+    """
+    Remove an uploader from the cache of this process, or clear the whole cache if no
+    channel id is given. To be called after bulk statements changing or deleting uploaders.
+    """
+    if channel_id is None:
+        uploader_ids_cache.clear()
+    else:
+        uploader_ids_cache.pop(channel_id, None)
+
+
+@event.listens_for(Uploader, "after_update")
+@event.listens_for(Uploader, "after_delete")
+def on_uploader_changed(mapper, connection, uploader: Uploader):
+    # The channel id may have changed, drop every entry pointing to this uploader
+    for channel_id, uploader_id in list(uploader_ids_cache.items()):
+        if uploader_id == uploader.id or channel_id == uploader.channel_id:
+            uploader_ids_cache.pop(channel_id, None)
+
+
+@event.listens_for(Session, "after_commit")
+def on_commit(session: Session):
+    # Uploaders created in the transaction can only be cached, and their avatar
+    # downloaded, once they are committed
+    created = session.info.pop(PENDING_UPLOADERS_KEY, {})
+    uploader_ids_cache.update(created)
+    for uploader_id in created.values():
+        avatar_queue.enqueue(uploader_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def on_rollback(session: Session):
+    session.info.pop(PENDING_UPLOADERS_KEY, None)
+
+
+async def resolve_uploaders(entries: list[dict], db: AsyncSession) -> dict:
+    """
+    Return the uploader ids of the channels referenced by the given entries.
+
+    Unknown channels are loaded with a single `IN` query and the missing uploaders are
+    created with a single multi-row insert. Known channels are served from the
+    process-wide cache without touching the database. The avatars of the created
+    uploaders are queued once the transaction is committed.
+
+    Args:
+        entries (list): Dicts with the `channel_id`, `uploader`, `uploader_id`, `uploader_url`
+            and `channel_url` keys (see `process_video_details`).
+        db (AsyncSession): The database session, the caller commits.
+
+    Returns:
+        dict: Uploader id by channel id.
+    """
+    entries_by_channel = {}
+    for entry in entries:
+        if entry.get("channel_id"):
+            entries_by_channel.setdefault(entry["channel_id"], entry)
+
+    pending = db.sync_session.info.setdefault(PENDING_UPLOADERS_KEY, {})
+    uploader_ids = {}
+    for channel_id in entries_by_channel:
+        uploader_id = uploader_ids_cache.get(channel_id) or pending.get(channel_id)
+        if uploader_id:
+            uploader_ids[channel_id] = uploader_id
+
+    missing_channel_ids = [channel_id for channel_id in entries_by_channel if channel_id not in uploader_ids]
+    if not missing_channel_ids:
+        return uploader_ids
+
+    result = await db.execute(
+        select(Uploader.channel_id, Uploader.id, Uploader.source_id)
+        .where(Uploader.channel_id.in_(missing_channel_ids))
+    )
+    incomplete_uploaders = []
+    for channel_id, uploader_id, source_id in result.all():
+        uploader_ids[channel_id] = uploader_id
+        uploader_ids_cache[channel_id] = uploader_id
+        if source_id is None and entries_by_channel[channel_id].get("uploader_id"):
+            incomplete_uploaders.append({
+                "b_channel_id": channel_id,
+                "b_source_id": entries_by_channel[channel_id].get("uploader_id"),
+                "b_url": entries_by_channel[channel_id].get("uploader_url"),
+            })
+
+    if incomplete_uploaders:
+        # On the table: an ORM update() with a list of parameters is an update by primary key
+        uploaders = Uploader.__table__
+        await db.execute(
+            update(uploaders)
+            .where(uploaders.c.channel_id == bindparam("b_channel_id"))
+            .values(source_id=bindparam("b_source_id"), url=bindparam("b_url")),
+            incomplete_uploaders,
+        )
+
+    new_uploaders = [
+        {
+            "source_id": entry.get("uploader_id"),
+            "name": entry.get("uploader"),
+            "url": entry.get("uploader_url"),
+            "channel_id": channel_id,
+            "channel_url": entry.get("channel_url") or f"https://www.youtube.com/channel/{channel_id}",
+        }
+        for channel_id, entry in entries_by_channel.items()
+        if channel_id not in uploader_ids and entry.get("uploader")
+    ]
+    if not new_uploaders:
+        return uploader_ids
+
+    result = await db.execute(
+        insert(Uploader)
+        .values(new_uploaders)
+        .on_conflict_do_nothing(index_elements=[Uploader.channel_id])
+        .returning(Uploader.channel_id, Uploader.id)
+    )
+    created = dict(result.all())
+    uploader_ids.update(created)
+    pending.update(created)
+    print(f"Created {len(created)} new uploaders")
+
+    # Uploaders inserted concurrently by another transaction
+    conflicting_channel_ids = [
+        uploader["channel_id"] for uploader in new_uploaders if uploader["channel_id"] not in created
+    ]
+    if conflicting_channel_ids:
+        result = await db.execute(
+            select(Uploader.channel_id, Uploader.id).where(Uploader.channel_id.in_(conflicting_channel_ids))
+        )
+        uploader_ids.update(dict(result.all()))
+
+    return uploader_ids
@@ -1,26 +1,58 @@
-from googleapiclient.discovery import build
+import asyncio
 import os
-from dotenv import load_dotenv
 import re
 
-load_dotenv()
+from utils.constants import (
+    METADATA_STORAGE_PATH,
+    VIDEO_CACHE_MAX_ENTRIES,
+    VIDEO_CACHE_TTL_HOURS,
+    YOUTUBE_API_CHUNK_RETRIES,
+    YOUTUBE_API_CONCURRENCY,
+)
+from utils.disk_cache import DiskCache
+from utils.youtube_client import YOUTUBE
+from utils.youtube_quota import QuotaExceededError
 
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-YOUTUBE = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+
+# Processed video details by video id, to skip videos.list calls for recently fetched videos
+video_cache = DiskCache(
+    os.path.join(METADATA_STORAGE_PATH, "cache", "videos.sqlite"),
+    "videos",
+    ttl=VIDEO_CACHE_TTL_HOURS * 3600,
+    max_entries=VIDEO_CACHE_MAX_ENTRIES,
+)
 
 async def get_playlist_info(playlist_id):
     playlist_request = YOUTUBE.playlists().list(
         part="snippet",
         id=playlist_id
     )
-    playlist_response = playlist_request.execute()
+    playlist_response = await playlist_request.execute()
     if not playlist_response["items"]:
         return None
     return playlist_response["items"][0]
 
-async def get_playlist_items(playlist_id):
-    videos = []
-    next_page_token = None
+async def iter_playlist_pages(playlist_id, known_video_ids: set | None = None, last_published: str | None = None, page_token: str | None = None):
+    """
+    Enumerate the items of a playlist page by page (up to 50 items per page), so the
+    caller can process each page before the next one is requested. Yields the items of
+    each page with the token of the next one (None for the last page), the enumeration
+    can be resumed from such a token with `page_token`.
+
+    In delta mode (`known_video_ids` given), paging stops at a page only made of known
+    items, once the items we don't know yet are expected to have all been seen: either at
+    least as many new items as the playlist grew since the last sync were found (removals
+    can offset additions, so it's only a lower bound), or new items published after
+    `last_published` were found before (playlists ordered from the newest item).
+    When the playlist didn't grow and its first page has no new items, the items can't
+    be told from a playlist where removals offset additions: every page is enumerated.
+    Removed items are not detected in this mode.
+    """
+    next_page_token = page_token
+    new_items_count = 0
+    new_items_seen = False
+    enumerate_all = False
+    first_page = True
 
     while True:
         playlist_items_request = YOUTUBE.playlistItems().list(
@@ -29,14 +61,39 @@ async def get_playlist_items(playlist_id):
             maxResults=50,
             pageToken=next_page_token
         )
-        playlist_items_response = playlist_items_request.execute()
-        for item in playlist_items_response["items"]:
-            videos.append(item)
+        playlist_items_response = await playlist_items_request.execute()
         next_page_token = playlist_items_response.get("nextPageToken")
+        yield playlist_items_response["items"], next_page_token
+
         if not next_page_token:
             break
 
-    return videos
+        if known_video_ids is not None:
+            new_items = [
+                item for item in playlist_items_response["items"]
+                if item["contentDetails"]["videoId"] not in known_video_ids
+            ]
+            new_items_count += len(new_items)
+
+            expected_new_items = playlist_items_response["pageInfo"]["totalResults"] - len(known_video_ids)
+            if first_page and expected_new_items <= 0 and not new_items:
+                enumerate_all = True
+            first_page = False
+
+            if not enumerate_all and not new_items and (new_items_count >= expected_new_items or new_items_seen):
+                break
+            if any(is_published_after(item, last_published) for item in new_items):
+                new_items_seen = True
+
+
+def is_published_after(playlist_item: dict, date: str | None) -> bool:
+    """
+    Check if the video of a playlist item was published after a date (YYYYMMDD).
+    """
+    published_at = playlist_item["contentDetails"].get("videoPublishedAt")
+    if not published_at or not date:
+        return False
+    return published_at.split("T")[0].replace("-", "") > date
 
 
 def chunked(lst, n):
@@ -45,17 +102,106 @@ def chunked(lst, n):
         yield lst[i:i + n]
 
 
-async def get_video_details(video_ids):
-    result = {}
+async def fetch_video_details_chunk(index: int, chunk: list, semaphore: asyncio.Semaphore) -> tuple[int, dict]:
+    """
+    Fetch the details of up to 50 videos, retrying this chunk only if it fails.
 
-    for chunk in chunked(video_ids, 50):
-        video_request = YOUTUBE.videos().list(
-            part="snippet,contentDetails",
-            id=",".join(chunk)
-        )
-        response = video_request.execute()
+    Returns:
+        tuple: The index of the chunk and the processed details by video id.
+    """
+    for attempt in range(YOUTUBE_API_CHUNK_RETRIES + 1):
+        try:
+            async with semaphore:
+                response = await YOUTUBE.videos().list(
+                    part="snippet,contentDetails",
+                    id=",".join(chunk)
+                ).execute()
+            return index, {item["id"]: process_video_details(item) for item in response.get("items", [])}
+        except QuotaExceededError:
+            raise
+        except Exception as e:
+            if attempt == YOUTUBE_API_CHUNK_RETRIES:
+                raise
+            print(f"Error fetching video details chunk {index} (attempt {attempt + 1}): {e}")
+            await asyncio.sleep(2 ** attempt)
+
+
+async def get_video_details(video_ids, use_cache: bool = True, failed_ids: set | None = None):
+    """
+    Fetch the details of the given videos, issuing the 50 ids chunks concurrently.
+
+    Args:
+        video_ids (list): Ids of the videos.
+        use_cache (bool): Serve the videos fetched within the cache TTL without calling the API.
+        failed_ids (set): If given, the ids of the chunks failing after their retries are added
+            to it and the other chunks are still returned. Otherwise the first failure is raised.
+
+    Returns:
+        dict: Processed video details by video id, in the order of the chunks.
+    """
+    cached = await asyncio.to_thread(video_cache.get_many, list(video_ids)) if use_cache else {}
+    missing_ids = [video_id for video_id in video_ids if video_id not in cached]
+    if cached:
+        print(f"Video details cache: {len(cached)} hits, {len(missing_ids)} misses")
+
+    semaphore = asyncio.Semaphore(YOUTUBE_API_CONCURRENCY)
+    chunks = list(chunked(missing_ids, 50))
+    tasks = [
+        asyncio.create_task(fetch_video_details_chunk(index, chunk, semaphore))
+        for index, chunk in enumerate(chunks)
+    ]
+    chunk_results = [{}] * len(tasks)
+
+    if failed_ids is not None:
+        for chunk, result in zip(chunks, await asyncio.gather(*tasks, return_exceptions=True)):
+            if isinstance(result, Exception):
+                print(f"Failed to fetch the details of {len(chunk)} videos: {result}")
+                failed_ids.update(chunk)
+            else:
+                index, details = result
+                chunk_results[index] = details
+    else:
+        try:
+            # Merge the chunks as they arrive, each one at its original position
+            for next_chunk in asyncio.as_completed(tasks):
+                index, details = await next_chunk
+                chunk_results[index] = details
+        except Exception:
+            for task in tasks:
+                task.cancel()
+            raise
+
+    fetched = {}
+    for details in chunk_results:
+        fetched.update(details)
+    if fetched:
+        await asyncio.to_thread(video_cache.set_many, fetched)
+
+    return {
+        video_id: cached.get(video_id) or fetched.get(video_id)
+        for video_id in video_ids
+        if video_id in cached or video_id in fetched
+    }
+
+
+async def get_channel_thumbnails(channel_ids) -> dict:
+    """
+    Return the avatar URL of the given channels, resolving up to 50 channels per channels.list call.
+
+    Returns:
+        dict: Avatar URL by channel id, channels not found are left out.
+    """
+    result = {}
+    for chunk in chunked(list(channel_ids), 50):
+        response = await YOUTUBE.channels().list(
+            part="snippet",
+            id=",".join(chunk),
+            maxResults=50
+        ).execute()
         for item in response.get("items", []):
-            result[item["id"]] = process_video_details(item)
+            thumbnail = get_best_thumbnail(item.get("snippet", {}))
+            if thumbnail:
+                result[item["id"]] = thumbnail
 
     return result
 
@@ -97,9 +243,14 @@ def is_available(content: dict) -> bool:
     return "FR" not in content.get("regionRestriction", {}).get("blocked", [])
 
 
-async def fetch_video_info_from_api(video_id: str) -> dict | None:
+async def fetch_video_info_from_api(video_id: str, use_cache: bool = True) -> dict | None:
+    if use_cache:
+        cached = await asyncio.to_thread(video_cache.get, video_id)
+        if cached:
+            return cached
+
     try:
-        response = YOUTUBE.videos().list(
+        response = await YOUTUBE.videos().list(
             part="snippet,contentDetails",
             id=video_id
         ).execute()
@@ -110,9 +261,10 @@ async def fetch_video_info_from_api(video_id: str) -> dict | None:
     if not response["items"]:
         return None
 
-    video = response["items"][0]
-    
-    return process_video_details(video)
+    video = process_video_details(response["items"][0])
+    await asyncio.to_thread(video_cache.set, video_id, video)
+
+    return video
 
 
 def process_video_details(video_info: dict) -> dict:
@@ -0,0 +1,199 @@
+import asyncio
+import httpx
+import json
+import os
+from dotenv import load_dotenv
+
+from utils.disk_cache import DiskCache
+from utils.youtube_quota import quota_manager, quota_priority
+from utils.constants import (
+    METADATA_STORAGE_PATH,
+    YOUTUBE_API_CACHE_TTL_HOURS,
+    YOUTUBE_API_CACHE_MAX_ENTRIES,
+    YOUTUBE_API_TIMEOUT,
+    YOUTUBE_API_MAX_CONNECTIONS,
+    YOUTUBE_API_MAX_KEEPALIVE_CONNECTIONS,
+)
+
+
+load_dotenv()
+
+YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+YOUTUBE_API_BASE_URL = "https://www.googleapis.com/youtube/v3"
+
+# Collections whose pages are cached and revalidated with their ETag
+CONDITIONAL_RESOURCES = {"playlistItems", "videos"}
+
+api_cache = DiskCache(
+    os.path.join(METADATA_STORAGE_PATH, "cache", "youtube_api.sqlite"),
+    "responses",
+    ttl=YOUTUBE_API_CACHE_TTL_HOURS * 3600,
+    max_entries=YOUTUBE_API_CACHE_MAX_ENTRIES,
+)
+api_cache_stats = {"hits": 0, "misses": 0}
+
+
+class YouTubeAPIError(Exception):
+    """
+    Raised when the YouTube Data API answers with an error status.
+    """
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"YouTube API error {status_code}: {message}")
+        self.status_code = status_code
+        self.message = message
+
+
+class YouTubeRequest:
+    """
+    A prepared request to a Data API endpoint, mirroring googleapiclient's `HttpRequest`.
+    The only difference is that `execute()` has to be awaited.
+    """
+    def __init__(self, client: "YouTubeClient", resource: str, params: dict):
+        self.client = client
+        self.resource = resource
+        self.params = params
+
+    async def execute(self) -> dict:
+        return await self.client.request(self.resource, self.params)
+
+
+class YouTubeResource:
+    """
+    A Data API collection (videos, playlists, ...) exposing the `list` method.
+    """
+    def __init__(self, client: "YouTubeClient", name: str):
+        self.client = client
+        self.name = name
+
+    def list(self, **params) -> YouTubeRequest:
+        return YouTubeRequest(self.client, self.name, params)
+
+
+class YouTubeClient:
+    """
+    Non-blocking client for the YouTube Data API v3.
+
+    It exposes the same `YOUTUBE.videos().list(...).execute()` shape as the
+    googleapiclient object it replaces, but every request goes through a single
+    pooled `httpx.AsyncClient` instead of blocking the event loop.
+    """
+    def __init__(self, api_key: str | None):
+        self.api_key = api_key
+        self._http: httpx.AsyncClient | None = None
+
+    def _get_http(self) -> httpx.AsyncClient:
+        # Created lazily so the pool is bound to the running event loop
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                base_url=YOUTUBE_API_BASE_URL,
+                timeout=httpx.Timeout(YOUTUBE_API_TIMEOUT),
+                limits=httpx.Limits(
+                    max_connections=YOUTUBE_API_MAX_CONNECTIONS,
+                    max_keepalive_connections=YOUTUBE_API_MAX_KEEPALIVE_CONNECTIONS,
+                ),
+                http2=True,
+            )
+        return self._http
+
+    async def request(self, resource: str, params: dict) -> dict:
+        """
+        Perform a GET request on a Data API collection and return the decoded JSON body.
+
+        Pages of the collections in `CONDITIONAL_RESOURCES` are stored with their ETag
+        and revalidated with `If-None-Match`, a 304 answer is served from the cache.
+
+        Args:
+            resource (str): Name of the collection (e.g. "videos", "playlistItems").
+            params (dict): Query parameters, `None` values are dropped.
+
+        Returns:
+            dict: The JSON response.
+
+        Raises:
+            YouTubeAPIError: If the API answers with an error status.
+            QuotaExceededError: If the call doesn't fit in the quota of the current priority class.
+        """
+        # May wait for another process charging a call, off the event loop
+        await asyncio.to_thread(quota_manager.consume, resource, quota_priority.get())
+
+        query = {key: value for key, value in params.items() if value is not None}
+
+        cache_key = None
+        cached = None
+        headers = {}
+        if resource in CONDITIONAL_RESOURCES:
+            cache_key = get_cache_key(resource, query)
+            # SQLite calls run in a thread, not to block the event loop
+            cached = await asyncio.to_thread(api_cache.get, cache_key)
+            if cached:
+                headers["If-None-Match"] = cached["etag"]
+
+        response = await self._get_http().get(f"/{resource}", params={**query, "key": self.api_key}, headers=headers)
+
+        if response.status_code == 304 and cached:
+            api_cache_stats["hits"] += 1
+            return cached["body"]
+
+        if response.is_error:
+            raise YouTubeAPIError(response.status_code, get_error_message(response))
+
+        body = response.json()
+        if cache_key:
+            api_cache_stats["misses"] += 1
+            if body.get("etag"):
+                await asyncio.to_thread(api_cache.set, cache_key, {"etag": body["etag"], "body": body})
+
+        return body
+
+    def playlists(self) -> YouTubeResource:
+        return YouTubeResource(self, "playlists")
+
+    def playlistItems(self) -> YouTubeResource:
+        return YouTubeResource(self, "playlistItems")
+
+    def videos(self) -> YouTubeResource:
+        return YouTubeResource(self, "videos")
+
+    def channels(self) -> YouTubeResource:
+        return YouTubeResource(self, "channels")
+
+    def search(self) -> YouTubeResource:
+        return YouTubeResource(self, "search")
+
+    async def aclose(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+def get_cache_key(resource: str, query: dict) -> str:
+    """
+    Build the cache key of a request from its collection and parameters (API key excluded).
+    """
+    return f"{resource}:{json.dumps(query, sort_keys=True)}"
+
+
+async def get_api_cache_stats() -> dict:
+    """
+    Return the hit/miss counters of the conditional request cache since startup.
+    """
+    total = api_cache_stats["hits"] + api_cache_stats["misses"]
+    return {
+        **api_cache_stats,
+        "hit_ratio": round(api_cache_stats["hits"] / total, 3) if total else None,
+        "entries": await asyncio.to_thread(len, api_cache),
+    }
+
+
+def get_error_message(response: httpx.Response) -> str:
+    """
+    Extract the error message of a Data API error response.
+    """
+    try:
+        return response.json()["error"]["message"]
+    except Exception:
+        return response.text
+
+
+# Shared client, drop-in replacement of the googleapiclient `build("youtube", "v3")` object
+YOUTUBE = YouTubeClient(YOUTUBE_API_KEY)
@@ -0,0 +1,190 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime as Datetime, timedelta, timezone
+from enum import Enum as PyEnum
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from utils.constants import (
+    METADATA_STORAGE_PATH,
+    YOUTUBE_QUOTA_DAILY_BUDGET,
+    YOUTUBE_QUOTA_SCHEDULED_RESERVE,
+    YOUTUBE_QUOTA_BULK_LIMIT,
+)
+
+
+# Quota units charged by the Data API for one call of each collection's list method
+ENDPOINT_COSTS = {
+    "playlists": 1,
+    "playlistItems": 1,
+    "videos": 1,
+    "channels": 1,
+    "search": 100,
+}
+
+
+class QuotaPriority(str, PyEnum):
+    SCHEDULED = "SCHEDULED"      # Nightly jobs, may use the whole budget
+    INTERACTIVE = "INTERACTIVE"  # User actions, can't eat the scheduled reserve
+    BULK = "BULK"                # Imports, capped to a share of the budget
+
+
+class QuotaExceededError(Exception):
+    """
+    Raised when a call would exceed the quota available to its priority class.
+    """
+    def __init__(self, resource: str, priority: QuotaPriority, used: int, limit: int):
+        super().__init__(
+            f"YouTube API quota exceeded for {priority.value} calls to {resource}: {used}/{limit} units used today"
+        )
+        self.resource = resource
+        self.priority = priority
+
+
+# Priority of the YouTube API calls made in the current context (propagated to the tasks it creates)
+quota_priority: ContextVar[QuotaPriority] = ContextVar("quota_priority", default=QuotaPriority.INTERACTIVE)
+
+
+@contextmanager
+def priority(value: QuotaPriority):
+    """
+    Run the YouTube API calls of the block (and of the tasks created in it) with the given priority.
+    """
+    token = quota_priority.set(value)
+    try:
+        yield
+    finally:
+        quota_priority.reset(token)
+
+
+def get_quota_day() -> str:
+    """
+    Return the current quota day, the Data API quota resets at midnight Pacific Time.
+    """
+    try:
+        pacific = ZoneInfo("America/Los_Angeles")
+    except ZoneInfoNotFoundError:
+        # No tz database (e.g. alpine without tzdata), ignore daylight saving time
+        pacific = timezone(timedelta(hours=-8))
+    return Datetime.now(pacific).strftime("%Y-%m-%d")
+
+
+class QuotaManager:
+    """
+    Accounts the Data API quota units spent per day, per endpoint and per priority class.
+
+    The usage is persisted in a SQLite file shared by the API and the download workers:
+    a restart doesn't reset the daily counters, and the check and the increment of a call
+    are done in one write transaction so concurrent processes don't lose each other's units.
+    """
+    def __init__(self, daily_budget: int, scheduled_reserve: float, bulk_limit: float, path: str):
+        self.daily_budget = daily_budget
+        self.scheduled_reserve = scheduled_reserve
+        self.bulk_limit = bulk_limit
+        self.path = path
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            # Autocommit mode, the transactions are explicit
+            self._connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            # One counter per day and per total / endpoint / priority class
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS quota_usage "
+                "(day TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL, used INTEGER NOT NULL, "
+                "PRIMARY KEY (day, kind, name))"
+            )
+        return self._connection
+
+    def get_limit(self, priority: QuotaPriority) -> int:
+        """
+        Return the number of units a priority class can spend per day (counting every class usage).
+        """
+        if priority == QuotaPriority.SCHEDULED:
+            return self.daily_budget
+        if priority == QuotaPriority.BULK:
+            return int(self.daily_budget * min(self.bulk_limit, 1 - self.scheduled_reserve))
+        return int(self.daily_budget * (1 - self.scheduled_reserve))
+
+    def _get_day_usage(self, day: str) -> dict:
+        usage = {"total": 0, "by_endpoint": {}, "by_priority": {}}
+        with self._lock:
+            rows = self._get_connection().execute(
+                "SELECT kind, name, used FROM quota_usage WHERE day = ?", (day,)
+            ).fetchall()
+        for kind, name, used in rows:
+            if kind == "total":
+                usage["total"] = used
+            else:
+                usage[kind][name] = used
+        return usage
+
+    def consume(self, resource: str, priority: QuotaPriority | None = None) -> int:
+        """
+        Charge the cost of one call to a collection.
+
+        Raises:
+            QuotaExceededError: If the call would exceed the limit of the priority class.
+
+        Returns:
+            int: The units charged.
+        """
+        priority = priority or quota_priority.get()
+        cost = ENDPOINT_COSTS.get(resource, 1)
+        day = get_quota_day()
+        limit = self.get_limit(priority)
+
+        with self._lock:
+            connection = self._get_connection()
+            # Takes the write lock of the file, the other processes wait for the commit
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                row = connection.execute(
+                    "SELECT used FROM quota_usage WHERE day = ? AND kind = 'total' AND name = ''", (day,)
+                ).fetchone()
+                used = row[0] if row else 0
+                if used + cost > limit:
+                    raise QuotaExceededError(resource, priority, used, limit)
+
+                connection.executemany(
+                    "INSERT INTO quota_usage (day, kind, name, used) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (day, kind, name) DO UPDATE SET used = used + excluded.used",
+                    [
+                        (day, "total", "", cost),
+                        (day, "by_endpoint", resource, cost),
+                        (day, "by_priority", priority.value, cost),
+                    ],
+                )
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+        return cost
+
+    def get_usage(self) -> dict:
+        day = get_quota_day()
+        usage = self._get_day_usage(day)
+        return {
+            "day": day,
+            "daily_budget": self.daily_budget,
+            "used": usage["total"],
+            "remaining": max(self.daily_budget - usage["total"], 0),
+            "by_endpoint": usage["by_endpoint"],
+            "by_priority": usage["by_priority"],
+            "limits": {priority.value: self.get_limit(priority) for priority in QuotaPriority},
+            "endpoint_costs": ENDPOINT_COSTS,
+        }
+
+
+quota_manager = QuotaManager(
+    YOUTUBE_QUOTA_DAILY_BUDGET,
+    YOUTUBE_QUOTA_SCHEDULED_RESERVE,
+    YOUTUBE_QUOTA_BULK_LIMIT,
+    os.path.join(METADATA_STORAGE_PATH, "cache", "youtube_quota.sqlite"),
+)
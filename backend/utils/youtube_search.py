@@ -1,14 +1,7 @@
-from googleapiclient.discovery import build
-from dotenv import load_dotenv
 from rapidfuzz import fuzz
 from ytmusicapi import YTMusic
-import os
+from utils.youtube_client import YOUTUBE
 
-load_dotenv()
-
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
-
-YOUTUBE = build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
 YTMUSIC = YTMusic()   # works without auth for search
 
 
@@ -21,7 +14,7 @@ async def search_youtube(query: str, filters="videos,playlists,channels", max_re
         type=filters,
         maxResults=max_results
     )
-    res = req.execute()
+    res = await req.execute()
     return res.get("items", [])
 
 
@@ -0,0 +1,326 @@
+import asyncio
+import json
+import os
+import signal
+import sys
+from collections import deque
+from importlib.util import find_spec
+from typing import Awaitable, Callable
+
+from utils.download_watchdog import DownloadWatchdog
+from utils.ytdlp_worker import JOB_END_MARKER
+from utils.constants import DOWNLOAD_CONCURRENCY, DOWNLOAD_POSTPROCESS_CONCURRENCY, DOWNLOAD_LOG_LINES, YTDLP_PERSISTENT_PROCESSES
+
+WORKER_PATH = os.path.join(os.path.dirname(__file__), "ytdlp_worker.py")
+
+
+def new_log() -> deque:
+    """
+    Ring buffer keeping the last `DOWNLOAD_LOG_LINES` lines of output of a job.
+    """
+    return deque(maxlen=DOWNLOAD_LOG_LINES)
+
+
+def log_line(log: deque | None, line: bytes):
+    """
+    Keep a line of yt-dlp output in the log of its job, only the output
+    without a job (a worker failing to start) goes to the process output.
+    """
+    line = line.decode("utf-8", errors="replace").rstrip()
+    if log is not None:
+        log.append(line)
+    else:
+        print(line)
+
+
+def kill_process_group(process: asyncio.subprocess.Process):
+    """
+    Kill a yt-dlp process started in its own session, with its children (ffmpeg).
+    """
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+# Progress lines printed by a spawned yt-dlp, as JSON after these prefixes
+PROGRESS_PREFIX = "[musicarr-progress] "
+PROGRESS_TEMPLATE = "download:" + PROGRESS_PREFIX + "%(progress.{status,filename,downloaded_bytes,total_bytes,total_bytes_estimate,speed,eta})j"
+POSTPROCESS_PREFIX = "[musicarr-postprocess] "
+POSTPROCESS_TEMPLATE = "postprocess:" + POSTPROCESS_PREFIX + "%(progress.{status,postprocessor})j"
+
+
+async def run_subprocess(
+    argv: list[str],
+    on_progress: Callable[[dict], Awaitable[None]] | None = None,
+    log: deque | None = None,
+    on_activity: Callable[[dict | None], None] | None = None,
+) -> tuple[int, str]:
+    """
+    Run yt-dlp in a new process, with the same progress updates as the pooled processes.
+
+    Both outputs are read at the same time (yt-dlp would block on a full stderr pipe
+    otherwise), their lines are kept in the log of the job.
+
+    Args:
+        on_activity (callable): Called with None for each output line and with the updates
+            of the post-processors (status, postprocessor).
+
+    Returns:
+        tuple: The return code of yt-dlp and the tail of its output.
+    """
+    log = new_log() if log is None else log
+    process = None
+    stderr_task = None
+    try:
+        process = await asyncio.create_subprocess_exec(
+            "yt-dlp", "--progress-template", PROGRESS_TEMPLATE, "--progress-template", POSTPROCESS_TEMPLATE, *argv,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+
+        async def drain_stderr():
+            async for line in process.stderr:
+                log_line(log, line)
+                if on_activity:
+                    on_activity(None)
+        stderr_task = asyncio.create_task(drain_stderr())
+
+        async for line in process.stdout:
+            if line.startswith(PROGRESS_PREFIX.encode()):
+                if on_progress:
+                    try:
+                        await on_progress(json.loads(line[len(PROGRESS_PREFIX):]))
+                    except ValueError:
+                        pass
+            elif line.startswith(POSTPROCESS_PREFIX.encode()):
+                if on_activity:
+                    try:
+                        on_activity(json.loads(line[len(POSTPROCESS_PREFIX):]))
+                    except ValueError:
+                        pass
+            else:
+                log_line(log, line)
+                if on_activity:
+                    on_activity(None)
+
+        returncode = await process.wait()
+        await stderr_task
+        return returncode, "\n".join(log)
+
+    except asyncio.CancelledError:
+        # Don't leave yt-dlp running when the download is interrupted
+        if process and process.returncode is None:
+            kill_process_group(process)
+        raise
+    finally:
+        if stderr_task and not stderr_task.done():
+            stderr_task.cancel()
+
+
+class YtDlpProcess:
+    """
+    A long-lived yt-dlp process (see `utils.ytdlp_worker`), running one job at a time.
+    """
+    def __init__(self):
+        self.process: asyncio.subprocess.Process | None = None
+        self.log: deque | None = None  # Log of the running job
+        self.on_activity: Callable[[dict | None], None] | None = None  # Of the running job
+        self._stderr_task: asyncio.Task | None = None
+        self._job_output_done = asyncio.Event()  # The output of the running job was all read
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_PATH,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=True,
+        )
+        self._stderr_task = asyncio.create_task(self._drain_stderr())
+
+        message = await self._read()
+        if not message or message.get("type") != "ready":
+            self.kill()
+            raise RuntimeError("yt-dlp worker failed to start")
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def _drain_stderr(self):
+        # yt-dlp output, read continuously so the process never blocks on a full pipe
+        try:
+            async for line in self.process.stderr:
+                if line.rstrip() == JOB_END_MARKER.encode():
+                    self._job_output_done.set()
+                else:
+                    log_line(self.log, line)
+                    if self.on_activity:
+                        self.on_activity(None)
+        finally:
+            # No more output to wait for
+            self._job_output_done.set()
+
+    async def _read(self) -> dict | None:
+        line = await self.process.stdout.readline()
+        if not line:
+            return None
+        return json.loads(line)
+
+    async def run(
+        self,
+        argv: list[str],
+        on_progress: Callable[[dict], Awaitable[None]] | None = None,
+        log: deque | None = None,
+        on_activity: Callable[[dict | None], None] | None = None,
+    ) -> tuple[int, str]:
+        """
+        Run yt-dlp with the given arguments (without the executable).
+
+        Returns:
+            tuple: The return code of yt-dlp and the tail of its output.
+        """
+        self.log = new_log() if log is None else log
+        self.on_activity = on_activity
+        self._job_output_done.clear()
+        try:
+            self.process.stdin.write((json.dumps({"argv": argv}) + "\n").encode("utf-8"))
+            await self.process.stdin.drain()
+
+            while True:
+                message = await self._read()
+                if message is None:
+                    raise ConnectionError("yt-dlp worker exited unexpectedly")
+
+                if message["type"] == "progress":
+                    if on_progress:
+                        await on_progress(message)
+                elif message["type"] == "postprocess":
+                    if on_activity:
+                        on_activity(message)
+                elif message["type"] == "result":
+                    # The result comes on stdout, the last output lines may still be in the stderr pipe
+                    await self._job_output_done.wait()
+                    if message["error"]:
+                        self.log.append(message["error"])
+                    return message["returncode"], "\n".join(self.log)
+        finally:
+            self.log = None
+            self.on_activity = None
+
+    def kill(self):
+        if self.alive:
+            kill_process_group(self.process)
+
+    async def reap(self):
+        """
+        Wait for a killed process to exit and its output to be drained.
+        """
+        self.process.stdin.close()
+        await self.process.wait()
+        if self._stderr_task:
+            await self._stderr_task
+
+    async def close(self):
+        if not self.alive:
+            return
+        self.process.stdin.close()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=5)
+        except asyncio.TimeoutError:
+            self.kill()
+
+
+class YtDlpPool:
+    """
+    Runs yt-dlp jobs, at most `size` at a time.
+
+    With persistent processes, the jobs run in long-lived yt-dlp processes so each of them
+    doesn't pay the interpreter startup, the yt-dlp import and the extractors initialization.
+    Processes are started on demand, up to `size`. A process interrupted in the middle
+    of a job (cancellation, crash) is killed and replaced.
+    """
+    def __init__(self, size: int, persistent: bool = True):
+        self.size = max(size, 1)
+        self.idle: list[YtDlpProcess] = []
+        self.reaping: set[asyncio.Task] = set()  # Killed processes, until they exit
+        self._persistent = persistent
+        self._slots: asyncio.Semaphore | None = None
+
+    @property
+    def persistent(self) -> bool:
+        """
+        False to spawn yt-dlp for each job instead (disabled, or yt_dlp not importable).
+        """
+        return self._persistent and find_spec("yt_dlp") is not None
+
+    async def run(
+        self,
+        argv: list[str],
+        on_progress: Callable[[dict], Awaitable[None]] | None = None,
+        watchdog: DownloadWatchdog | None = None,
+        log: deque | None = None,
+    ) -> tuple[int, str]:
+        """
+        Run yt-dlp with the given arguments (without the executable).
+
+        Args:
+            argv (list): The yt-dlp arguments.
+            on_progress (callable): Awaited with each progress update (status, filename,
+                downloaded_bytes, total_bytes, speed, eta).
+            watchdog (DownloadWatchdog): Kills the job if it stalls, from the time it gets a slot.
+                Any output of yt-dlp counts as activity.
+            log (deque): Ring buffer receiving the output of yt-dlp (see `new_log`).
+
+        Returns:
+            tuple: The return code of yt-dlp and the tail of its output.
+
+        Raises:
+            DownloadStalledError: The job was killed by the watchdog.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+        on_activity = None
+        if watchdog:
+            on_progress = watchdog.track(on_progress)
+            on_activity = watchdog.activity
+
+        async with self._slots:
+            if not self.persistent:
+                job = run_subprocess(argv, on_progress, log, on_activity)
+                return await (watchdog.run(job) if watchdog else job)
+
+            worker = None
+            while self.idle and worker is None:
+                worker = self.idle.pop()
+                if not worker.alive:
+                    worker = None
+            if worker is None:
+                worker = YtDlpProcess()
+                await worker.start()
+
+            try:
+                job = worker.run(argv, on_progress, log, on_activity)
+                result = await (watchdog.run(job) if watchdog else job)
+            except BaseException:
+                # The process state is unknown (job still running or process dead)
+                worker.kill()
+                task = asyncio.ensure_future(worker.reap())
+                self.reaping.add(task)
+                task.add_done_callback(self.reaping.discard)
+                raise
+
+            self.idle.append(worker)
+            return result
+
+    async def close(self):
+        idle, self.idle = self.idle, []
+        await asyncio.gather(*(worker.close() for worker in idle), *self.reaping, return_exceptions=True)
+
+
+# Network bound: fetching the streams, thumbnails and subtitles
+download_pool = YtDlpPool(DOWNLOAD_CONCURRENCY, YTDLP_PERSISTENT_PROCESSES)
+# CPU bound: audio extraction, remux and tagging with ffmpeg
+postprocess_pool = YtDlpPool(DOWNLOAD_POSTPROCESS_CONCURRENCY, YTDLP_PERSISTENT_PROCESSES)
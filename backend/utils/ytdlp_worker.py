@@ -0,0 +1,87 @@
+"""
+Long-lived yt-dlp process, started by `utils.ytdlp_pool`.
+
+yt-dlp is imported once, then each line read on stdin is a job: the yt-dlp arguments as
+JSON (`{"argv": [...]}`). The progress of the job (from yt-dlp progress and post-processor
+hooks) and its result are written on stdout as JSON lines, everything yt-dlp prints goes
+to stderr.
+"""
+import json
+import os
+import sys
+import time
+
+# Written on stderr after the output of each job, before its result is sent
+JOB_END_MARKER = "[musicarr-job-end]"
+
+
+def main():
+    # Keep stdout for the protocol, anything else printed on it goes to stderr
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), "w", buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    import yt_dlp
+
+    def send(message: dict):
+        protocol.write(json.dumps(message, default=str) + "\n")
+
+    progress_delta = 0
+    next_progress = 0
+
+    def progress_hook(progress: dict):
+        nonlocal next_progress
+        # Throttled like the progress output of yt-dlp (--progress-delta), except the last update
+        if progress_delta and progress.get("status") == "downloading":
+            now = time.monotonic()
+            if now < next_progress:
+                return
+            next_progress = now + progress_delta
+
+        send({
+            "type": "progress",
+            "status": progress.get("status"),
+            "filename": progress.get("filename"),
+            "downloaded_bytes": progress.get("downloaded_bytes"),
+            "total_bytes": progress.get("total_bytes") or progress.get("total_bytes_estimate"),
+            "speed": progress.get("speed"),
+            "eta": progress.get("eta"),
+        })
+
+    def postprocessor_hook(progress: dict):
+        send({
+            "type": "postprocess",
+            "status": progress.get("status"),
+            "postprocessor": progress.get("postprocessor"),
+        })
+
+    send({"type": "ready"})
+
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            argv = json.loads(line)["argv"]
+            parsed = yt_dlp.parse_options(argv)
+            progress_delta = parsed.ydl_opts.get("progress_delta") or 0
+            next_progress = 0
+            with yt_dlp.YoutubeDL(parsed.ydl_opts) as ydl:
+                ydl.add_progress_hook(progress_hook)
+                ydl.add_postprocessor_hook(postprocessor_hook)
+                if parsed.options.load_info_filename:
+                    returncode = ydl.download_with_info_file(yt_dlp.utils.expand_path(parsed.options.load_info_filename))
+                else:
+                    returncode = ydl.download(parsed.urls)
+            result = {"type": "result", "returncode": returncode, "error": None}
+        except SystemExit as e:
+            # Raised by the option parser on invalid arguments
+            result = {"type": "result", "returncode": e.code or 2, "error": f"Invalid arguments: {e}"}
+        except Exception as e:
+            result = {"type": "result", "returncode": 1, "error": str(e)}
+        # The output of the job is written before its result, to end up in the log of the job
+        sys.stdout.flush()
+        sys.stderr.write(JOB_END_MARKER + "\n")
+        sys.stderr.flush()
+        send(result)
+
+if __name__ == "__main__":
+    main()
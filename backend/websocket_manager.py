@@ -1,9 +1,11 @@
 from fastapi import WebSocket
-from typing import Dict, List
+from typing import Awaitable, Callable, Dict, List, Optional
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        # Set in processes without WebSocket clients (download workers) to forward their messages to the API
+        self.publisher: Optional[Callable[[str, dict], Awaitable[None]]] = None
 
     async def connect(self, group: str, websocket: WebSocket):
         await websocket.accept()
@@ -13,6 +15,9 @@ class ConnectionManager:
         self.active_connections[group].remove(websocket)
 
     async def send_message(self, group: str, message: str):
+        if self.publisher:
+            await self.publisher(group, message)
+            return
         print(f"Sending message to group {group}: {message}")
         for connection in self.active_connections.get(group, []):
             print(f"Sending message to connection {connection}: {message}")
@@ -0,0 +1,51 @@
+"""
+Standalone download worker: runs the queued download jobs outside of the API process.
+
+Usage (from the backend folder, with the same environment as the API):
+    python -m worker
+
+Several workers can run at the same time, in one or several containers, against the
+same database. Set DOWNLOAD_WORKERS_IN_API=false on the API to leave the downloads
+to the workers. The progress is forwarded to the API, which sends it to its WebSocket clients.
+"""
+import asyncio
+import signal
+
+from database.database import engine
+from websocket_manager import ws_manager
+from utils.init_folders import init_folders
+from utils.download_jobs import download_dispatcher, WORKER_ID
+from utils.pg_notify import listen, publish_ws_message, DOWNLOAD_JOBS_CHANNEL
+from utils.ytdlp_pool import download_pool, postprocess_pool
+
+
+async def wake_dispatcher(payload: str):
+    download_dispatcher.notify()
+
+
+async def main():
+    init_folders()
+
+    # No WebSocket client in this process, the messages go through the API
+    ws_manager.publisher = publish_ws_message
+
+    download_dispatcher.start()
+    listener = asyncio.create_task(listen({DOWNLOAD_JOBS_CHANNEL: wake_dispatcher}))
+    print(f"Download worker {WORKER_ID} started")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    print(f"Stopping download worker {WORKER_ID}...")
+    listener.cancel()
+    await download_dispatcher.stop()
+    await download_pool.close()
+    await postprocess_pool.close()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -15,6 +15,7 @@ type VideoItemProps = {
   video: VideoDetails;
   progress: number | undefined;
   download_stage: string;
+  download_speed?: number;
   onDownload: (videoId: string) => void;
   openThumbnailModal: (url: string) => void;
   openEditModal?: () => void;
@@ -27,6 +28,7 @@ export const VideoItem = ({
   video,
   progress,
   download_stage,
+  download_speed,
   onDownload,
   openThumbnailModal,
   openEditModal,
@@ -88,6 +90,7 @@ export const VideoItem = ({
           video={video}
           progress={progress}
           download_stage={download_stage}
+          download_speed={download_speed}
           onDownload={onDownload}
           download_status={download_status?.status}
           error={error}
@@ -2,11 +2,13 @@ import { CheckCircle, Download, Loader2, X } from "lucide-react";
 import { VideoDetails } from "@/types/models";
 import { useState } from "react";
 import { motion, AnimatePresence } from "framer-motion";
+import { formatSpeed } from "@/utils/formatSpeed";
 
 interface VideoStatusProps {
   video: VideoDetails;
   progress: number | undefined;
   download_stage: string;
+  download_speed?: number;
   onDownload: (videoId: string) => void;
   download_status: string;
   error: any;
@@ -17,6 +19,7 @@ const VideoStatus = ({
   video,
   progress,
   download_stage,
+  download_speed,
   onDownload,
   download_status,
   error,
@@ -82,7 +85,7 @@ const VideoStatus = ({
       <div className="flex items-center gap-2 px-3 py-2 rounded-lg border border-blue-400 text-blue-300 bg-blue-900/20">
         <Loader2 size={16} className="md:w-[20px] md:h-auto animate-spin" />
         <span className="text-sm">
-          {download_stage ?? ""} {progress ?? 0}%
+          {download_stage ?? ""} {progress ?? 0}% {formatSpeed(download_speed)}
         </span>
       </div>
     );
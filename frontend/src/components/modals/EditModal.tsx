@@ -7,6 +7,9 @@ import errorToast from "../toasts/errorToast";
 import { Info } from "lucide-react";
 import axios from "axios";
 
+// Downloaders accepted by the backend (supported by yt-dlp)
+const EXTERNAL_DOWNLOADERS = ["native", "aria2c", "avconv", "axel", "curl", "ffmpeg", "httpie", "wget"];
+
 interface PathItem {
   path: string;
   default: boolean;
@@ -33,6 +36,9 @@ const EditModal = ({ isEditOpen, closeEdit, playlist }: EditModalProps) => {
     default_format: playlist.default_format,
     default_quality: qualityKey || "q_best",
     default_subtitles: playlist.default_subtitles,
+    default_concurrent_fragments: playlist.default_concurrent_fragments?.toString() || "",
+    default_http_chunk_size: playlist.default_http_chunk_size || "",
+    default_external_downloader: playlist.default_external_downloader || "",
   });
 
   useEffect(() => {
@@ -44,6 +50,9 @@ const EditModal = ({ isEditOpen, closeEdit, playlist }: EditModalProps) => {
       default_format: playlist.default_format,
       default_quality: qualityKey || "q_best",
       default_subtitles: playlist.default_subtitles,
+      default_concurrent_fragments: playlist.default_concurrent_fragments?.toString() || "",
+      default_http_chunk_size: playlist.default_http_chunk_size || "",
+      default_external_downloader: playlist.default_external_downloader || "",
     });
   }, [playlist]);
 
@@ -105,7 +114,13 @@ const EditModal = ({ isEditOpen, closeEdit, playlist }: EditModalProps) => {
         headers: {
           "Content-Type": "application/json",
         },
-        body: JSON.stringify(formData),
+        body: JSON.stringify({
+          ...formData,
+          // Empty tuning fields fall back to the server settings (auto by quality)
+          default_concurrent_fragments: parseInt(formData.default_concurrent_fragments) || null,
+          default_http_chunk_size: formData.default_http_chunk_size.trim() || null,
+          default_external_downloader: formData.default_external_downloader.trim() || null,
+        }),
       });
       if (!response.ok) {
         throw new Error("Failed to save options");
@@ -305,6 +320,48 @@ const EditModal = ({ isEditOpen, closeEdit, playlist }: EditModalProps) => {
                   ))}
                 </div>
               </div>
+              <div>
+                <span className="block text-md font-bold text-[goldenrod]">Download Tuning</span>
+                <div className="flex flex-wrap gap-4 mt-1">
+                  <label className="flex flex-col text-sm">
+                    Parallel fragments
+                    <input
+                      type="number"
+                      min={1}
+                      name="default_concurrent_fragments"
+                      value={formData.default_concurrent_fragments}
+                      onChange={handleChange}
+                      placeholder="Auto"
+                      className="w-28 p-2 border rounded focus:ring focus:ring-blue-300"
+                    />
+                  </label>
+                  <label className="flex flex-col text-sm">
+                    Chunk size
+                    <input
+                      type="text"
+                      name="default_http_chunk_size"
+                      value={formData.default_http_chunk_size}
+                      onChange={handleChange}
+                      placeholder="Auto"
+                      className="w-28 p-2 border rounded focus:ring focus:ring-blue-300"
+                    />
+                  </label>
+                  <label className="flex flex-col text-sm">
+                    Downloader
+                    <select
+                      name="default_external_downloader"
+                      value={formData.default_external_downloader}
+                      onChange={handleChange}
+                      className="w-28 p-2 border rounded focus:ring focus:ring-blue-300"
+                    >
+                      <option value="">Default</option>
+                      {EXTERNAL_DOWNLOADERS.map((downloader) => (
+                        <option key={downloader} value={downloader}>{downloader}</option>
+                      ))}
+                    </select>
+                  </label>
+                </div>
+              </div>
             </div>
           </div>
         </ModalBody>
@@ -76,7 +76,7 @@ export default function PlaylistDetails(props: PlaylistDetailsProps) {
     closeModal: closeThumbnailModal,
   } = useThumbnailModal();
 
-  const { getProgress, getDownloadStage } = useDownloadProgress(String(id));
+  const { getProgress, getDownloadStage, getSpeed } = useDownloadProgress(String(id));
 
   const webSocketKey = `playlist-details-${id}`;
   useWebSocket(
@@ -325,6 +325,7 @@ export default function PlaylistDetails(props: PlaylistDetailsProps) {
               video={video}
               progress={getProgress(video.id)}
               download_stage={getDownloadStage(video.id)}
+              download_speed={getSpeed(video.id)}
               onDownload={handleVideoDownload}
               openThumbnailModal={openThumbnailModal}
             />
@@ -76,7 +76,7 @@ export default function VideosDetails(props: PlaylistDetailsProps) {
     closeModal: closeThumbnailModal,
   } = useThumbnailModal();
 
-  const { getProgress, getDownloadStage } = useDownloadProgress(String(id));
+  const { getProgress, getDownloadStage, getSpeed } = useDownloadProgress(String(id));
 
   const [isSelecting, setIsSelecting] = useState(false);
   const [selectedVideos, setSelectedVideos] = useState<string[]>([]);
@@ -381,6 +381,7 @@ export default function VideosDetails(props: PlaylistDetailsProps) {
                 video={video}
                 progress={getProgress(video.id)}
                 download_stage={getDownloadStage(video.id)}
+                download_speed={getSpeed(video.id)}
                 onDownload={handleVideoDownload}
                 openThumbnailModal={openThumbnailModal}
                 openEditModal={() => handleOpenEditModal(video.id)}
@@ -9,8 +9,9 @@ import errorToast from "@/components/toasts/errorToast";
 const useDownloadProgress = (playlistId: string) => {
   const [progress, setProgress] = useState<Record<string, number>>({});
   const [download_stage, setDownloadStage] = useState<Record<string, string>>({});
+  const [speed, setSpeed] = useState<Record<string, number>>({});
 
-  const updateStatus = (video_id: string, status: "DOWNLOADING" | "DOWNLOADED" | "ERROR") => {
+  const updateStatus = (video_id: string, status: "IDLE" | "DOWNLOADING" | "DOWNLOADED" | "ERROR") => {
     mutate(
       `${endpointPlaylists}/${playlistId}/videos/${video_id}/download_status`,
       { status },
@@ -39,6 +40,9 @@ const useDownloadProgress = (playlistId: string) => {
             if (data.download_stage) {
               setDownloadStage((prev) => ({ ...prev, [video_id]: data.download_stage }));
             }
+            if (typeof data.speed === "number") {
+              setSpeed((prev) => ({ ...prev, [video_id]: data.speed }));
+            }
           }
           break;
 
@@ -53,6 +57,15 @@ const useDownloadProgress = (playlistId: string) => {
           mutate
           break;
 
+        case "retrying":
+          setProgress((prev) => {
+            const updated = { ...prev };
+            delete updated[video_id];
+            return updated;
+          });
+          updateStatus(video_id, "IDLE");
+          break;
+
         case "error":
           setProgress((prev) => {
             const updated = { ...prev };
@@ -69,7 +82,8 @@ const useDownloadProgress = (playlistId: string) => {
 
   return {
     getProgress: (id: string) => progress[id] ?? 0,
-    getDownloadStage: (id: string) => download_stage[id] ?? ""
+    getDownloadStage: (id: string) => download_stage[id] ?? "",
+    getSpeed: (id: string) => speed[id]
   };
 };
 
@@ -13,6 +13,10 @@ export function useGlobalWebSocket() {
       successToast(data.message);
     } else if (data.fetch_success === false) {
       errorToast(data.message)
+    } else if (data.fetch_progress === true) {
+      // A page of items was stored, show it without waiting for the whole playlist
+      mutate(`${endpointPlaylists}`);
+      mutate(`${endpointPlaylists}/${data.playlist_id}/details`);
     }
   }, "global-playlist-updates");
 
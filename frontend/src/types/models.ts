@@ -60,6 +60,9 @@ interface PlaylistDetails {
   default_format: DownloadFormat;
   default_quality: DownloadQuality;
   default_subtitles?: boolean;
+  default_concurrent_fragments?: number | null;
+  default_http_chunk_size?: string | null;
+  default_external_downloader?: string | null;
   uploader: Uploader;
   videos: VideoDetails[];
 }
@@ -0,0 +1,15 @@
+export function formatSpeed(bytesPerSecond: number | undefined): string {
+    if (!bytesPerSecond) {
+      return "";
+    }
+
+    const units = ["B/s", "KiB/s", "MiB/s", "GiB/s"];
+    let value = bytesPerSecond;
+    let unit = 0;
+    while (value >= 1024 && unit < units.length - 1) {
+      value /= 1024;
+      unit++;
+    }
+
+    return `${value.toFixed(1)} ${units[unit]}`;
+  }